@@ -5,10 +5,8 @@ import logging
 import sys
 from pathlib import Path
 
-from .excel_io import load_workbook, locate_columns, group_rows, save_workbook
-from .name_normalizer import normalize_group
-from .field_filler import detect_ratio_type, fill_group
-from .merger import rewrite_sku, write_parent_sku_formulas, build_sku_prefix
+from .single_file import run_single_file
+from .xlsx_package import COMPRESSION_LEVELS, DEFAULT_COMPRESSION
 
 logger = logging.getLogger("amazon_excel_processor")
 
@@ -17,9 +15,11 @@ def main():
     parser = argparse.ArgumentParser(
         description="亚马逊上架商品 Excel 模板批量规范化处理工具"
     )
-    parser.add_argument("input_file", help="输入 Excel 文件路径 (.xlsx 或 .xlsm)")
+    parser.add_argument("input_file", help="输入文件路径 (.xlsx / .xlsm, 或 Tab 分隔平面文件 .txt)")
     parser.add_argument("-o", "--output", help="输出文件路径（默认: {input}_processed.{ext}）")
     parser.add_argument("--sku", help="SKU 命名前缀 (如 HM725; 不提供则不重写 SKU)")
+    parser.add_argument("--compression", choices=list(COMPRESSION_LEVELS), default=DEFAULT_COMPRESSION,
+                        help="输出压缩: stored 不压缩 / fast 快速 / max 最小体积 (默认, 上传文件)")
     parser.add_argument("-v", "--verbose", action="store_true", help="显示详细日志")
     args = parser.parse_args()
 
@@ -39,55 +39,8 @@ def main():
         sys.exit(1)
 
     try:
-        log_print(f">> 读取文件: {input_path} ...")
-        wb, ws, template_name = load_workbook(input_path)
-        log_print(">> 文件加载完成")
-
-        col_map = locate_columns(ws)
-        product_name_col = col_map["Item Name"]
-        log_print(f">> 列定位完成: {', '.join(col_map.keys())}")
-
-        groups = group_rows(ws)
-        if not groups:
-            log_print("[!] 没有可处理的数据")
-            output_path = save_workbook(ws, input_path, template_name, args.output)
-            log_print(f"输出文件: {output_path}")
-            return
-
-        total_rows = len(groups) * 11
-        log_print(f">> 共 {len(groups)} 个产品组, {total_rows} 行数据")
-        log_print("")
-
-        for idx, rows in enumerate(groups, 1):
-            ratio_type = detect_ratio_type(ws, rows, col_map)
-            log_print(f"  [{idx}/{len(groups)}] 比例: {ratio_type}")
-
-            normalize_group(ws, rows, product_name_col, ratio_type)
-            fill_group(ws, rows, col_map, ratio_type)
-
-        # SKU 命名 (单文件 = new 模式, 只有 parent + 普通子体, 无木金 J 后缀)
-        if args.sku:
-            prefix = build_sku_prefix(args.sku)
-            sku_col = col_map.get("SKU", 1)
-            parent_sku_col = col_map.get("Parent SKU", 5)
-            rewrite_sku(ws, groups, prefix, sku_col=sku_col, mode="new")
-            write_parent_sku_formulas(ws, groups, parent_sku_col=parent_sku_col,
-                                      seller_sku_col=sku_col, mode="new")
-            log_print(f">> SKU 命名完成: 前缀={prefix} (父体={prefix}-N, 普通子体={prefix}P-N)")
-
-        log_print("")
-        log_print(">> 保存文件...")
-        output_path = save_workbook(ws, input_path, template_name, args.output)
-
-        log_print("")
-        log_print("=" * 50)
-        log_print("  [OK] 处理完成")
-        log_print("=" * 50)
-        log_print(f"  产品组数: {len(groups)}")
-        log_print(f"  总行数:   {total_rows}")
-        log_print(f"  输出文件: {output_path}")
-        log_print("=" * 50)
-
+        run_single_file(input_path, log_print, sku_prefix=args.sku, output_path=args.output,
+                        compression=args.compression)
     except ValueError as e:
         logger.error("处理失败: %s", e)
         sys.exit(1)
@@ -9,14 +9,29 @@
   Item Weight(col147), List Price(col154)
 """
 
+import datetime
 import logging
 import os
+import zipfile
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Optional
 
 from openpyxl import load_workbook as _load_wb
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.worksheet.worksheet import Worksheet
 
+from .sheet_reader import SheetReader, UnsupportedSheet
+from .template_cache import TemplateCache, file_digest
+from .template_sheet import SharedStyleArray, TemplateSheet, cell_value, own_style, set_cell_value
+from .tsv_io import TSV_SUFFIXES, is_tsv_path, load_tsv, save_tsv
+from .xlsx_package import (
+    DEFAULT_COMPRESSION,
+    PassthroughUnsupported,
+    save_worksheet_passthrough,
+    zip_compression,
+)
+
 logger = logging.getLogger(__name__)
 
 REQUIRED_COLUMNS = ["Item Name"]
@@ -51,27 +66,42 @@ HEADER_ROW = 4      # 新格式: 列名在第 4 行
 DATA_START_ROW = 8  # 新格式: 数据从第 8 行开始
 GROUP_SIZE = 11     # 单文件模式 11 行/组; 合并时木/金用 6, 输出用 21
 
+SUPPORTED_SUFFIXES = (".xlsx", ".xlsm", *TSV_SUFFIXES)
+
+
+def _check_suffix(filepath: Path) -> None:
+    if filepath.suffix.lower() not in SUPPORTED_SUFFIXES:
+        raise ValueError(
+            f"不支持的文件格式: {filepath.suffix}，仅支持 {' / '.join(SUPPORTED_SUFFIXES)}"
+        )
+
+
+def _find_template_sheet_name(sheetnames: list[str]) -> str:
+    """在 sheet 名列表中找 Template sheet (不区分大小写), 找不到抛 ValueError。"""
+    for name in sheetnames:
+        if name.lower() == "template":
+            return name
+    available = ", ".join(sheetnames)
+    raise ValueError(f"找不到 'template' sheet。可用的 sheet: {available}")
+
 
 def load_workbook(filepath: str | Path):
-    """读取 Excel 文件，只保留 Template sheet 以加速处理。"""
+    """读取 Excel 文件，只保留 Template sheet 以加速处理。
+
+    Tab 分隔平面文件 (.txt) 读为 TemplateSheet, 此时返回的 wb 为 None。
+    """
     filepath = Path(filepath)
 
-    if filepath.suffix.lower() not in (".xlsx", ".xlsm"):
-        raise ValueError(f"不支持的文件格式: {filepath.suffix}，仅支持 .xlsx 和 .xlsm")
+    _check_suffix(filepath)
+    if is_tsv_path(filepath):
+        sheet = load_tsv(filepath)
+        return None, sheet, sheet.title
 
     keep_vba = filepath.suffix.lower() == ".xlsm"
     wb = _load_wb(str(filepath), keep_vba=keep_vba)
     logger.debug("openpyxl 加载完成, sheets=%s", wb.sheetnames)
 
-    sheet_name = None
-    for name in wb.sheetnames:
-        if name.lower() == "template":
-            sheet_name = name
-            break
-
-    if sheet_name is None:
-        available = ", ".join(wb.sheetnames)
-        raise ValueError(f"找不到 'template' sheet。可用的 sheet: {available}")
+    sheet_name = _find_template_sheet_name(wb.sheetnames)
 
     for name in list(wb.sheetnames):
         if name != sheet_name:
@@ -82,25 +112,245 @@ def load_workbook(filepath: str | Path):
     return wb, ws, sheet_name
 
 
-def locate_columns(ws: Worksheet, header_row: int = HEADER_ROW) -> dict[str, int]:
-    """扫描表头行 (第 4 行) 动态定位列索引。
+def _read_template_sheet(filepath: Path, max_row: Optional[int] = None) -> TemplateSheet:
+    """流式读取 Template sheet 的单元格值 (可只读前 max_row 行)。
 
-    新格式模板中 Row 4 是列名, Row 8 是数据。
-    返回 {列名: 列号(1-based)} 的映射。
+    优先用 sheet_reader (iterparse, 不创建 Cell 对象); 读取器不支持的内容
+    (共享/数组公式等) 或包结构异常时回退 openpyxl read-only 游标。
+    Tab 分隔平面文件直接按行读入。
     """
-    col_map: dict[str, int] = {}
+    if is_tsv_path(filepath):
+        return load_tsv(filepath, max_row=max_row)
+    try:
+        with SheetReader(filepath) as reader:
+            sheet_name = _find_template_sheet_name(reader.sheet_names)
+            sheet = TemplateSheet(title=sheet_name)
+            for row_idx, values in reader.iter_rows(sheet_name, max_row=max_row):
+                sheet.load_row(row_idx, values)
+            logger.debug("字符串驻留: %d 个取值, 省下 %d 字节", len(reader.pool), reader.pool.saved_bytes)
+        return sheet
+    except (UnsupportedSheet, zipfile.BadZipFile) as e:
+        logger.info("流式读取器不适用 (%s), 改用 openpyxl 只读加载: %s", e, filepath.name)
+
+    wb = _load_wb(str(filepath), read_only=True, keep_links=False)
+    try:
+        sheet_name = _find_template_sheet_name(wb.sheetnames)
+        src = wb[sheet_name]
+        # 不信任文件里的 <dimension> (可能偏小), 按实际行读取
+        src.reset_dimensions()
+        sheet = TemplateSheet(title=sheet_name)
+        for row_idx, values in enumerate(src.iter_rows(max_row=max_row, values_only=True), start=1):
+            if values:
+                sheet.load_row(row_idx, values)
+    finally:
+        wb.close()
+    return sheet
+
+
+def load_template_sheet(filepath: str | Path, cache: Optional[TemplateCache] = None) -> TemplateSheet:
+    """只读流式加载: 只解析 Template sheet, 返回只含单元格值的 TemplateSheet。
+
+    用 sheet_reader 逐行流式读取 Template (不可用时回退 openpyxl read-only),
+    Valid Values / Instructions / Data Definitions 等其他 sheet 不解析。适用于只读输入 (合并模式的木/金文件),
+    返回值可直接交给 locate_columns / group_rows, 结果与 load_workbook 一致。
+    需要修改并保存的文件仍走 load_workbook。
+
+    传入 cache 时先按文件内容哈希查缓存, 命中则完全跳过解析; 未命中解析后写回。
+    """
+    filepath = Path(filepath)
+
+    _check_suffix(filepath)
+
+    digest = None
+    if cache is not None:
+        digest = file_digest(filepath)
+        sheet = cache.get(digest)
+        if sheet is not None:
+            logger.info("使用解析缓存: %s", filepath.name)
+            return sheet
+
+    sheet = _read_template_sheet(filepath)
+    logger.debug("load_template_sheet: %s, max_row=%d, max_column=%d",
+                 filepath.name, sheet.max_row, sheet.max_column)
+    if cache is not None:
+        cache.put(digest, sheet)
+    return sheet
+
+
+# 预检读取的行数上限: 表头 + 足够看到第 2 个 Parent 的数据行 (主文件 11 行/组)
+PEEK_MAX_ROWS = DATA_START_ROW + 2 * GROUP_SIZE + 8
+
+
+def peek_template(filepath: str | Path, max_rows: int = PEEK_MAX_ROWS) -> tuple["HeaderIndex", Optional[int]]:
+    """预检: 只流式读取 Template sheet 前 max_rows 行, 不做完整解析。
+
+    读取第 4 行表头, 并只看 Parentage Level 列推断每组行数:
+    前两个 "Parent" 行的间距; 窗口内只有 1 个 Parent 时取到数据末尾的行数。
+
+    Returns:
+        (HeaderIndex, group_size)
+        group_size: 无数据行时为 0; 窗口内无法确定 (首组过长) 时为 None
+
+    Raises:
+        ValueError: 格式不支持 / 找不到 Template sheet / 缺少必需列 (与完整加载时一致)
+    """
+    filepath = Path(filepath)
+
+    _check_suffix(filepath)
+
+    sheet = _read_template_sheet(filepath, max_row=max_rows)
+
+    headers = HeaderIndex.from_sheet(sheet)
+    for req in REQUIRED_COLUMNS:
+        if req not in headers:
+            raise ValueError(f"必需列 '{req}' 在表头中未找到 (新格式应位于第 4 行)")
 
-    for col_idx in range(1, ws.max_column + 1):
-        cell_value = ws.cell(row=header_row, column=col_idx).value
-        if cell_value is None:
+    parentage_col = headers.find("Parentage Level") or 4
+    parent_rows = []
+    last_data = 0
+    for row in range(DATA_START_ROW, max_rows + 1):
+        v = sheet.value(row, parentage_col)
+        if v is None or str(v).strip() == "":
             continue
-        header = str(cell_value).strip()
-        all_columns = REQUIRED_COLUMNS + OPTIONAL_COLUMNS
-        for expected in all_columns:
-            if header.lower() == expected.lower():
-                col_map[expected] = col_idx
+        last_data = row
+        if str(v).strip().lower() == "parent":
+            parent_rows.append(row)
+            if len(parent_rows) == 2:
                 break
 
+    if not last_data:
+        group_size = 0
+    elif len(parent_rows) >= 2:
+        group_size = parent_rows[1] - parent_rows[0]
+    elif len(parent_rows) == 1 and last_data < max_rows:
+        # 窗口内数据已结束 (后面是空行/备注或文件末尾): 唯一的组到最后一个数据行为止
+        group_size = last_data - parent_rows[0] + 1
+    else:
+        group_size = None
+    logger.debug("peek_template: %s, %d 列表头, group_size=%s", filepath.name, len(headers.headers), group_size)
+    return headers, group_size
+
+
+# 列名别名: {规范列名: [其他写法, ...]}; 比较时不区分大小写、忽略首尾空格。
+# 同一表头里规范名优先于别名。默认不登记任何别名 (接受的模板与按原名匹配时一致),
+# 确有其他写法的模板时在此补充。
+HEADER_ALIASES: dict[str, list[str]] = {}
+
+
+def read_template_columns(filepath: str | Path, columns: list[int], min_row: int = DATA_START_ROW,
+                          gated: tuple[int, ...] = (),
+                          gate: Optional[tuple[int, str]] = None) -> list[tuple[int, tuple]]:
+    """只读 Template sheet 数据区的几列: [(行号, 按 columns + gated 顺序的值元组), ...], 全空的行不列出。
+
+    gated 中的列只在 gate = (列号, 取值) 命中的行读取, 其余行为 None (见 SheetReader.iter_column_values)。
+    xlsx/xlsm 用 sheet_reader 的 iter_column_values 只解码这几列 (其余单元格不解析);
+    平面文件或读取器不支持的内容 (共享公式等) 整表读取后取列。
+    """
+    filepath = Path(filepath)
+    _check_suffix(filepath)
+    wanted = [*columns, *gated]
+    if not is_tsv_path(filepath):
+        try:
+            with SheetReader(filepath) as reader:
+                sheet_name = _find_template_sheet_name(reader.sheet_names)
+                return [(row, tuple(values.get(c) for c in wanted))
+                        for row, values in reader.iter_column_values(sheet_name, columns, min_row=min_row,
+                                                                     gated=gated, gate=gate)]
+        except (UnsupportedSheet, zipfile.BadZipFile) as e:
+            logger.info("按列读取不适用 (%s), 整表读取: %s", e, filepath.name)
+
+    sheet = _read_template_sheet(filepath)
+    result = []
+    for row in range(min_row, sheet.max_row + 1):
+        picked = [sheet.value(row, c) for c in columns]
+        if gated:
+            v = sheet.value(row, gate[0])
+            hit = v is not None and str(v).strip().lower() == gate[1].lower()
+            picked += [sheet.value(row, c) if hit else None for c in gated]
+        if any(v is not None for v in picked):
+            result.append((row, tuple(picked)))
+    return result
+
+
+def _normalize_header(value) -> str:
+    return str(value).strip().lower()
+
+
+class HeaderIndex:
+    """表头行 (第 4 行) 的一次性索引: 规范化列名 → 列号, 哈希查找。
+
+    每个 worksheet 建一次, 在 locate_columns / scan_data_extent / cleanup_for_upload
+    之间传递, 各阶段不再重扫表头行。流水线只改数据区 (第 8 行起), 索引全程有效。
+
+    重复列名: find 取第一次出现的列 (与按列名查找的清理 / 预检一致),
+    find_last 取最后一次出现的列 (locate_columns 一直如此); 重复项记入 duplicates 并告警。
+    """
+
+    def __init__(self, headers: dict[int, str], aliases: Optional[dict[str, list[str]]] = None):
+        self.headers = headers  # {列号: 原始表头文本 (去空格)}
+        self._index: dict[str, int] = {}
+        self._last: dict[str, int] = {}
+        self.duplicates: dict[str, list[int]] = {}
+        for col, header in sorted(headers.items()):
+            key = _normalize_header(header)
+            if key in self._index:
+                self.duplicates.setdefault(key, [self._index[key]]).append(col)
+            else:
+                self._index[key] = col
+            self._last[key] = col
+        for canonical, names in (HEADER_ALIASES if aliases is None else aliases).items():
+            key = _normalize_header(canonical)
+            if key in self._index:
+                continue
+            for alias in names:
+                col = self._index.get(_normalize_header(alias))
+                if col:
+                    self._index[key] = col
+                    self._last[key] = self._last[_normalize_header(alias)]
+                    break
+        if self.duplicates:
+            logger.warning("表头有重复列名: %s", ", ".join(
+                f"{headers[cols[0]]}(列{'/'.join(map(str, cols))})" for cols in self.duplicates.values()
+            ))
+
+    @classmethod
+    def from_sheet(cls, ws: Worksheet, header_row: int = HEADER_ROW) -> "HeaderIndex":
+        headers = {}
+        for col_idx in range(1, ws.max_column + 1):
+            value = cell_value(ws, header_row, col_idx)
+            if value is not None and str(value).strip():
+                headers[col_idx] = str(value).strip()
+        return cls(headers)
+
+    def find(self, name: str) -> int:
+        """列名 (或别名) → 列号, 找不到返回 0。"""
+        return self._index.get(_normalize_header(name), 0)
+
+    def find_last(self, name: str) -> int:
+        """同 find, 重复列名时取最后一次出现的列。"""
+        return self._last.get(_normalize_header(name), 0)
+
+    def __contains__(self, name: str) -> bool:
+        return _normalize_header(name) in self._index
+
+
+def locate_columns(ws: Worksheet, header_row: int = HEADER_ROW,
+                   headers: Optional[HeaderIndex] = None) -> dict[str, int]:
+    """按表头行 (第 4 行) 动态定位列索引。
+
+    新格式模板中 Row 4 是列名, Row 8 是数据。
+    返回 {列名: 列号(1-based)} 的映射。
+
+    headers: 已建好的 HeaderIndex (同一 worksheet 复用); 不传则现建。
+    """
+    if headers is None:
+        headers = HeaderIndex.from_sheet(ws, header_row)
+    col_map: dict[str, int] = {}
+    for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        col = headers.find_last(name)
+        if col:
+            col_map[name] = col
+
     for req in REQUIRED_COLUMNS:
         if req not in col_map:
             raise ValueError(f"必需列 '{req}' 在表头中未找到 (新格式应位于第 4 行)")
@@ -116,52 +366,157 @@ def locate_columns(ws: Worksheet, header_row: int = HEADER_ROW) -> dict[str, int
     return col_map
 
 
-def _find_last_data_row(ws: Worksheet, start_row: int = DATA_START_ROW) -> int:
-    """找到最后一个真正数据行的行号。
+# 向下多探测的行数, 防止 max_row 偏小 (Windows 平台差异)
+EXTENT_PROBE_ROWS = 20
 
-    数据行的判定: Parentage Level 列 (col4) 有值 (Parent/Child)。
-    表格底部的备注/说明行 (如 "SKU命名（一样）"、"普/木/金" 等手动注释)
-    通常 Parentage Level 为空, 会被正确排除。
 
-    向下多探测 20 行, 防止 max_row 偏小 (Windows 平台差异)。
+@dataclass
+class DataExtent:
+    """数据区索引: 一次按列扫描 Parentage Level 得到, 分组 / 清空 / 保存前清理共用。
+
+    数据行的判定: Parentage Level 列有值 (Parent/Child)。表格底部的备注/说明行
+    (如 "SKU命名（一样）"、"普/木/金" 等手动注释) 通常 Parentage Level 为空, 不计入。
     """
-    check_limit = ws.max_row + 20
-    last_data_row = start_row - 1
-    logger.debug("_find_last_data_row: ws.max_row=%d, check_limit=%d", ws.max_row, check_limit)
 
-    for row in range(start_row, check_limit + 1):
-        # 用 Parentage Level (col4) 判断是否是数据行
-        parentage = ws.cell(row=row, column=4).value
-        has_data = parentage is not None and str(parentage).strip() != ""
-        if has_data:
-            last_data_row = row
+    first_row: int                 # 第一个数据行; 无数据时为 0
+    last_row: int                  # 最后一个数据行; 无数据时为 start_row - 1
+    scan_end: int                  # 扫描到的最后一行 (含向下探测), 清空数据区用
+    parentage: dict[int, str] = field(default_factory=dict)  # {数据行号: Parentage Level (去空格)}
+    parent_rows: list[int] = field(default_factory=list)    # Parentage Level 为 Parent 的行
+
+    @property
+    def data_row_count(self) -> int:
+        return len(self.parentage)
 
-    logger.debug("_find_last_data_row: result=%d (数据行数=%d)",
-                 last_data_row, last_data_row - start_row + 1 if last_data_row >= start_row else 0)
-    return last_data_row
 
+def extent_from_levels(levels, start_row: int = DATA_START_ROW, end_row: int = 0) -> DataExtent:
+    """(行号, Parentage Level 值) 按行号升序的序列 → DataExtent (判定规则见 scan_data_extent)。
+
+    只读了 Parentage Level 列的调用方 (如配对预检) 直接用读到的值建索引, 不必先装进 sheet。
+    """
+    parentage: dict[int, str] = {}
+    parent_rows: list[int] = []
+    for row, v in levels:
+        if v is None:
+            continue
+        v = str(v).strip()
+        if not v:
+            continue
+        parentage[row] = v
+        if v.lower() == "parent":
+            parent_rows.append(row)
 
-def group_rows(ws: Worksheet, group_size: int = GROUP_SIZE) -> list[list[int]]:
-    """将数据行按 group_size 行一组分组。
+    rows = list(parentage)
+    return DataExtent(
+        first_row=rows[0] if rows else 0,
+        last_row=rows[-1] if rows else start_row - 1,
+        scan_end=max(end_row, rows[-1] if rows else 0),
+        parentage=parentage,
+        parent_rows=parent_rows,
+    )
 
-    返回 [[row_num, ...], ...] 列表。
-    不完整尾部组记录警告并跳过。
+
+def scan_data_extent(
+    ws: Worksheet,
+    parentage_col: Optional[int] = None,
+    start_row: int = DATA_START_ROW,
+    end_row: Optional[int] = None,
+    headers: Optional[HeaderIndex] = None,
+) -> DataExtent:
+    """单次扫描 Parentage Level 列, 建立 DataExtent。
 
     Args:
-        ws: 目标 worksheet
-        group_size: 每组行数; 默认 11 (单文件模式),
-                    合并时木/金用 6, 输出用 21
+        parentage_col: Parentage Level 列号; 默认按表头 (headers 或现建索引) 查找, 找不到用第 4 列
+        end_row: 扫描终止行; 默认 max_row + EXTENT_PROBE_ROWS
+        headers: 已建好的 HeaderIndex
     """
-    last_row = _find_last_data_row(ws)
-    data_rows = list(range(DATA_START_ROW, last_row + 1))
-    logger.debug("group_rows: last_data_row=%d, total_data_rows=%d, group_size=%d",
-                 last_row, len(data_rows), group_size)
+    if parentage_col is None:
+        if headers is None:
+            headers = HeaderIndex.from_sheet(ws)
+        parentage_col = headers.find("Parentage Level") or 4
+    if end_row is None:
+        end_row = ws.max_row + EXTENT_PROBE_ROWS
+    extent = extent_from_levels(
+        ((row, cell_value(ws, row, parentage_col)) for row in range(start_row, end_row + 1)),
+        start_row, end_row,
+    )
+    logger.debug("scan_data_extent: 行 %d-%d, 数据行 %d, Parent %d 个 (扫描至 %d)",
+                 extent.first_row, extent.last_row, extent.data_row_count, len(extent.parent_rows), end_row)
+    return extent
+
+
+def _find_last_data_row(ws: Worksheet, start_row: int = DATA_START_ROW) -> int:
+    """找到最后一个真正数据行的行号 (见 scan_data_extent)。"""
+    return scan_data_extent(ws, parentage_col=4, start_row=start_row).last_row
+
+
+def group_rows(ws: Worksheet, group_size: Optional[int] = GROUP_SIZE,
+               extent: Optional[DataExtent] = None) -> list[range]:
+    """按 Parentage Level 分组: 每个 Parent 行开启一组, 到下一个 Parent 之前结束。
 
-    if not data_rows:
+    返回 [range(起始行, 结束行 + 1), ...]: 组描述符, 可像行号列表一样取下标 / len / 遍历,
+    组的 parent 行 = group[0]。
+
+    不规则组 (行数 != group_size, 组内夹空行, 第一个 Parent 之前的孤立行)
+    在同一遍扫描中记录警告并跳过, 不影响其后各组。整列没有 "Parent" 时
+    (旧模板) 退回按 group_size 定长切分。
+
+    Args:
+        ws: 目标 worksheet
+        group_size: 每组期望行数; 默认 11 (单文件模式), 合并时木/金用 6, 输出用 21;
+                    None = 不限 (接受任意大小的组)
+        extent: 已扫描的 DataExtent (可复用给清空/保存); 不传则现扫
+    """
+    if extent is None:
+        extent = scan_data_extent(ws)
+    if not extent.parentage:
         logger.warning("template sheet 没有数据行")
         return []
+    if not extent.parent_rows:
+        logger.info("Parentage Level 列没有 Parent, 按 %s 行定长分组", group_size)
+        return _group_rows_fixed(extent, group_size or GROUP_SIZE)
+
+    groups: list[range] = []
+    irregular: list[tuple[int, int, int]] = []  # (起始行, 结束行, 数据行数)
+    orphans: list[int] = []
+    start = prev = None
+    count = 0
+
+    def _close():
+        length = prev - start + 1
+        if count == length and (group_size is None or length == group_size):
+            groups.append(range(start, prev + 1))
+        else:
+            irregular.append((start, prev, count))
+
+    for row, level in extent.parentage.items():
+        if level.lower() == "parent":
+            if start is not None:
+                _close()
+            start, count = row, 0
+        elif start is None:
+            orphans.append(row)
+            continue
+        prev = row
+        count += 1
+    _close()
+
+    if orphans:
+        logger.warning("第一个 Parent 之前有 %d 个数据行 (行 %d-%d), 已跳过",
+                       len(orphans), orphans[0], orphans[-1])
+    for first, last, n in irregular:
+        logger.warning("行 %d-%d 的组不规则: %d 个数据行, 跨 %d 行 (期望 %s 行), 已跳过",
+                       first, last, n, last - first + 1, group_size)
+    logger.debug("group_rows: %d 个组, %d 个不规则组, group_size=%s, 首组=%s, 末组=%s",
+                 len(groups), len(irregular), group_size,
+                 groups[0] if groups else "N/A",
+                 groups[-1] if groups else "N/A")
+    return groups
 
-    total = len(data_rows)
+
+def _group_rows_fixed(extent: DataExtent, group_size: int) -> list[range]:
+    """旧模板 (无 Parent 标记): 数据行按 group_size 行定长切分, 不完整尾部组跳过。"""
+    total = extent.last_row - DATA_START_ROW + 1
     complete_groups = total // group_size
     remainder = total % group_size
 
@@ -171,48 +526,86 @@ def group_rows(ws: Worksheet, group_size: int = GROUP_SIZE) -> list[list[int]]:
             total, group_size, remainder,
         )
 
-    groups = []
-    for i in range(complete_groups):
-        start = i * group_size
-        group = data_rows[start: start + group_size]
-        groups.append(group)
+    return [
+        range(DATA_START_ROW + i * group_size, DATA_START_ROW + (i + 1) * group_size)
+        for i in range(complete_groups)
+    ]
 
-    logger.debug("group_rows: %d 个完整组, group_size=%d, 首组=%s, 末组=%s",
-                 len(groups), group_size,
-                 groups[0] if groups else "N/A",
-                 groups[-1] if groups else "N/A")
-    return groups
 
+# 目标被占用时最多改用几个序号文件名 (_2, _3, ...)
+MAX_OUTPUT_FALLBACKS = 5
 
-def _can_write(path: Path) -> bool:
-    """检测文件是否可写入（未被其他进程锁定）。"""
-    if not path.exists():
-        return True
+
+def _reserve_path(path: Path) -> bool:
+    """以 O_EXCL 新建空文件占住该文件名; 已存在返回 False (并发进程之间无需加锁)。"""
     try:
-        os.remove(str(path))
-        return True
-    except (PermissionError, OSError):
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+    except FileExistsError:
         return False
+    return True
 
 
-def _resolve_output_path(input_path: Path, output_path: Optional[Path], suffix: str = "_processed") -> Path:
-    """确定输出文件路径，若目标被占用则自动加序号。"""
-    if output_path is None:
-        base = input_path.parent / f"{input_path.stem}{suffix}{input_path.suffix}"
-    else:
-        base = output_path
+def _temp_output_path(target: Path) -> Path:
+    """在目标目录下占一个临时文件名 (扩展名与目标相同, 按扩展名分派的保存逻辑不受影响)。"""
+    while True:
+        tmp = target.parent / f".{target.stem}.{os.getpid()}-{os.urandom(4).hex()}.tmp{target.suffix}"
+        if _reserve_path(tmp):
+            return tmp
 
-    if _can_write(base):
-        logger.debug("_resolve_output_path: 使用 %s", base.name)
-        return base
 
-    for i in range(2, 100):
-        candidate = base.parent / f"{base.stem}_{i}{base.suffix}"
-        if _can_write(candidate):
-            logger.warning("输出文件 %s 被占用，改用 %s", base.name, candidate.name)
-            return candidate
+def _commit_output(tmp: Path, target: Path) -> Path:
+    """把写完的临时文件原子替换到目标路径, 返回最终路径。
 
-    raise OSError(f"无法创建输出文件: {base}")
+    目标被占用 (如 Windows 上正被 Excel 打开) 时改用 {stem}_2 ... {stem}_{1+MAX_OUTPUT_FALLBACKS}:
+    先找还不存在的序号名 (O_EXCL 占住再替换, 并行的批量进程不会选中同一个名字);
+    序号名都已存在时覆盖其中最旧且未被占用的一个, 反复对着被锁文件重跑不会越积越多。
+    改用序号名时记警告, 写明目标路径未写入以及实际写到的路径。
+    """
+    try:
+        os.replace(tmp, target)
+        logger.debug("_commit_output: 使用 %s", target.name)
+        return target
+    except PermissionError:
+        pass
+    candidates = [target.parent / f"{target.stem}_{i}{target.suffix}"
+                  for i in range(2, MAX_OUTPUT_FALLBACKS + 2)]
+    for candidate in candidates:
+        if _reserve_path(candidate) and _replace_or_release(tmp, candidate, reserved=True):
+            return _warn_fallback(target, candidate)
+    for candidate in sorted(candidates, key=_mtime):
+        if _replace_or_release(tmp, candidate, reserved=False):
+            return _warn_fallback(target, candidate)
+    tmp.unlink(missing_ok=True)
+    raise OSError(f"无法创建输出文件: {target} (序号文件 _2 ~ _{MAX_OUTPUT_FALLBACKS + 1} 也都被占用)")
+
+
+def _replace_or_release(tmp: Path, candidate: Path, reserved: bool) -> bool:
+    try:
+        os.replace(tmp, candidate)
+    except OSError:
+        if reserved:
+            candidate.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _warn_fallback(target: Path, written: Path) -> Path:
+    logger.warning("输出文件被占用, 未写入: %s; 结果已保存到: %s", target, written)
+    return written
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _resolve_output_path(input_path: Path, output_path: Optional[Path], suffix: str = "_processed") -> Path:
+    """确定输出文件路径 (只计算, 不碰文件; 写入走临时文件 + _commit_output)。"""
+    if output_path is None:
+        return input_path.parent / f"{input_path.stem}{suffix}{input_path.suffix}"
+    return output_path
 
 
 def save_workbook(
@@ -221,20 +614,65 @@ def save_workbook(
     template_name: str,
     output_path: Optional[str | Path] = None,
     suffix: str = "_processed",
+    extent: Optional[DataExtent] = None,
+    headers: Optional[HeaderIndex] = None,
+    compression: str = DEFAULT_COMPRESSION,
 ):
     """保存 worksheet 为新的 Excel 文件，保留 VBA 宏。
 
     保存前自动调用 cleanup_for_upload 清理会导致亚马逊上传失败的字段。
+
+    输入文件存在且输出扩展名与输入一致时走包级直通保存: 源文件其余 part 原样复制,
+    只重新生成 Template sheet XML (见 xlsx_package); 无法直通时回退 openpyxl 全量保存。
+    输出为 .txt 时写 Tab 分隔平面文件 (见 tsv_io)。
+    先写到目标目录下的临时文件, 写完再原子替换到位: 保存中途出错时原有输出文件保持不变。
+    extent / headers: 数据区 / 表头索引, 透传给 cleanup_for_upload 免去再扫一遍。
+    compression: 输出 zip 压缩档位 stored / fast / max (见 xlsx_package.COMPRESSION_LEVELS);
+                 最终上传文件默认 max, 批量场景可用 fast / stored 换保存速度。平面文件忽略。
     """
-    cleanup_for_upload(ws)
+    zip_compression(compression)  # 未知档位在清理 / 写文件之前报错
+    cleanup_for_upload(ws, extent, headers)
     input_path = Path(input_path)
     wb = ws.parent
     out = _resolve_output_path(input_path, Path(output_path) if output_path else None, suffix=suffix)
-    wb.save(str(out))
-    logger.info("保存文件: %s", out)
+    tmp = _temp_output_path(out)
+    try:
+        if is_tsv_path(out):
+            save_tsv(ws, tmp)
+        elif not _save_passthrough(ws, input_path, tmp, template_name, compression):
+            _save_openpyxl(wb, tmp, compression)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    out = _commit_output(tmp, out)
+    logger.info("保存文件: %s (压缩: %s)", out, compression)
     return out
 
 
+def _save_openpyxl(wb, out: Path, compression: str) -> None:
+    """openpyxl 全量保存 (与 Workbook.save 相同, 只是 zip 压缩档位可选)。"""
+    from openpyxl.writer.excel import ExcelWriter
+
+    compress_type, level = zip_compression(compression)
+    archive = zipfile.ZipFile(str(out), "w", compress_type, allowZip64=True, compresslevel=level)
+    wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    ExcelWriter(wb, archive).save()
+
+
+def _save_passthrough(ws: Worksheet, input_path: Path, out: Path, template_name: str,
+                      compression: str = DEFAULT_COMPRESSION) -> bool:
+    """尝试包级直通保存, 成功返回 True; 不适用或失败返回 False (由调用方回退 openpyxl)。"""
+    if not input_path.is_file() or out.suffix.lower() != input_path.suffix.lower():
+        return False
+    try:
+        save_worksheet_passthrough(ws, input_path, out, template_name, compression=compression)
+    except (PassthroughUnsupported, zipfile.BadZipFile) as e:
+        logger.info("直通保存不可用 (%s), 改用 openpyxl 全量保存", e)
+        return False
+    logger.debug("_save_passthrough: 直通保存 %s → %s", input_path.name, out.name)
+    return True
+
+
 # 亚马逊上传时会导致错误的字段 (需在保存前清空)
 # Package Contains 字段仅用于套装商品, 普通单品填了会导致 8007/990100 错误
 _CLEANUP_COLUMNS_BOTH = [
@@ -255,15 +693,15 @@ _CLEANUP_COLUMNS_PARENT_ONLY = [
 
 
 def _find_col_by_header(ws: Worksheet, header_name: str, header_row: int = HEADER_ROW) -> int:
-    """按列名查找列号 (不依赖 col_map), 找不到返回 0。"""
-    for c in range(1, ws.max_column + 1):
-        v = ws.cell(row=header_row, column=c).value
-        if v is not None and str(v).strip().lower() == header_name.lower():
-            return c
-    return 0
+    """按列名查找列号 (不依赖 col_map), 找不到返回 0。
+
+    每次调用都扫描表头行; 需要查多列时先建 HeaderIndex。
+    """
+    return HeaderIndex.from_sheet(ws, header_row).find(header_name)
 
 
-def cleanup_for_upload(ws: Worksheet) -> None:
+def cleanup_for_upload(ws: Worksheet, extent: Optional[DataExtent] = None,
+                       headers: Optional[HeaderIndex] = None) -> None:
     """清理会导致亚马逊上传失败的字段。
 
     规则 (基于成功上传文件 XL817塔罗杂普_processed 与失败文件 ZJM817旅游普_processed 的对比):
@@ -272,45 +710,57 @@ def cleanup_for_upload(ws: Worksheet) -> None:
          普通单品填了会导致 990100 警告 + 8007 父体创建失败。
       2. Parent 行的 Item Package Length/Width/Height/Weight + 对应 Unit (col208-215):
          全部 Parent 行清空。虚拟父体没有实际包装尺寸, 只有 Child 子体才保留。
-    """
-    # 1. 全部行: 清空 Package Contains 字段
-    cols_both = [_find_col_by_header(ws, n) for n in _CLEANUP_COLUMNS_BOTH]
-    cols_both = [c for c in cols_both if c > 0]
 
-    # 2. 仅 Parent 行: 清空包装尺寸字段
-    cols_parent = [_find_col_by_header(ws, n) for n in _CLEANUP_COLUMNS_PARENT_ONLY]
-    cols_parent = [c for c in cols_parent if c > 0]
+    extent: 调用方已有的 DataExtent (行的 Parentage Level 在此之后未再改动); 不传则现扫。
+    headers: 调用方已有的 HeaderIndex; 不传则现建 (表头行只扫一次)。
+    """
+    if headers is None:
+        headers = HeaderIndex.from_sheet(ws)
 
+    cols_both, cols_parent = upload_cleanup_columns(headers)
     if not cols_both and not cols_parent:
         return  # 模板里没这些列, 无需清理
 
-    parentage_col = _find_col_by_header(ws, "Parentage Level")
-    if parentage_col == 0:
-        parentage_col = 4  # 默认列号
+    if extent is None:
+        extent = scan_data_extent(ws, end_row=ws.max_row, headers=headers)
+
+    cleaned_both, cleaned_parent = clear_upload_fields(ws, extent, cols_both, cols_parent)
+    if cleaned_both or cleaned_parent:
+        logger.info("cleanup_for_upload: 清空 Package Contains %d 格, Parent 包装尺寸 %d 格",
+                    cleaned_both, cleaned_parent)
+
 
+def upload_cleanup_columns(headers: HeaderIndex) -> tuple[list[int], list[int]]:
+    """cleanup_for_upload 要清理的列号: (全部行清空的列, 仅 Parent 行清空的列)。"""
+    # 1. 全部行: 清空 Package Contains 字段
+    cols_both = [headers.find(n) for n in _CLEANUP_COLUMNS_BOTH]
+    # 2. 仅 Parent 行: 清空包装尺寸字段
+    cols_parent = [headers.find(n) for n in _CLEANUP_COLUMNS_PARENT_ONLY]
+    return [c for c in cols_both if c > 0], [c for c in cols_parent if c > 0]
+
+
+def clear_upload_fields(ws: Worksheet, extent: DataExtent,
+                        cols_both: list[int], cols_parent: list[int]) -> tuple[int, int]:
+    """按 extent 中的数据行清空上传字段, 返回 (Package Contains 清空格数, Parent 包装尺寸清空格数)。
+
+    流式输出逐组调用, 由调用方汇总计数后记一次日志。
+    """
     cleaned_both = 0
     cleaned_parent = 0
-    for r in range(DATA_START_ROW, ws.max_row + 1):
-        parentage = ws.cell(row=r, column=parentage_col).value
-        if parentage is None or str(parentage).strip() == "":
-            continue  # 非数据行
-
+    for r, parentage in extent.parentage.items():
         # 清空 Package Contains (所有数据行)
         for c in cols_both:
-            if ws.cell(row=r, column=c).value is not None:
-                ws.cell(row=r, column=c).value = None
+            if cell_value(ws, r, c) is not None:
+                set_cell_value(ws, r, c, None)
                 cleaned_both += 1
 
         # 清空 Parent 行的包装尺寸
-        if str(parentage).strip().lower() == "parent":
+        if parentage.lower() == "parent":
             for c in cols_parent:
-                if ws.cell(row=r, column=c).value is not None:
-                    ws.cell(row=r, column=c).value = None
+                if cell_value(ws, r, c) is not None:
+                    set_cell_value(ws, r, c, None)
                     cleaned_parent += 1
-
-    if cleaned_both or cleaned_parent:
-        logger.info("cleanup_for_upload: 清空 Package Contains %d 格, Parent 包装尺寸 %d 格",
-                    cleaned_both, cleaned_parent)
+    return cleaned_both, cleaned_parent
 
 
 def copy_cell_style(src_cell, dst_cell) -> None:
@@ -323,4 +773,48 @@ def copy_cell_style(src_cell, dst_cell) -> None:
     (如把 E8 的深色填充复制到新生成 group 的 parent 行 Parent SKU 列)。
     """
     from copy import copy as _copy
+    if not hasattr(src_cell, "_style") or not hasattr(dst_cell, "_style"):
+        return  # 纯值 sheet (TemplateSheet, 如 .txt 输入) 没有样式
     dst_cell._style = _copy(src_cell._style)
+
+
+class StyleInterner:
+    """单元格样式驻留表: 相同的样式只保留一个 StyleArray, 由所有用到它的单元格共用。
+
+    同一格式 (如 E8 的涂黑) 要套到每个产品组上时, 用 template_style 每个坐标只解析
+    一次模板单元格 (不再逐组读源单元格), 再用 assign 挂到目标单元格上。
+
+    assign 直接挂共享数组 (SharedStyleArray), 每种样式只建一个对象。openpyxl 改样式是
+    原地改 _style, 所以共享数组按写时复制处理: 改某个单元格的样式前先 own (即
+    own_style), 只有这时才给它一份副本; set_cell_value / set_row_values 写日期值时自动处理。
+    """
+
+    def __init__(self):
+        self._styles: dict[tuple, object] = {}
+        self._anchors: dict[tuple, object] = {}
+
+    def __len__(self) -> int:
+        return len(self._styles)
+
+    def intern(self, style):
+        """返回与 style 内容相同的共享 StyleArray (None 即默认样式)。"""
+        key = tuple(style) if style is not None else tuple(StyleArray())
+        shared = self._styles.get(key)
+        if shared is None:
+            shared = self._styles[key] = SharedStyleArray(key)
+        return shared
+
+    def template_style(self, ws, row: int, column: int):
+        """模板单元格的共享样式 (每个坐标只解析一次); 纯值 sheet 返回 None。"""
+        key = (ws.title, row, column)
+        if key not in self._anchors:
+            src = ws.cell(row=row, column=column)
+            self._anchors[key] = self.intern(src._style) if hasattr(src, "_style") else None
+        return self._anchors[key]
+
+    def assign(self, dst_cell, style) -> None:
+        """把驻留样式挂到目标单元格 (style 为 None 或目标没有样式时什么也不做)。"""
+        if style is not None and hasattr(dst_cell, "_style"):
+            dst_cell._style = style
+
+    own = staticmethod(own_style)
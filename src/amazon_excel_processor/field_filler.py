@@ -5,6 +5,8 @@ import re
 
 from openpyxl.worksheet.worksheet import Worksheet
 
+from .template_sheet import cell_value
+
 logger = logging.getLogger(__name__)
 
 # ===== 合并模式 21 元素序列 =====
@@ -336,7 +338,7 @@ def detect_ratio_type(
     for i, row in enumerate(rows):
         if i == 0:  # 跳过 parent 行（本就为空）
             continue
-        value = ws.cell(row=row, column=size_col).value
+        value = cell_value(ws, row, size_col)
         if value is None or not str(value).strip():
             continue
         # 解析 Size 值中的数字，比较前两个判断长宽是否相等
@@ -358,7 +360,7 @@ def clean_search_terms(
         return
     col_idx = col_map["Search Terms"]
     for row in rows:
-        value = ws.cell(row=row, column=col_idx).value
+        value = cell_value(ws, row, col_idx)
         if value is not None and isinstance(value, str) and "_" in value:
             ws.cell(row=row, column=col_idx).value = value.replace("_", " ")
 
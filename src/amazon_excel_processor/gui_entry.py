@@ -1,7 +1,7 @@
 """GUI 友好入口 — 支持拖拽文件或双击运行（无需命令行）
 
 模式:
-  1) 单文件处理 — 单个 .xlsm/.xlsx 走原 normalize + fill 流程
+  1) 单文件处理 — 单个 .xlsm/.xlsx (或 Tab 分隔 .txt 平面文件) 走原 normalize + fill 流程
   2) 三文件合并 — 普文件(主) + 木框文件 + 金框文件, 输出 21 行/组 的新文件
 
 CLI 行为:
@@ -17,6 +17,8 @@ import re
 import traceback
 from pathlib import Path
 
+from amazon_excel_processor.xlsx_package import COMPRESSION_LEVELS, DEFAULT_COMPRESSION
+
 # Windows 控制台编码修复
 if sys.stdout and hasattr(sys.stdout, "reconfigure"):
     try:
@@ -65,74 +67,27 @@ def _prompt_choice(prompt: str, choices: list) -> str:
         print(f"  请输入 {'/'.join(choices)} 之一")
 
 
-def _run_single(input_path: Path, flog: logging.Logger, sku_prefix: str = ""):
-    from amazon_excel_processor.excel_io import load_workbook, locate_columns, group_rows, save_workbook
-    from amazon_excel_processor.name_normalizer import normalize_group
-    from amazon_excel_processor.field_filler import detect_ratio_type, fill_group
-    from amazon_excel_processor.merger import rewrite_sku, write_parent_sku_formulas
+def _run_single(input_path: Path, flog: logging.Logger, sku_prefix: str = "",
+                compression: str = DEFAULT_COMPRESSION):
+    from amazon_excel_processor.single_file import run_single_file
 
     def log(msg: str):
         print(msg, flush=True)
         flog.info(msg.strip())
 
-    log(f"\n>> 读取文件: {input_path.name} ...")
-    wb, ws, template_name = load_workbook(input_path)
-    flog.info("sheet='%s', max_row=%d, max_column=%d", template_name, ws.max_row, ws.max_column)
-    log(">> 文件加载完成")
-
-    col_map = locate_columns(ws)
-    product_name_col = col_map["Item Name"]
-    found_cols = sorted(col_map.items(), key=lambda x: x[1])
-    col_info = ', '.join(f'{name}(列{idx})' for name, idx in found_cols)
-    log(f">> 列定位完成: {col_info}")
-
-    groups = group_rows(ws)
-    if not groups:
-        log("[!] 没有可处理的数据")
-        output_path = save_workbook(ws, input_path, template_name)
-        log(f"输出文件: {output_path}")
-        return
-
-    total_rows = len(groups) * 11
-    log(f">> 共 {len(groups)} 个产品组, {total_rows} 行数据\n")
-
-    for idx, rows in enumerate(groups, 1):
-        ratio_type = detect_ratio_type(ws, rows, col_map)
-        log(f"  [{idx}/{len(groups)}] 行{rows[0]}-{rows[-1]} 比例: {ratio_type}")
-        normalize_group(ws, rows, product_name_col, ratio_type)
-        fill_group(ws, rows, col_map, ratio_type)
-
-    # SKU 命名 (单文件 = new 模式, 只有 parent + 普通子体, 无木金 J 后缀)
-    if sku_prefix:
-        from amazon_excel_processor.merger import build_sku_prefix
-        prefix = build_sku_prefix(sku_prefix)
-        sku_col = col_map.get("SKU", 1)
-        parent_sku_col = col_map.get("Parent SKU", 5)
-        rewrite_sku(ws, groups, prefix, sku_col=sku_col, mode="new")
-        write_parent_sku_formulas(ws, groups, parent_sku_col=parent_sku_col,
-                                  seller_sku_col=sku_col, mode="new")
-        log(f">> SKU 命名完成: 前缀={prefix} (父体={prefix}-N, 普通子体={prefix}P-N)")
-
-    log("\n>> 保存文件...")
-    output_path = save_workbook(ws, input_path, template_name)
-    flog.info("输出文件: %s", output_path)
-
     log("")
-    log("=" * 50)
-    log("  [OK] 处理完成")
-    log("=" * 50)
-    log(f"  产品组数: {len(groups)}")
-    log(f"  总行数:   {total_rows}")
-    log(f"  输出文件: {output_path}")
-    log("=" * 50)
+    run_single_file(input_path, log, sku_prefix=sku_prefix, compression=compression)
 
 
-def _run_merge(main_path: Path, wood_path, gold_path, flog: logging.Logger):
+def _run_merge(main_path: Path, wood_path, gold_path, flog: logging.Logger,
+               use_cache: bool = True, compression: str = DEFAULT_COMPRESSION):
     """合并流程 (主必填, 木/金可选)。
 
     wood_path / gold_path 可为 Path 或 None (None 表示该文件未提供)。
+    use_cache: 使用本地解析缓存 (--no-cache 关闭)。
+    compression: 输出压缩档位 (--compression)。
     """
-    from amazon_excel_processor.merger import merge_files
+    from amazon_excel_processor.merger import merge_files, prevalidate_inputs
 
     def log(msg: str):
         print(msg, flush=True)
@@ -149,6 +104,9 @@ def _run_merge(main_path: Path, wood_path, gold_path, flog: logging.Logger):
     log(f"  金框文件:    {gold_disp}")
     log("")
 
+    # 先快速预检文件类型/表头, 错误文件不必等到选完模式、输完 SKU 才报错
+    prevalidate_inputs(main_path, wood_path, gold_path)
+
     # 第 1 步: 选择上架类型
     log("请选择上架类型:")
     log("  1) 新品上架      (所有 SKU 按新命名规则重新编号, 输出含普内容)")
@@ -188,6 +146,8 @@ def _run_merge(main_path: Path, wood_path, gold_path, flog: logging.Logger):
         gold_path=gold_path,
         sku_prefix=sku_prefix,
         mode=mode,
+        use_cache=use_cache,
+        compression=compression,
     )
     flog.info("合并输出: %s (mode=%s)", output_path, mode)
 
@@ -199,7 +159,23 @@ def _run_merge(main_path: Path, wood_path, gold_path, flog: logging.Logger):
     log("=" * 50)
 
 
+def _run_check_pairing(main_path: Path, wood_path, gold_path, flog: logging.Logger):
+    """配对预检 (--check-pairing): 只读 Item Name 列检查木/金配对, 不合并、不写输出。"""
+    from amazon_excel_processor.merger import preflight_pairing
+
+    def log(msg: str):
+        print(msg, flush=True)
+        flog.info(msg.strip())
+
+    log(f">> 配对预检: {main_path.name} + 木框 {wood_path.name if wood_path else '(未提供)'}"
+        f" + 金框 {gold_path.name if gold_path else '(未提供)'}")
+    count = preflight_pairing(main_path, wood_path, gold_path)
+    log(f"  [OK] {count} 个普文件产品均能配对, 可以开始合并")
+
+
 def main():
+    from amazon_excel_processor.excel_io import SUPPORTED_SUFFIXES
+
     parser = argparse.ArgumentParser(description=f"亚马逊 Excel 模板批量处理工具 v{VERSION}")
     parser.add_argument("files", nargs="*",
                         help="1 个=单文件; 3 个=合并 (主 木 金); 木/金可选时用 1 个普文件 + --wood/--gold")
@@ -207,6 +183,12 @@ def main():
     parser.add_argument("--wood", help="木框文件路径 (合并模式, 可选)")
     parser.add_argument("--gold", help="金框文件路径 (合并模式, 可选)")
     parser.add_argument("--sku", help="SKU 命名前缀 (单文件模式, 如 HM725; 不提供则不重写 SKU)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="不使用本地解析缓存 (合并模式; 默认对内容未变的木/金文件跳过重新解析)")
+    parser.add_argument("--compression", choices=list(COMPRESSION_LEVELS), default=DEFAULT_COMPRESSION,
+                        help="输出压缩: stored 不压缩 / fast 快速 (批量 / 监控目录) / max 最小体积 (默认)")
+    parser.add_argument("--check-pairing", action="store_true",
+                        help="合并模式: 只检查普/木/金产品能否配对 (只读 Item Name 列), 不合并")
     args = parser.parse_args()
     interactive = not args.files  # 无命令行参数 = 交互式 GUI 模式
 
@@ -225,7 +207,7 @@ def main():
 
             if choice == "1":
                 print()
-                print("  请将 .xlsm / .xlsx 文件拖到此处, 或粘贴路径:")
+                print("  请将 .xlsm / .xlsx / .txt 文件拖到此处, 或粘贴路径:")
                 raw = _prompt_path("  文件路径: ")
                 if not raw:
                     print("未输入文件路径")
@@ -234,7 +216,7 @@ def main():
                 if not p.exists():
                     print(f"ERROR: 文件不存在: {p}")
                     pause_exit(1)
-                if p.suffix.lower() not in (".xlsx", ".xlsm"):
+                if p.suffix.lower() not in SUPPORTED_SUFFIXES:
                     print(f"ERROR: 不支持的文件格式: {p.suffix}")
                     pause_exit(1)
                 # SKU 前缀 (必填, 与合并模式一致)
@@ -301,8 +283,15 @@ def main():
                 flog = _setup_file_logger(p_main.parent)
                 flog.info("版本: %s, 模式: merge (CLI, wood=%s, gold=%s)", VERSION,
                           bool(p_wood), bool(p_gold))
-                _run_merge(p_main, p_wood, p_gold, flog)
+                if args.check_pairing:
+                    _run_check_pairing(p_main, p_wood, p_gold, flog)
+                else:
+                    _run_merge(p_main, p_wood, p_gold, flog, use_cache=not args.no_cache,
+                               compression=args.compression)
             else:
+                if args.check_pairing:
+                    print("ERROR: --check-pairing 只用于合并模式 (3 个文件 或 1 个普文件 + --wood/--gold)")
+                    sys.exit(1)
                 if len(args.files) != 1:
                     print("ERROR: 单文件模式只接受 1 个文件 (合并: 3 个文件 或 1 个普文件 + --wood/--gold)")
                     sys.exit(1)
@@ -310,12 +299,12 @@ def main():
                 if not p.exists():
                     print(f"ERROR: 文件不存在: {p}")
                     sys.exit(1)
-                if p.suffix.lower() not in (".xlsx", ".xlsm"):
+                if p.suffix.lower() not in SUPPORTED_SUFFIXES:
                     print(f"ERROR: 不支持的文件格式: {p.suffix}")
                     sys.exit(1)
                 flog = _setup_file_logger(p.parent)
                 flog.info("版本: %s, 模式: single (CLI)", VERSION)
-                _run_single(p, flog, sku_prefix=args.sku or "")
+                _run_single(p, flog, sku_prefix=args.sku or "", compression=args.compression)
     except ValueError as e:
         # 业务错误 (如同名产品重复, 文件类型不符): 给用户清晰提示, traceback 只进 log
         if flog:
@@ -341,4 +330,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # PyInstaller 打包后合并模式的进程池需要 (子进程入口)
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
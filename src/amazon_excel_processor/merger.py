@@ -23,11 +23,24 @@ from openpyxl.worksheet.worksheet import Worksheet
 
 from .excel_io import (
     DATA_START_ROW,
+    PEEK_MAX_ROWS,
+    HeaderIndex,
+    StyleInterner,
+    cell_value,
+    extent_from_levels,
     group_rows,
+    load_template_sheet,
     load_workbook,
     locate_columns,
+    peek_template,
+    read_template_columns,
     save_workbook,
+    scan_data_extent,
 )
+from .template_cache import TemplateCache, file_digest
+from .template_sheet import InternPool, TemplateSheet, detach_rows, row_values, set_row_values
+from .template_stream import GroupReader, StreamUnsupported, TemplateStream
+from .xlsx_package import DEFAULT_COMPRESSION
 from .field_filler import (
     fill_group_merged,
     build_active_styles,
@@ -107,6 +120,136 @@ def identify_file_role(groups):
     return "unknown", None
 
 
+_VARIANT_LABELS = {"wood": "木框文件", "gold": "金框文件"}
+_EXPECTED_ROLE_DESC = {
+    "main": f"main ({MAIN_GROUP_SIZE} 行/组)",
+    "variant": f"variant ({VARIANT_GROUP_SIZE} 行/组)",
+}
+
+
+def prevalidate_input(path, expected_role, label="文件"):
+    """完整加载前的快速预检: 只读表头 + 前几十行, 毫秒级拒绝明显错误的输入。
+
+    检查必需列 (Item Name) 和按 Parentage Level 推断的每组行数,
+    错误信息与完整加载后的 locate_columns / identify_file_role 检查一致。
+    前几十行内无法确定组大小时放行, 交给完整加载后的检查。
+
+    Args:
+        path: 输入文件
+        expected_role: "main" 或 "variant"
+        label: 报错时的文件称呼 (如 "主文件" / "木框文件")
+
+    Returns:
+        表头 HeaderIndex (peek 时已建, 调用方可复用)
+    """
+    path = Path(path)
+    headers, group_size = peek_template(path)
+    if group_size is None:
+        logger.debug("prevalidate_input: %s 前 %d 行内无法确定组大小, 跳过角色预检",
+                     path.name, PEEK_MAX_ROWS)
+        return headers
+    role, _ = identify_file_role([range(group_size)] if group_size else [])
+    if role != expected_role:
+        raise ValueError(
+            f"{label}类型错误: {path.name} 是 {role}, 期望 {_EXPECTED_ROLE_DESC[expected_role]}"
+        )
+    return headers
+
+
+def prevalidate_inputs(main_path, wood_path=None, gold_path=None):
+    """合并前依次预检 主/木/金 文件 (木/金可为 None)。
+
+    Returns:
+        {"main" / "wood" / "gold": HeaderIndex}, 只含给出的文件
+    """
+    headers = {"main": prevalidate_input(main_path, "main", "主文件")}
+    for role, path in (("wood", wood_path), ("gold", gold_path)):
+        if path is not None:
+            headers[role] = prevalidate_input(path, "variant", _VARIANT_LABELS[role])
+    return headers
+
+
+def _pairing_groups(path, headers, group_size, name_col):
+    """只读 Parentage Level 列和 Parent 行的 Item Name, 按合并时的规则分组 (group_rows)。
+
+    Returns:
+        (只含 Parent 行名称的 sheet, 规则组列表, 被跳过的不规则组 Parent 行)
+    """
+    parentage_col = headers.find("Parentage Level") or COL_PARENTAGE
+    sheet = TemplateSheet()
+    levels = []
+    for row, (level, name) in read_template_columns(path, [parentage_col], gated=(name_col,),
+                                                    gate=(parentage_col, "parent")):
+        levels.append((row, level))
+        if name is not None:
+            sheet.set_value(row, name_col, name)
+    extent = extent_from_levels(levels)
+    groups = group_rows(sheet, group_size=group_size, extent=extent)
+    grouped_parents = {g[0] for g in groups}
+    return sheet, groups, [r for r in extent.parent_rows if r not in grouped_parents]
+
+
+def preflight_pairing(main_path, wood_path=None, gold_path=None):
+    """配对预检 (dry run): 只读各文件的 Parentage Level / Item Name 两列, 不做合并、不写输出。
+
+    分组、文件角色和不规则组检查与 merge_files 相同: 主文件有不规则组时同样报错;
+    木/金文件的不规则组在合并时会被跳过, 连同因此配不上的产品一起报告。
+    配对按合并时的规则 (归一化基名, 同名产品按出现顺序), 配不上的普文件产品
+    与完整合并时一样一次全部报错并列出候选; 不解析其余列也不写文件,
+    可在正式合并前先修正名称。
+
+    Returns:
+        普文件产品数
+
+    Raises:
+        ValueError: 文件类型不符 / 主文件有不规则组 / 有配不上的产品
+    """
+    headers = prevalidate_inputs(main_path, wood_path, gold_path)
+    name_col = headers["main"].find_last("Item Name") or COL_PRODUCT_NAME  # 与 locate_columns 一致
+    main_sheet, main_groups, bad_parents = _pairing_groups(main_path, headers["main"], MAIN_GROUP_SIZE, name_col)
+    main_role, _ = identify_file_role(main_groups)
+    if main_role != "main":
+        _raise_main_role_error(main_path, main_role)
+    if bad_parents:
+        _raise_irregular_error(main_path, bad_parents)
+
+    variants = {}
+    notes = []
+    for role, path in (("wood", wood_path), ("gold", gold_path)):
+        if path is None:
+            continue
+        sheet, groups, bad = _pairing_groups(path, headers[role], VARIANT_GROUP_SIZE, name_col)
+        _check_variant_role(path, identify_file_role(groups)[0], role)
+        if bad:
+            notes.append(_irregular_message(path, bad, _VARIANT_LABELS[role], VARIANT_GROUP_SIZE,
+                                            sheet, name_col) + ", 合并时这些组会被跳过")
+        variants[role] = (sheet, index_groups_by_name(sheet, groups, name_col,
+                                                      file_label=_VARIANT_LABELS[role]))
+
+    pair_counter = {}
+    skipped = []
+    for g in main_groups:
+        name = _group_base_name(main_sheet, g, name_col)
+        idx = pair_counter.get(name, 0)
+        pair_counter[name] = idx + 1
+        counts = {role: len(by_name.get(name, [])) for role, (_, by_name) in variants.items()}
+        if any(idx >= n for n in counts.values()):
+            skipped.append((name, _get_raw_name(main_sheet, g, name_col), idx,
+                            counts.get("wood"), counts.get("gold")))
+    if skipped:
+        wood_ws, wood_by_name = variants.get("wood", (None, {}))
+        gold_ws, gold_by_name = variants.get("gold", (None, {}))
+        try:
+            _raise_pairing_error(skipped, wood_by_name, gold_by_name, wood_ws, gold_ws,
+                                 "wood" in variants, "gold" in variants, name_col)
+        except ValueError as e:
+            raise ValueError("\n".join([str(e), *notes])) from None
+    for note in notes:
+        logger.warning("配对预检: %s", note)
+    logger.info("配对预检通过: %d 个普文件产品", len(main_groups))
+    return len(main_groups)
+
+
 # 保留旧名向后兼容
 def identify_main_file(groups):
     role, _ = identify_file_role(groups)
@@ -153,7 +296,7 @@ def _find_close_matches(target, candidates, cutoff=0.6):
 
 def _group_base_name(ws, group, name_col=COL_PRODUCT_NAME):
     parent_row = group[0]
-    v = ws.cell(row=parent_row, column=name_col).value
+    v = cell_value(ws, parent_row, name_col)
     return _normalize_name_for_compare(str(v) if v else "")
 
 
@@ -189,14 +332,17 @@ def pair_gold_groups(ws, groups, name_col=COL_PRODUCT_NAME):
     return pairs
 
 
-def _snapshot_row(ws, row, max_col):
-    """快照一行数据, 返回 {col: value} dict (避免 ws 后续修改污染)."""
-    return {c: ws.cell(row=row, column=c).value for c in range(1, max_col + 1)}
-
+def _snapshot_row(ws, row, max_col, pool=None):
+    """快照一行数据, 返回值元组 (避免 ws 后续修改污染).
 
-def _write_row(dst_ws, dst_row, snapshot, max_col):
-    for c in range(1, max_col + 1):
-        dst_ws.cell(row=dst_row, column=c).value = snapshot.get(c)
+    元组下标 0 = 第 1 列, 最后一个非空单元格之后的列不存。
+    传入 pool (InternPool) 时字符串值经池驻留, 重复文本在各行快照间共用一个对象。
+    """
+    values = row_values(ws, row, max_col)
+    if pool is None:
+        return values
+    intern = pool.intern
+    return tuple([intern(v) for v in values])
 
 
 def _col_letter(col_idx):
@@ -241,11 +387,13 @@ def merge_one_painting(
     ratio_type="3:2",
     mode="new",
     name_col=None,
+    styles=None,
 ):
     """合并 1 画到动态行数结构 (木/金可选).
 
     Args:
-        main_snapshots: 11 元素 list (main group 行的快照, 必须提前快照避免被覆盖)
+        main_snapshots: 11 元素 list (main group 行的快照元组, 见 _snapshot_row;
+                        必须提前快照避免被覆盖)
         wood_group: 木框文件的 6 行 group (来源 wood_ws); None 表示无木框
         gold_group: 金框文件的 6 行 group (来源 gold_ws); None 表示无金框
         output_start_row: 写到 output_ws 的起始行
@@ -257,6 +405,7 @@ def merge_one_painting(
         mode: "new" = 新品上架 (全部行 normalize + fill + meta)
               "old_variant" = 老品补充变体 (普文件原 11 行保留不动, 仅变体行处理)
         name_col: Item Name 列号 (动态从 col_map 读取; None 用硬编码常量)
+        styles: 整次合并共用的 StyleInterner (模板样式只解析一次); None 时本组现建
 
     输出行数 = 1 + 5×(2 + 有木 + 有金): 11 / 16 / 21。
     普文件恒为前 11 行 (parent + Frame×5 + Unframe×5), 变体行紧随其后。
@@ -292,7 +441,7 @@ def merge_one_painting(
 
     # parent (来自 main)
     parent_row = output_start_row
-    _write_row(output_ws, parent_row, main_snapshots[0], max_col)
+    set_row_values(output_ws, parent_row, main_snapshots[0], max_col)
     merged_rows.append(parent_row)
 
     # 变体 children 起始偏移 (main 子体行数)
@@ -305,7 +454,7 @@ def merge_one_painting(
         # main children: Frame×5 + Unframe×5 → output rows 1-10 (恒定 10 行)
         for i, snap in enumerate(main_snapshots[1:]):
             dst = output_start_row + 1 + i
-            _write_row(output_ws, dst, snap, max_col)
+            set_row_values(output_ws, dst, snap, max_col)
             merged_rows.append(dst)
         next_offset = 11  # main 占 11 行 (1 parent + 10 children)
 
@@ -313,14 +462,14 @@ def merge_one_painting(
         wood_snapshots = [_snapshot_row(wood_ws, r, max_col) for r in wood_group]
         for i, snap in enumerate(wood_snapshots[1:]):
             dst = output_start_row + next_offset + i
-            _write_row(output_ws, dst, snap, max_col)
+            set_row_values(output_ws, dst, snap, max_col)
             merged_rows.append(dst)
         next_offset += 5
     if has_gold:
         gold_snapshots = [_snapshot_row(gold_ws, r, max_col) for r in gold_group]
         for i, snap in enumerate(gold_snapshots[1:]):
             dst = output_start_row + next_offset + i
-            _write_row(output_ws, dst, snap, max_col)
+            set_row_values(output_ws, dst, snap, max_col)
             merged_rows.append(dst)
         next_offset += 5
 
@@ -353,27 +502,30 @@ def merge_one_painting(
 
     # 把模板单元格样式复制到生成的产品组上
     # (如 E8 的"涂黑"样式 → 每个 group parent 行的 Parent SKU 列)
-    _apply_template_styles(output_ws, merged_rows, col_map)
+    _apply_template_styles(output_ws, merged_rows, col_map, styles)
 
     return merged_rows
 
 
-def _apply_template_styles(ws, merged_rows, col_map):
-    """把模板中特定单元格的样式复制到合并输出的对应位置.
+def _apply_template_styles(ws, merged_rows, col_map, styles=None):
+    """把模板中特定单元格的样式套到合并输出的对应位置.
 
     当前规则:
     - Parent SKU 列 (col_map["Parent SKU"]): 每个 group 的 parent 行 (merged_rows[0])
-      样式复制自模板的 E8 (用户约定该位置需"涂黑"/深色填充, 提示父体不需要 Parent SKU)。
+      样式取自模板的 E8 (用户约定该位置需"涂黑"/深色填充, 提示父体不需要 Parent SKU)。
+
+    模板样式经 styles (StyleInterner) 解析一次, 各组共用同一个驻留样式 (写时复制)。
     """
-    from .excel_io import copy_cell_style
     if "Parent SKU" not in col_map or not merged_rows:
         return
+    if styles is None:
+        styles = StyleInterner()
     parent_sku_col = col_map["Parent SKU"]
     # 模板源单元格: 第 1 个 group 的 Parent 行 Parent SKU 列 (即 DATA_START_ROW 行)
-    template_src = ws.cell(row=DATA_START_ROW, column=parent_sku_col)
-    parent_row = merged_rows[0]
-    dst = ws.cell(row=parent_row, column=parent_sku_col)
-    copy_cell_style(template_src, dst)
+    style = styles.template_style(ws, DATA_START_ROW, parent_sku_col)
+    if style is None:
+        return  # 纯值 sheet (TemplateSheet) 没有样式
+    styles.assign(ws.cell(row=merged_rows[0], column=parent_sku_col), style)
 
 
 def _extract_base_name_raw(name: str) -> str:
@@ -498,7 +650,7 @@ def _fill_variant_fields(ws, variant_rows, col_map, ratio_type="3:2", variant_st
     if "Search Terms" in col_map:
         col = col_map["Search Terms"]
         for row in variant_rows:
-            v = ws.cell(row=row, column=col).value
+            v = cell_value(ws, row, col)
             if v is not None and isinstance(v, str) and "_" in v:
                 ws.cell(row=row, column=col).value = v.replace("_", " ")
 
@@ -590,7 +742,7 @@ def _clean_item_name(text: str) -> str:
 
 
 def rewrite_sku(ws, groups, prefix, sku_col=COL_SELLER_SKU, mode="new",
-                has_wood=False, has_gold=False):
+                has_wood=False, has_gold=False, counters=None):
     """重写 Seller SKU.
 
     Args:
@@ -603,6 +755,8 @@ def rewrite_sku(ws, groups, prefix, sku_col=COL_SELLER_SKU, mode="new",
               "old_parent" = 老品合并 (父体 SKU 保留, 金木变体重写)
         has_wood: 是否有木框变体 (Wood 行用 M 后缀)
         has_gold: 是否有金框变体 (Gold 行用 J 后缀)
+        counters: 编号状态 dict, 调用后原地更新; 流式输出逐组调用时传同一个 dict,
+                  编号跨调用连续。不传则每次从 1 开始。
 
     SKU 后缀规则:
         parent       → {prefix}-N      (父体)
@@ -615,62 +769,35 @@ def rewrite_sku(ws, groups, prefix, sku_col=COL_SELLER_SKU, mode="new",
         new / old_variant: [parent, Frame×5, Unframe×5, Wood×5(若有), Gold×5(若有)]
         old_parent:        [parent, Wood×5(若有), Gold×5(若有)]
     """
-    if mode == "new":
-        parent_counter = 1
-        normal_counter = 1
-        wood_counter = 1
-        gold_counter = 1
-        for group in groups:
+    if mode not in ("new", "old_variant", "old_parent"):
+        raise ValueError(f"未知 mode: {mode}, 期望 'new'/'old_variant'/'old_parent'")
+    if counters is None:
+        counters = {}
+
+    def _set(row, suffix):
+        n = counters.get(suffix, 1)
+        counters[suffix] = n + 1
+        ws.cell(row=row, column=sku_col).value = f"{prefix}{suffix}-{n}"
+
+    # 变体行起始偏移: new / old_variant 在 main 11 行之后, old_parent 紧跟父体
+    variant_start = 1 if mode == "old_parent" else 11
+    for group in groups:
+        if mode == "new":
             # parent → {prefix}-{N}
-            ws.cell(row=group[0], column=sku_col).value = f"{prefix}-{parent_counter}"
-            parent_counter += 1
+            _set(group[0], "")
             # group[1:11] = Frame×5 + Unframe×5 (普通子体) → {prefix}P-{N}
             for i in range(1, min(11, len(group))):
-                ws.cell(row=group[i], column=sku_col).value = f"{prefix}P-{normal_counter}"
-                normal_counter += 1
-            # Wood 行: group[11:16] (若 has_wood) → {prefix}M-{N}
-            if has_wood:
-                for i in range(11, min(16, len(group))):
-                    ws.cell(row=group[i], column=sku_col).value = f"{prefix}M-{wood_counter}"
-                    wood_counter += 1
-            # Gold 行: group[16:21] (若 has_wood) 或 group[11:16] (若 !has_wood) → {prefix}J-{N}
-            if has_gold:
-                gold_start = 16 if has_wood else 11
-                for i in range(gold_start, min(gold_start + 5, len(group))):
-                    ws.cell(row=group[i], column=sku_col).value = f"{prefix}J-{gold_counter}"
-                    gold_counter += 1
-    elif mode == "old_variant":
-        # 老品补充变体: 普文件原 11 行 (group[0:11]) SKU 保留, 变体行重写
-        # Wood → {prefix}M-{N}, Gold → {prefix}J-{N}
-        wood_counter = 1
-        gold_counter = 1
-        for group in groups:
-            if has_wood:
-                for i in range(11, min(16, len(group))):
-                    ws.cell(row=group[i], column=sku_col).value = f"{prefix}M-{wood_counter}"
-                    wood_counter += 1
-            if has_gold:
-                gold_start = 16 if has_wood else 11
-                for i in range(gold_start, min(gold_start + 5, len(group))):
-                    ws.cell(row=group[i], column=sku_col).value = f"{prefix}J-{gold_counter}"
-                    gold_counter += 1
-    elif mode == "old_parent":
-        # 老品合并: 父体 (group[0]) SKU 保留, 金木变体行重写
-        # old_parent group 布局: [parent, Wood×5(若有), Gold×5(若有)]
-        wood_counter = 1
-        gold_counter = 1
-        for group in groups:
-            if has_wood:
-                for i in range(1, min(6, len(group))):
-                    ws.cell(row=group[i], column=sku_col).value = f"{prefix}M-{wood_counter}"
-                    wood_counter += 1
-            if has_gold:
-                gold_start = 6 if has_wood else 1
-                for i in range(gold_start, min(gold_start + 5, len(group))):
-                    ws.cell(row=group[i], column=sku_col).value = f"{prefix}J-{gold_counter}"
-                    gold_counter += 1
-    else:
-        raise ValueError(f"未知 mode: {mode}, 期望 'new'/'old_variant'/'old_parent'")
+                _set(group[i], "P")
+        # old_variant: 普文件原 11 行 SKU 保留; old_parent: 父体 SKU 保留
+        # Wood 行 → {prefix}M-{N}
+        if has_wood:
+            for i in range(variant_start, min(variant_start + 5, len(group))):
+                _set(group[i], "M")
+        # Gold 行 (在 Wood 之后, 若有) → {prefix}J-{N}
+        if has_gold:
+            gold_start = variant_start + 5 if has_wood else variant_start
+            for i in range(gold_start, min(gold_start + 5, len(group))):
+                _set(group[i], "J")
 
 
 def write_parent_sku_formulas(ws, groups, parent_sku_col=COL_PARENT_SKU, seller_sku_col=COL_SELLER_SKU, mode="new"):
@@ -723,6 +850,70 @@ def write_parent_sku_formulas(ws, groups, parent_sku_col=COL_PARENT_SKU, seller_
             raise ValueError(f"未知 mode: {mode}, 期望 'new'/'old_variant'/'old_parent'")
 
 
+# 木/金文件合计达到该大小才启用进程池 (子进程启动 + 导入 openpyxl 约需数百毫秒)
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+
+
+def _load_variant_input(path, use_cache=False):
+    """加载 1 个木/金文件并完成分组、角色识别和按名索引。
+
+    作为进程池 worker 运行: 只读加载 (TemplateSheet), 返回值全是普通 Python 数据
+    (行值 / 行号列表 / dict), 不含 openpyxl 对象, 可低成本 pickle 回父进程。
+
+    Returns:
+        (sheet, groups, role, by_name, name_col)
+    """
+    cache = TemplateCache() if use_cache else None
+    sheet = load_template_sheet(path, cache=cache)
+    headers = HeaderIndex.from_sheet(sheet)
+    groups = group_rows(sheet, group_size=VARIANT_GROUP_SIZE,
+                        extent=scan_data_extent(sheet, headers=headers))
+    role, _ = identify_file_role(groups)
+    name_col = headers.find("Item Name") or COL_PRODUCT_NAME
+    by_name = index_groups_by_name(sheet, groups, name_col)
+    return sheet, groups, role, by_name, name_col
+
+
+def _load_inputs_parallel(load_main, variant_paths, use_cache=False, parallel=None):
+    """木/金文件提交到进程池, 同时在当前进程执行 load_main(); 墙钟时间≈最慢的单个加载。
+
+    进程池不可用 (受限环境 / 子进程崩溃) 时退回顺序加载。
+
+    Returns:
+        (load_main() 的返回值, {role: _load_variant_input 的返回值})
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    if parallel is None:
+        total = sum(Path(p).stat().st_size for p in variant_paths.values())
+        parallel = total >= PARALLEL_MIN_BYTES
+    executor = None
+    if parallel and variant_paths:
+        try:
+            executor = ProcessPoolExecutor(max_workers=len(variant_paths))
+        except (OSError, NotImplementedError) as e:
+            logger.warning("进程池不可用, 改为顺序加载: %s", e)
+
+    if executor is None:
+        main = load_main()
+        return main, {role: _load_variant_input(p, use_cache) for role, p in variant_paths.items()}
+
+    results = {}
+    with executor:
+        futures = {role: executor.submit(_load_variant_input, p, use_cache)
+                   for role, p in variant_paths.items()}
+        logger.debug("_load_inputs_parallel: 已提交 %s 到进程池", ", ".join(futures))
+        main = load_main()
+        for role, future in futures.items():
+            try:
+                results[role] = future.result()
+            except BrokenProcessPool as e:
+                logger.warning("子进程加载 %s 失败, 改为当前进程加载: %s", role, e)
+                results[role] = _load_variant_input(variant_paths[role], use_cache)
+    return main, results
+
+
 def merge_files(
     main_path,
     wood_path=None,
@@ -730,6 +921,10 @@ def merge_files(
     sku_prefix="",
     mode="new",
     output_path=None,
+    use_cache=False,
+    parallel=None,
+    stream=True,
+    compression=DEFAULT_COMPRESSION,
 ):
     """合并主入口 (木/金可选).
 
@@ -742,6 +937,14 @@ def merge_files(
               "old_variant" = 老品补充变体 (普文件原 SKU 保留, 仅变体重写);
                               此模式需要至少一个木/金文件
         output_path: 输出路径 (默认: {main_stem}_processed.xlsm)
+        use_cache: 木/金文件使用本地解析缓存 (内容未变的文件重跑时跳过解析; 流式按顺序配对
+                   与整表加载都适用)。主文件每次都要逐行读出再写到输出, 不缓存
+        parallel: 整表路径下木/金文件是否在进程池中加载;
+                  None = 按文件大小自动决定 (小文件进程启动开销不划算)
+        stream: 主文件逐组读入、合并后逐组写出 (见 template_stream), 内存只与组大小相关;
+                木/金文件与主文件同序时同样逐组读取配对 (见 _VariantJoin);
+                不适用时 (平面文件等) 自动回退整表加载 + 原地修改
+        compression: 输出 zip 压缩档位 stored / fast / max (见 save_workbook)
 
     输出每组行数 = 1 + 5×(2 + 有木 + 有金): 11 / 16 / 21。
 
@@ -756,6 +959,9 @@ def merge_files(
     if mode in ("old_variant", "old_parent") and not (has_wood or has_gold):
         raise ValueError("老品模式(补充变体/合并)需要至少一个木框或金框文件")
 
+    # 只读表头+前几十行, 错误文件在完整解析前就被拒绝
+    prevalidate_inputs(main_path, wood_path, gold_path)
+
     prefix = build_sku_prefix(sku_prefix)
     logger.info("合并开始: main=%s, wood=%s, gold=%s, prefix=%s, mode=%s",
                 main_path.name,
@@ -763,36 +969,305 @@ def merge_files(
                 gold_path.name if has_gold else "无",
                 prefix, mode)
 
-    main_wb, main_ws, main_sheet = load_workbook(main_path)
-    wood_ws = gold_ws = None
-    if has_wood:
-        _, wood_ws, _ = load_workbook(wood_path)
-    if has_gold:
-        _, gold_ws, _ = load_workbook(gold_path)
+    variant_paths = {role: p for role, p in (("wood", wood_path), ("gold", gold_path)) if p is not None}
+    if stream:
+        try:
+            main_stream = TemplateStream(main_path, output_path, compression=compression)
+        except StreamUnsupported as e:
+            logger.info("流式输出不适用 (%s), 主文件整表加载", e)
+        else:
+            try:
+                return _merge_streaming(main_stream, variant_paths, prefix, mode, use_cache)
+            except StreamUnsupported as e:
+                logger.info("流式输出不可用 (%s), 改用整表加载", e)
 
-    main_groups = group_rows(main_ws, group_size=MAIN_GROUP_SIZE)
-    wood_groups = group_rows(wood_ws, group_size=VARIANT_GROUP_SIZE) if has_wood else []
-    gold_groups = group_rows(gold_ws, group_size=VARIANT_GROUP_SIZE) if has_gold else []
+    # 木/金文件在子进程中加载+分组+索引, 主文件同时在当前进程加载 (需原地修改后保存)
+    main, variants = _load_inputs_parallel(
+        lambda: load_workbook(main_path), variant_paths, use_cache=use_cache, parallel=parallel)
+    for role in variants:
+        _check_variant_role(variant_paths[role], variants[role][2], role)
+    return _merge_in_place(main, main_path, variants, prefix, mode, output_path, compression)
 
-    main_role, _ = identify_file_role(main_groups)
-    if main_role != "main":
+
+def _check_variant_role(path, file_role, role):
+    if file_role != "variant":
         raise ValueError(
-            f"主文件类型错误: {main_path.name} 是 {main_role}, 期望 main (11 行/组)"
+            f"{_VARIANT_LABELS[role]}类型错误: {Path(path).name} 是 {file_role}, 期望 variant (6 行/组)"
         )
-    if has_wood:
-        wood_role, _ = identify_file_role(wood_groups)
-        if wood_role != "variant":
-            raise ValueError(
-                f"木框文件类型错误: {wood_path.name} 是 {wood_role}, 期望 variant (6 行/组)"
-            )
-    if has_gold:
-        gold_role, _ = identify_file_role(gold_groups)
-        if gold_role != "variant":
-            raise ValueError(
-                f"金框文件类型错误: {gold_path.name} 是 {gold_role}, 期望 variant (6 行/组)"
-            )
 
-    col_map = locate_columns(main_ws)
+
+class _VariantJoin:
+    """流式合并中木/金文件的配对。
+
+    普/木/金文件按同一顺序列出产品时, 各文件逐组读取 (GroupReader) 按顺序配对, 内存只有当前组;
+    某一组的基名对不上 (顺序不一致 / 缺画 / 不规则组 / 读取器不支持) 时整表加载木/金文件、
+    建按名索引, 之后按 pair_counter 配对 (与整表路径相同)。按顺序配上的前 N 组各名称的出现
+    次数与主文件一致, 切换后第 idx 次出现的配对不变。
+
+    use_cache 时按顺序配对也走解析缓存: 命中的文件直接按缓存中的行逐组配对, 不再解析;
+    未命中的文件逐组读取的同时留存各行, 读到末尾 (finish) 后写入缓存, 下次重跑即可命中。
+    """
+
+    def __init__(self, paths, name_col, use_cache=False):
+        self.paths = paths
+        self.name_col = name_col
+        self.use_cache = use_cache
+        self.indexed = None  # 回退后: {role: (sheet, by_name)}
+        self._cache = TemplateCache() if use_cache else None
+        self._digests = {}
+        self._readers = {}
+        self._cursors = {}
+        try:
+            for role, path in paths.items():
+                self._cursors[role] = self._open_cursor(role, path)
+        except StreamUnsupported as e:
+            self._fallback(f"无法逐组读取 ({e})")
+
+    def _open_cursor(self, role, path):
+        if self._cache is not None:
+            digest = self._digests[role] = file_digest(path)
+            sheet = self._cache.get(digest)
+            if sheet is not None:
+                logger.info("使用解析缓存: %s", Path(path).name)
+                return _cached_groups(sheet)
+        reader = self._readers[role] = GroupReader(path, keep_rows=self._cache is not None)
+        reader.open()
+        return reader.groups(VARIANT_GROUP_SIZE)
+
+    def finish(self):
+        """主文件读完后调用: 逐组读取且缓存未命中的木/金文件读到末尾, 写入解析缓存。"""
+        if self._cache is None or self.indexed is not None:
+            return
+        for role, reader in self._readers.items():
+            try:
+                for _ in self._cursors[role]:
+                    pass
+            except StreamUnsupported:
+                continue
+            if reader.complete:
+                self._cache.put(self._digests[role], reader.kept)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+        self._cursors.clear()
+
+    def _fallback(self, reason):
+        logger.info("木/金文件%s, 改为整表加载按名配对", reason)
+        self.close()
+        self.indexed = {}
+        for role, path in self.paths.items():
+            variant = _load_variant_input(path, self.use_cache)
+            _check_variant_role(path, variant[2], role)
+            self.indexed[role] = _variant_index(variant, self.name_col, _VARIANT_LABELS[role])
+
+    def _next_in_order(self, name):
+        pairs = {}
+        for role, cursor in self._cursors.items():
+            try:
+                rows, regular, sheet = next(cursor)
+            except StopIteration:
+                self._fallback(f"比普文件少组 ({name})")
+                return None
+            except StreamUnsupported as e:
+                self._fallback(f"无法逐组读取 ({e})")
+                return None
+            if not regular or _group_base_name(sheet, rows, self.name_col) != name:
+                self._fallback(f"与普文件顺序不一致 (第 {rows[0]} 行, 普文件 {name})")
+                return None
+            pairs[role] = (sheet, rows)
+        return pairs
+
+    def pair(self, name, idx):
+        """第 idx 次出现的 name 对应的 {role: (sheet, group)}; 配不上时返回 None。"""
+        if self.indexed is None:
+            pairs = self._next_in_order(name)
+            if pairs is not None:
+                return pairs
+        pairs = {}
+        for role, (sheet, by_name) in self.indexed.items():
+            found = by_name.get(name, [])
+            if idx >= len(found):
+                return None
+            pairs[role] = (sheet, found[idx])
+        return pairs
+
+    def counts(self, name):
+        """(木框中该名组数, 金框中该名组数) (配对失败报错用; 文件未提供为 None)。"""
+        return tuple(len(self.indexed[role][1].get(name, [])) if role in self.indexed else None
+                     for role in ("wood", "gold"))
+
+    def index(self, role):
+        return self.indexed.get(role, (None, {}))
+
+
+def _cached_groups(sheet):
+    """缓存中的木/金 sheet 按文件顺序逐组产出 (组, 是否规则, sheet), 与 GroupReader.groups 相同;
+    不规则组由 group_rows 跳过, 按顺序配对时表现为基名对不上, 同样回退按名配对。"""
+    headers = HeaderIndex.from_sheet(sheet)
+    for rows in group_rows(sheet, group_size=VARIANT_GROUP_SIZE,
+                           extent=scan_data_extent(sheet, headers=headers)):
+        yield rows, True, sheet
+
+
+def _variant_index(variant, name_col, file_label):
+    """(木/金 sheet, 按名索引); 子进程按各自表头的 Item Name 列建索引, 与主文件列号不同时重建。"""
+    if variant is None:
+        return None, {}
+    sheet, groups, _, by_name, variant_name_col = variant
+    if variant_name_col != name_col:
+        by_name = index_groups_by_name(sheet, groups, name_col, file_label=file_label)
+    return sheet, by_name
+
+
+def _merged_group_rows(mode, has_wood, has_gold):
+    if mode == "old_parent":
+        # 老品合并: 只保留父体 + 金木变体 (不含 Frame/Unframe)
+        return 1 + 5 * (bool(has_wood) + bool(has_gold))
+    return merged_group_size(has_wood, has_gold)
+
+
+def _raise_main_role_error(main_path, role):
+    raise ValueError(
+        f"主文件类型错误: {Path(main_path).name} 是 {role}, 期望 main (11 行/组)"
+    )
+
+
+def _irregular_message(path, bad_parents, label="主文件", group_size=MAIN_GROUP_SIZE,
+                       ws=None, name_col=None):
+    """不规则组的报错文本; 给出 ws / name_col 时在行号后附产品名。"""
+    def _describe(r):
+        name = cell_value(ws, r, name_col) if ws is not None else None
+        return f"{r} {name}" if name else str(r)
+
+    shown = ", ".join(_describe(r) for r in bad_parents[:10])
+    more = f" 等 {len(bad_parents)} 处" if len(bad_parents) > 10 else ""
+    return (f"{label} {Path(path).name} 有不规则的组 (Parent 行: {shown}{more}), "
+            f"每组应为 {group_size} 行, 请检查是否缺行或多行")
+
+
+def _raise_irregular_error(main_path, bad_parents):
+    raise ValueError(_irregular_message(main_path, bad_parents))
+
+
+def _merge_streaming(main_stream, variant_paths, prefix, mode, use_cache=False):
+    """流式合并: 主文件逐组读入, 合并 + SKU 重写后立即写出, 缓冲中只有当前组。
+
+    木/金文件与主文件同序时也逐组读取按顺序配对, 顺序不一致时才整表加载按名索引 (见 _VariantJoin)。
+    出错 (不规则组 / 配对失败) 时继续扫完主文件收集全部错误, 删除输出后报错。
+    """
+    has_wood = "wood" in variant_paths
+    has_gold = "gold" in variant_paths
+    with main_stream as stream:
+        col_map = locate_columns(stream.sheet, headers=stream.headers)
+        name_col = col_map.get("Item Name", COL_PRODUCT_NAME)
+        sku_col = col_map.get("SKU", COL_SELLER_SKU)
+        parent_sku_col = col_map.get("Parent SKU", COL_PARENT_SKU)
+        logger.info("动态列号: Item Name=列%d, SKU=列%d, Parent SKU=列%d",
+                    name_col, sku_col, parent_sku_col)
+        # 主文件行中流水线不碰的列以原始 XML 片段直通到输出
+        stream.decode_only({*col_map.values(), name_col, sku_col, parent_sku_col})
+
+        group_size = _merged_group_rows(mode, has_wood, has_gold)
+        styles = StyleInterner()  # 与原地路径一样整次合并共用, 不逐组新建
+        with _VariantJoin(variant_paths, name_col, use_cache) as join:
+            pair_counter = {}
+            skipped = []
+            bad_parents = []
+            sku_counters = {}
+            merged_count = 0
+            seen_main_group = False
+            out_row = DATA_START_ROW
+            for main_g, regular in stream.source_groups(MAIN_GROUP_SIZE):
+                if not regular:
+                    bad_parents.append(main_g[0])
+                    continue
+                seen_main_group = True
+                source = stream.source
+                name = _group_base_name(source, main_g, name_col)
+                idx = pair_counter.get(name, 0)
+                pair_counter[name] = idx + 1
+
+                pairs = join.pair(name, idx)
+                if pairs is None:
+                    skipped.append((name, _get_raw_name(source, main_g, name_col), idx, *join.counts(name)))
+                    continue
+                if skipped or bad_parents:
+                    continue  # 输出会被丢弃, 只继续收集错误
+
+                wood_ws, wood_g = pairs.get("wood", (None, None))
+                gold_ws, gold_g = pairs.get("gold", (None, None))
+                variant_cols = [ws.max_column for ws in (wood_ws, gold_ws) if ws is not None]
+                max_col = max(stream.sheet.max_column, source.max_column, *variant_cols)
+                merged = merge_one_painting(
+                    main_snapshots=[_snapshot_row(source, r, max_col) for r in main_g],
+                    wood_group=wood_g,
+                    gold_group=gold_g,
+                    output_start_row=out_row,
+                    output_ws=stream.sheet,
+                    col_map=col_map,
+                    wood_ws=wood_ws,
+                    gold_ws=gold_ws,
+                    max_col=max_col,
+                    ratio_type=detect_ratio_type(source, main_g, col_map),
+                    mode=mode,
+                    name_col=name_col,
+                    styles=styles,
+                )
+                rewrite_sku(stream.sheet, [merged], prefix, sku_col=sku_col, mode=mode,
+                            has_wood=has_wood, has_gold=has_gold, counters=sku_counters)
+                write_parent_sku_formulas(stream.sheet, [merged], parent_sku_col=parent_sku_col,
+                                          seller_sku_col=sku_col, mode=mode)
+                stream.write_rows(merged)
+                merged_count += 1
+                out_row += group_size
+
+            join.finish()
+            if not seen_main_group:
+                _raise_main_role_error(stream.input_path, "unknown")
+            if bad_parents:
+                _raise_irregular_error(stream.input_path, bad_parents)
+            if skipped:
+                wood_ws, wood_by_name = join.index("wood")
+                gold_ws, gold_by_name = join.index("gold")
+                _raise_pairing_error(skipped, wood_by_name, gold_by_name, wood_ws, gold_ws,
+                                     has_wood, has_gold, name_col)
+
+    logger.info("合并完成: 输出 %s, %d 画 × %d 行/组 (流式)", stream.out_path, merged_count, group_size)
+    return stream.out_path
+
+
+def _merge_in_place(main, main_path, variants, prefix, mode, output_path,
+                    compression=DEFAULT_COMPRESSION):
+    """整表路径: 主文件整表加载, 数据区的值移出作为合并源, 合并结果写入清空的数据区后保存。"""
+    main_wb, main_ws, main_sheet = main
+    has_wood = "wood" in variants
+    has_gold = "gold" in variants
+    wood_groups = variants["wood"][1] if has_wood else []
+    gold_groups = variants["gold"][1] if has_gold else []
+
+    # 表头 / 数据区各只扫一次: 列定位、分组、清空数据区、保存前清理共用
+    main_headers = HeaderIndex.from_sheet(main_ws)
+    main_extent = scan_data_extent(main_ws, headers=main_headers)
+    main_groups = group_rows(main_ws, group_size=MAIN_GROUP_SIZE, extent=main_extent)
+
+    main_role, _ = identify_file_role(main_groups)
+    if main_role != "main":
+        _raise_main_role_error(main_path, main_role)
+    # 不规则组 (缺行/多行) 已被 group_rows 跳过; 主文件里少一幅画会静默漏上架, 直接报错
+    grouped_parents = {g[0] for g in main_groups}
+    bad_parents = [r for r in main_extent.parent_rows if r not in grouped_parents]
+    if bad_parents:
+        _raise_irregular_error(main_path, bad_parents)
+
+    col_map = locate_columns(main_ws, headers=main_headers)
 
     # 动态列号: 优先从 col_map 读取 (支持带反馈列/偏移布局), 否则回退硬编码常量
     name_col = col_map.get("Item Name", COL_PRODUCT_NAME)
@@ -801,49 +1276,38 @@ def merge_files(
     logger.info("动态列号: Item Name=列%d, SKU=列%d, Parent SKU=列%d",
                 name_col, sku_col, parent_sku_col)
 
-    main_by_name = index_groups_by_name(main_ws, main_groups, name_col, file_label="普文件")
-    wood_by_name = index_groups_by_name(wood_ws, wood_groups, name_col, file_label="木框文件") if has_wood else {}
-    gold_by_name = index_groups_by_name(gold_ws, gold_groups, name_col, file_label="金框文件") if has_gold else {}
+    wood_ws, wood_by_name = _variant_index(variants.get("wood"), name_col, "木框文件")
+    gold_ws, gold_by_name = _variant_index(variants.get("gold"), name_col, "金框文件")
 
-    # 关键: 在合并前一次性快照所有 main 行 + 提前算 base name
     snap_cols = [main_ws.max_column]
     if has_wood:
         snap_cols.append(wood_ws.max_column)
     if has_gold:
         snap_cols.append(gold_ws.max_column)
     max_col_for_snapshot = max(snap_cols)
-    main_all_snapshots = {
-        r: _snapshot_row(main_ws, r, max_col_for_snapshot)
-        for g in main_groups
-        for r in g
-    }
-    main_base_names = {id(g): _group_base_name(main_ws, g, name_col) for g in main_groups}
+    # Parent SKU 列的模板样式 (E8) 取自主文件原数据区, 须在移出数据区前解析
+    styles = StyleInterner()  # 模板样式整次合并只解析一次, 各组共享
+    if "Parent SKU" in col_map:
+        styles.template_style(main_ws, DATA_START_ROW, col_map["Parent SKU"])
 
-    # 在清空前检测每组 ratio_type (清空后 Size 列就没值了)
-    # 合并模式支持 3:2 和 square, 由 main 文件 Size 列预填值决定
-    main_ratio_types = {id(g): detect_ratio_type(main_ws, g, col_map) for g in main_groups}
+    # 主文件数据区 (第 8 行起, 含底部备注行) 的值整体移出为只读源, main_ws 数据区只留各单元格样式;
+    # 合并结果写入已无值的数据区 (沿用原坐标的样式), 不必逐格清空, 源数据也不会被覆盖
+    pool = InternPool()
+    source = detach_rows(main_ws, DATA_START_ROW, pool=pool)
+    logger.info("主文件数据区: %d 行, 驻留 %d 个取值, 省下 %.1f KB",
+                len(source._rows), len(pool), pool.saved_bytes / 1024)
 
-    if mode == "old_parent":
-        # 老品合并: 只保留父体 + 金木变体 (不含 Frame/Unframe)
-        group_size = 1 + 5 * (bool(has_wood) + bool(has_gold))
-    else:
-        group_size = merged_group_size(has_wood, has_gold)
+    group_size = _merged_group_rows(mode, has_wood, has_gold)
 
     # 追踪每个 base name 已配对次数 (支持同名多 group 按顺序配对)
     # 普/木/金文件的产品顺序一致, 同名产品按出现顺序配对
     pair_counter = {}
     skipped = []  # 记录配不上的 main group
 
-    # 清空 main_ws 数据区 (r8 到 max_row), 排除表格底部备注行残留
-    clear_max = main_ws.max_row + 20
-    for r in range(DATA_START_ROW, clear_max + 1):
-        for c in range(1, max_col_for_snapshot + 1):
-            main_ws.cell(row=r, column=c).value = None
-
     new_groups = []
     out_row = DATA_START_ROW
     for main_g in main_groups:
-        name = main_base_names[id(main_g)]
+        name = _group_base_name(source, main_g, name_col)
         idx = pair_counter.get(name, 0)
         pair_counter[name] = idx + 1
 
@@ -851,19 +1315,16 @@ def merge_files(
         gold_list = gold_by_name.get(name, []) if has_gold else None
         # 文件整体缺失不报错; 只有"文件存在但缺该画"才进 skipped
         if (has_wood and idx >= len(wood_list)) or (has_gold and idx >= len(gold_list)):
-            # 注意: main_ws 数据区已被清空, 必须从快照读原始 Product Name
-            main_raw_val = main_all_snapshots.get(main_g[0], {}).get(name_col)
-            main_raw = str(main_raw_val) if main_raw_val else ""
-            skipped.append((name, main_raw, idx,
+            skipped.append((name, _get_raw_name(source, main_g, name_col), idx,
                             len(wood_list) if has_wood else None,
                             len(gold_list) if has_gold else None))
             continue
         wood_g = wood_list[idx] if has_wood else None
         gold_g = gold_list[idx] if has_gold else None
-        main_snapshots = [main_all_snapshots[r] for r in main_g]
-        ratio_type = main_ratio_types.get(id(main_g), "3:2")
+        # 合并模式支持 3:2 和 square, 由 main 文件 Size 列预填值决定
+        ratio_type = detect_ratio_type(source, main_g, col_map)
         merged = merge_one_painting(
-            main_snapshots=main_snapshots,
+            main_snapshots=[_snapshot_row(source, r, max_col_for_snapshot) for r in main_g],
             wood_group=wood_g,
             gold_group=gold_g,
             output_start_row=out_row,
@@ -875,6 +1336,7 @@ def merge_files(
             ratio_type=ratio_type,
             mode=mode,
             name_col=name_col,
+            styles=styles,
         )
         new_groups.append(merged)
         out_row += group_size
@@ -889,11 +1351,17 @@ def merge_files(
     write_parent_sku_formulas(main_ws, new_groups, parent_sku_col=parent_sku_col,
                               seller_sku_col=sku_col, mode=mode)
 
+    # 输出数据区 = 刚写入的行 (其后没有单元格), 只扫这一段交给保存前清理
+    out_extent = scan_data_extent(main_ws, parentage_col=col_map.get("Parentage Level", COL_PARENTAGE),
+                                  end_row=out_row - 1)
     out = save_workbook(
         main_ws,
         main_path,
         main_sheet,
         output_path=str(output_path) if output_path else None,
+        extent=out_extent,
+        headers=main_headers,
+        compression=compression,
     )
     logger.info("合并完成: 输出 %s, %d 画 × %d 行/组", out, len(new_groups), group_size)
     return out
@@ -901,7 +1369,7 @@ def merge_files(
 
 def _get_raw_name(ws, group, name_col):
     """获取 group parent 行的原始 Product Name."""
-    v = ws.cell(row=group[0], column=name_col).value
+    v = cell_value(ws, group[0], name_col)
     return str(v) if v else ""
 
 
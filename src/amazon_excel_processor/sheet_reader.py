@@ -0,0 +1,516 @@
+"""Template sheet 专用流式读取器 (iterparse, 不创建 openpyxl Cell 对象)
+
+直接对 xlsx/xlsm 包内的 worksheet XML 做 ElementTree.iterparse, 逐 <row> 产出
+(行号, 值元组), 读完即 clear, 内存只与单行大小相关。取值规则与 openpyxl
+(data_only=False) 一致:
+  - 共享字符串 / inlineStr / str / b / e / ISO 日期 (t="d")
+  - 数字按 int / float 区分; 日期/时长数字格式的单元格转 datetime / timedelta
+  - 公式返回 "=..." 文本
+
+共享字符串表按需增量解析: 只读表头时不必解析完整的 sharedStrings.xml。
+读出的字符串经 InternPool 驻留 (见 template_sheet): 共享字符串表条目与内联字符串
+中相同的文本共用一个对象, reader.pool.saved_bytes 为省下的内存。
+遇到读取器不处理的情况 (共享公式从属单元格 / 数组公式 / 数据表公式) 抛
+UnsupportedSheet, 由调用方回退 openpyxl 只读加载。
+"""
+
+import bisect
+import logging
+import re
+import zipfile
+from pathlib import Path
+from typing import Iterator, Optional
+from xml.etree import ElementTree
+
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel, from_ISO8601
+
+from .xlsx_package import (
+    NS_MAIN,
+    REL_OFFICE_DOCUMENT,
+    PassthroughUnsupported,
+    RawCell,
+    _XMLNS_RE,
+    _read_rels,
+    _rels_path_for,
+    _resolve_target,
+    find_sheet_part,
+    iter_row_xml,
+    iter_sheet_data_blocks,
+)
+from .template_sheet import InternPool
+
+logger = logging.getLogger(__name__)
+
+_ROW_TAG = f"{{{NS_MAIN}}}row"
+_C_TAG = f"{{{NS_MAIN}}}c"
+_V_TAG = f"{{{NS_MAIN}}}v"
+_F_TAG = f"{{{NS_MAIN}}}f"
+_IS_TAG = f"{{{NS_MAIN}}}is"
+_SI_TAG = f"{{{NS_MAIN}}}si"
+_T_TAG = f"{{{NS_MAIN}}}t"
+_R_TAG = f"{{{NS_MAIN}}}r"
+
+# iter_raw_rows: 按字节切 <c> 片段
+_CELL_XML_RE = re.compile(rb"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.DOTALL)
+_CELL_ATTR_RE = re.compile(rb'\s(s|t)="([^"]*)"')
+_CELL_REF_RE = re.compile(rb'\sr="([A-Z]+)\d+"')
+_CELL_LETTERS_RE = re.compile(rb'<c r="([A-Z]+)')
+_PLAIN_V_RE = re.compile(rb"<v>([^<]*)</v>")
+# 不含实体 / 子元素 / 回车 (XML 解析会规范化换行) 的内联字符串, 可直接按字节解码
+_PLAIN_IS_RE = re.compile(rb'<is><t(?: xml:space="preserve")?>([^<&\r]*)</t></is>')
+_SPECIAL_F_RE = re.compile(rb'<f\b[^>]*\st="(?:shared|array|dataTable)"')
+# iter_column_values 按单元格原始片段缓存解码结果的条目上限 (Parentage Level 等列取值高度重复)
+MAX_DECODE_MEMO = 65536
+
+# workbook.xml.rels 中按关系类型末段查找
+_REL_SHARED_STRINGS = "sharedStrings"
+_REL_STYLES = "styles"
+
+
+class UnsupportedSheet(Exception):
+    """sheet 内容超出本读取器的处理范围 (调用方应回退 openpyxl)。"""
+
+
+def _rich_text(node) -> str:
+    """<si> / <is> 的纯文本: 直接 <t> + 各 <r><t> 拼接 (忽略注音 <rPh>)。"""
+    parts = []
+    for child in node:
+        if child.tag == _T_TAG:
+            parts.append(child.text or "")
+        elif child.tag == _R_TAG:
+            parts.append(child.findtext(_T_TAG) or "")
+    return "".join(parts)
+
+
+def _cast_number(text: str):
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+def _column_index(ref: str) -> int:
+    """"AB12" → 28 (只看字母部分)。"""
+    col = 0
+    for ch in ref:
+        if "A" <= ch <= "Z":
+            col = col * 26 + ord(ch) - 64
+        else:
+            break
+    return col
+
+
+class _SharedStrings:
+    """按下标访问的共享字符串表, 首次访问到某下标时才继续往后解析。"""
+
+    def __init__(self, zf: zipfile.ZipFile, part: Optional[str], pool: InternPool):
+        self._strings: list[str] = []
+        self._pool = pool
+        self._events = None
+        self._file = None
+        if part is not None:
+            self._file = zf.open(part)
+            self._events = ElementTree.iterparse(self._file, events=("end",))
+
+    def __getitem__(self, idx: int) -> str:
+        while idx >= len(self._strings) and self._events is not None:
+            for _, node in self._events:
+                if node.tag == _SI_TAG:
+                    self._strings.append(self._pool.intern(_rich_text(node).replace("x005F_", "")))
+                    node.clear()
+                    if idx < len(self._strings):
+                        break
+            else:
+                self.close()
+        return self._strings[idx]
+
+    def close(self):
+        self._events = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _RawRowParser:
+    """iter_raw_rows 的逐行解析: 按字节切出解码列的 <c>, 其余片段成段保留。"""
+
+    def __init__(self, reader: "SheetReader", decode_columns, head: bytes):
+        self._reader = reader
+        self._strings = reader._strings()
+        self._date_styles, self._timedelta_styles = reader._date_style_ids()
+        self._decode = sorted(set(decode_columns))
+        self._decode_set = frozenset(self._decode)
+        letters = b"|".join(get_column_letter(c).encode() for c in self._decode) or b"(?!)"
+        # 只匹配解码列的单元格 (r 为第一个属性, Excel / openpyxl 都这样写)
+        self._decoded_re = re.compile(rb'<c r="(' + letters + rb')\d+"([^>]*?)(?:/>|>(.*?)</c>)', re.DOTALL)
+        self._letters = letters
+        self._block_re = None
+        self._memo: dict = {}
+        self._col_cache: dict[bytes, int] = {}
+        # 片段交给 ElementTree 解析时, 用根元素上的命名空间声明包一层
+        ns_decls = b"".join(b' xmlns:%s="%s"' % m for m in _XMLNS_RE.findall(head))
+        self._wrapper = (b'<w xmlns="' + NS_MAIN.encode() + b'"' + ns_decls + b">", b"</w>")
+
+    def _column(self, letters: bytes) -> int:
+        col = self._col_cache.get(letters)
+        if col is None:
+            col = self._col_cache[letters] = _column_index(letters.decode())
+        return col
+
+    def parse(self, row: int, attrs: bytes, body: bytes) -> tuple:
+        cells: dict = {}
+        style_ids: dict = {}
+        if body.count(b"<c") == body.count(b'<c r="'):
+            pos = 0
+            for m in self._decoded_re.finditer(body):
+                if m.start() > pos:
+                    self._raw_run(row, body[pos:m.start()], cells)
+                self._decode_cell(row, self._column(m.group(1)), m.group(0), m.group(2), m.group(3),
+                                  cells, style_ids)
+                pos = m.end()
+            if pos < len(body):
+                self._raw_run(row, body[pos:], cells)
+        else:
+            self._parse_cells(row, body, cells, style_ids)
+        width = max(max(cells, default=0), max(style_ids, default=0))
+        values = [None] * width
+        for col, value in cells.items():
+            values[col - 1] = value
+        return row, tuple(values), tuple(style_ids.get(c, 0) for c in range(1, width + 1)), attrs
+
+    def block_values(self, block: bytes, min_row: int, gated=frozenset(),
+                     gate: Optional[tuple[int, str]] = None) -> Iterator[tuple[int, dict]]:
+        """整段 <sheetData> 片段 (iter_sheet_data_blocks) → 逐行 (行号, {列号: 值}), 只看解码列。
+
+        行号取自单元格的 r 属性, 不逐行切分; 相同的单元格片段 (除 r 外) 只解码一次。
+        gated (列字母集合) 中的列等整行读完、gate 命中时才解码 (见 iter_column_values)。
+        """
+        if block.count(b"<c") != block.count(b'<c r="'):
+            raise UnsupportedSheet("单元格缺少 r 属性")
+        if self._block_re is None:
+            self._block_re = re.compile(rb'<c r="(' + self._letters + rb')(\d+)"([^>]*?)(?:/>|>(.*?)</c>)',
+                                        re.DOTALL)
+        cur_ref, cur_row, cur, pending = None, 0, {}, []
+        for m in self._block_re.finditer(block):
+            ref = m.group(2)
+            if ref != cur_ref:
+                if pending:
+                    self._decode_gated(cur_row, cur, pending, gate)
+                if cur:
+                    yield cur_row, cur
+                cur_ref, cur_row, cur, pending = ref, int(ref), {}, []
+            if cur_row < min_row:
+                continue
+            if m.group(1) in gated:
+                pending.append(m)
+            else:
+                self._decode_memo(cur_row, m, cur)
+        if pending:
+            self._decode_gated(cur_row, cur, pending, gate)
+        if cur:
+            yield cur_row, cur
+
+    def _decode_gated(self, row: int, cur: dict, pending: list, gate) -> None:
+        col, wanted = gate
+        v = cur.get(col)
+        if v is not None and str(v).strip().lower() == wanted:
+            for m in pending:
+                self._decode_memo(row, m, cur)
+
+    def _decode_memo(self, row: int, m, cur: dict) -> None:
+        key = m.group(1, 3, 4)
+        decoded = self._memo.get(key)
+        if decoded is None:
+            col = self._column(key[0])
+            cells: dict = {}
+            self._decode_cell(row, col, m.group(0), key[1], key[2], cells, {})
+            decoded = (col, cells.get(col))
+            if len(self._memo) < MAX_DECODE_MEMO:
+                self._memo[key] = decoded
+        if decoded[1] is not None:
+            cur[decoded[0]] = decoded[1]
+
+    def _raw_run(self, row: int, xml: bytes, cells: dict) -> None:
+        """两个解码列单元格之间的一段原始片段; 跨过 (缺失的) 解码列时按单元格拆开。"""
+        start = xml.find(b'<c r="')
+        if start < 0:
+            return  # 单元格之间的空白
+        xml = xml[start:]
+        if b"<f" in xml and _SPECIAL_F_RE.search(xml):
+            raise UnsupportedSheet(f"第 {row} 行使用共享 / 数组公式")
+        first = self._column(_CELL_LETTERS_RE.match(xml).group(1))
+        last = self._column(_CELL_LETTERS_RE.match(xml, xml.rfind(b'<c r="')).group(1))
+        if bisect.bisect_right(self._decode, first) != bisect.bisect_left(self._decode, last):
+            self._parse_cells(row, xml, cells, {})
+            return
+        cells[first] = RawCell(xml, row)
+
+    def _parse_cells(self, row: int, body: bytes, cells: dict, style_ids: dict) -> None:
+        """逐个单元格切分 (兜底路径): 非解码列的相邻单元格仍合并成段。"""
+        run_start = run_seg = None
+        col = 0
+        for match in _CELL_XML_RE.finditer(body):
+            ref = _CELL_REF_RE.search(match.group(1))
+            xml = match.group(0)
+            if ref:
+                col = self._column(ref.group(1))
+            else:
+                col += 1
+                xml = b'<c r="%s%d"' % (get_column_letter(col).encode(), row) + xml[2:]
+            if col in self._decode_set:
+                run_start = None
+                self._decode_cell(row, col, xml, match.group(1), match.group(2), cells, style_ids)
+                continue
+            inner = match.group(2)
+            if inner and _SPECIAL_F_RE.search(inner):
+                raise UnsupportedSheet(f"第 {row} 行第 {col} 列使用共享 / 数组公式")
+            seg = bisect.bisect_left(self._decode, col)
+            if run_start is not None and seg == run_seg:
+                cells[run_start].xml += xml
+            else:
+                run_start, run_seg = col, seg
+                cells[col] = RawCell(xml, row)
+
+    def _decode_cell(self, row, col, xml, attrs, inner, cells, style_ids) -> None:
+        cell_attrs = dict(_CELL_ATTR_RE.findall(attrs))
+        s = cell_attrs.get(b"s")
+        if s and s != b"0":
+            style_ids[col] = int(s)
+        if not inner:
+            return
+        if b"<f" in inner and _SPECIAL_F_RE.search(inner):
+            raise UnsupportedSheet(f"第 {row} 行第 {col} 列使用共享 / 数组公式")
+        data_type = cell_attrs.get(b"t")
+        plain = _PLAIN_V_RE.fullmatch(inner)
+        if plain is not None and data_type == b"s":
+            value = self._strings[int(plain.group(1))]
+        elif plain is not None and data_type is None and int(s or 0) not in self._date_styles:
+            value = _cast_number(plain.group(1).decode())
+        elif data_type == b"inlineStr" and (inline := _PLAIN_IS_RE.fullmatch(inner)) is not None:
+            value = self._reader.pool.intern(inline.group(1).decode())
+        else:
+            try:
+                c = ElementTree.fromstring(self._wrapper[0] + xml + self._wrapper[1])[0]
+            except ElementTree.ParseError as e:
+                raise UnsupportedSheet(f"第 {row} 行第 {col} 列无法解析: {e}") from e
+            value = self._reader._cell_value(c, self._date_styles, self._timedelta_styles,
+                                             self._reader._epoch)
+        if value is not None:
+            cells[col] = value
+
+
+class SheetReader:
+    """xlsx/xlsm 包的只读访问: sheet 名列表 + 指定 sheet 的逐行迭代。"""
+
+    def __init__(self, filepath: str | Path, pool: Optional[InternPool] = None):
+        self.filepath = Path(filepath)
+        self.pool = pool if pool is not None else InternPool()
+        self._zf = zipfile.ZipFile(self.filepath)
+        try:
+            self._workbook_part = next(
+                _resolve_target("", target)
+                for rel_type, target in _read_rels(self._zf, "_rels/.rels").values()
+                if rel_type == REL_OFFICE_DOCUMENT
+            )
+            root = ElementTree.fromstring(self._zf.read(self._workbook_part))
+        except (StopIteration, KeyError, ElementTree.ParseError) as e:
+            self._zf.close()
+            raise UnsupportedSheet(f"无法解析 workbook: {e}") from e
+        self.sheet_names = [s.get("name") for s in root.iter(f"{{{NS_MAIN}}}sheet")]
+        pr = root.find(f"{{{NS_MAIN}}}workbookPr")
+        self._epoch = (CALENDAR_MAC_1904 if pr is not None and pr.get("date1904") in ("1", "true")
+                       else CALENDAR_WINDOWS_1900)
+        self._related = {}
+        for rel_type, target in _read_rels(self._zf, _rels_path_for(self._workbook_part)).values():
+            self._related[rel_type.rsplit("/", 1)[-1]] = _resolve_target(self._workbook_part, target)
+        self._shared_strings: Optional[_SharedStrings] = None
+        self._date_styles: Optional[tuple[set, set]] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._shared_strings is not None:
+            self._shared_strings.close()
+        self._zf.close()
+
+    def _strings(self) -> _SharedStrings:
+        if self._shared_strings is None:
+            part = self._related.get(_REL_SHARED_STRINGS)
+            self._shared_strings = _SharedStrings(self._zf, part, self.pool)
+        return self._shared_strings
+
+    def _date_style_ids(self) -> tuple[set, set]:
+        """(日期格式的 xf 下标集合, 时长格式的 xf 下标集合)。"""
+        if self._date_styles is not None:
+            return self._date_styles
+        dates, deltas = set(), set()
+        part = self._related.get(_REL_STYLES)
+        if part is not None:
+            root = ElementTree.fromstring(self._zf.read(part))
+            custom = {
+                int(fmt.get("numFmtId")): fmt.get("formatCode")
+                for fmt in root.iter(f"{{{NS_MAIN}}}numFmt")
+            }
+            xfs = root.find(f"{{{NS_MAIN}}}cellXfs")
+            for idx, xf in enumerate(xfs if xfs is not None else ()):
+                fmt_id = int(xf.get("numFmtId", 0))
+                fmt = custom.get(fmt_id) or builtin_format_code(fmt_id)
+                if is_date_format(fmt):
+                    dates.add(idx)
+                if is_timedelta_format(fmt):
+                    deltas.add(idx)
+        self._date_styles = (dates, deltas)
+        return self._date_styles
+
+    def iter_rows(self, sheet_name: str, max_row: Optional[int] = None,
+                  styles: bool = False) -> Iterator[tuple]:
+        """逐行产出 (行号, 值元组); 值元组下标 0 = 第 1 列, 空行不产出。
+
+        styles=True 时产出 (行号, 值元组, 样式下标元组, 行属性 dict):
+        只有样式没有值的单元格 / 只有行属性的行也会产出, 行属性不含 r / spans。
+        """
+        try:
+            _, sheet_part = find_sheet_part(self._zf, sheet_name)
+        except PassthroughUnsupported as e:
+            raise UnsupportedSheet(str(e)) from e
+        date_styles, timedelta_styles = self._date_style_ids()
+        epoch = self._epoch
+
+        strings = self._strings()
+        col_cache: dict[str, int] = {}
+        row_counter = 0
+        with self._zf.open(sheet_part) as f:
+            for _, row in ElementTree.iterparse(f, events=("end",)):
+                if row.tag != _ROW_TAG:
+                    continue
+                r = row.get("r")
+                row_counter = int(r) if r else row_counter + 1
+                if max_row is not None and row_counter > max_row:
+                    break
+                cells = {}
+                style_ids = {}
+                col = 0
+                for c in row:
+                    if c.tag != _C_TAG:
+                        continue
+                    ref = c.get("r")
+                    if ref:
+                        letters = ref.rstrip("0123456789")
+                        col = col_cache.get(letters) or col_cache.setdefault(letters, _column_index(letters))
+                    else:
+                        col += 1
+                    if styles:
+                        s = c.get("s")
+                        if s and s != "0":
+                            style_ids[col] = int(s)
+                    # 热路径: 只有 <v> 的共享字符串 / 非日期数字; 其余交给 _cell_value
+                    data_type = c.get("t")
+                    if len(c) == 1 and c[0].tag == _V_TAG and c[0].text:
+                        if data_type == "s":
+                            cells[col] = strings[int(c[0].text)]
+                            continue
+                        if data_type is None and int(c.get("s", 0)) not in date_styles:
+                            cells[col] = _cast_number(c[0].text)
+                            continue
+                    value = self._cell_value(c, date_styles, timedelta_styles, epoch)
+                    if value is not None:
+                        cells[col] = value
+                if styles:
+                    attrib = {k: v for k, v in row.attrib.items() if k not in ("r", "spans")}
+                    row.clear()
+                    if cells or style_ids or attrib:
+                        width = max(max(cells, default=0), max(style_ids, default=0))
+                        values = [None] * width
+                        for col_idx, value in cells.items():
+                            values[col_idx - 1] = value
+                        style_row = tuple(style_ids.get(c, 0) for c in range(1, width + 1))
+                        yield row_counter, tuple(values), style_row, attrib
+                    continue
+                row.clear()
+                if cells:
+                    values = [None] * max(cells)
+                    for col_idx, value in cells.items():
+                        values[col_idx - 1] = value
+                    yield row_counter, tuple(values)
+
+    def iter_raw_rows(self, sheet_name: str, decode_columns, min_row: int = 1) -> Iterator[tuple]:
+        """逐行产出 (行号, 值元组, 样式下标元组, 行属性文本), 只解码 decode_columns 中的列。
+
+        其余列的单元格不解码: 相邻的一段 <c> 片段合成一个 RawCell 放在该段第一列
+        (段内不含解码列的列号, 调用方写解码列不会打乱单元格顺序); 行属性为 <row> 标签上
+        去掉 r / spans 的原始文本。min_row 之前的行跳过不解析。
+        共享 / 数组 / 数据表公式 (直通后行号变化会失效) 一律抛 UnsupportedSheet。
+        """
+        try:
+            _, sheet_part = find_sheet_part(self._zf, sheet_name)
+        except PassthroughUnsupported as e:
+            raise UnsupportedSheet(str(e)) from e
+        with self._zf.open(sheet_part) as f:
+            parser = _RawRowParser(self, decode_columns, f.read(4096))
+            f.seek(0)
+            try:
+                for row, attrs, body in iter_row_xml(f):
+                    if row >= min_row:
+                        yield parser.parse(row, attrs, body)
+            except PassthroughUnsupported as e:
+                raise UnsupportedSheet(str(e)) from e
+
+    def iter_column_values(self, sheet_name: str, columns, min_row: int = 1, gated=(),
+                           gate: Optional[tuple[int, str]] = None) -> Iterator[tuple[int, dict]]:
+        """逐行产出 (行号, {列号: 值}), 只解码 columns 中的列, 其余单元格不解析也不保留。
+
+        gated 中的列只在 gate = (列号, 取值) 命中的行解码 (去空格后不区分大小写比较),
+        如只要 Parent 行的 Item Name 时: gated=[7], gate=(4, "parent")。
+        这几列都为空的行不产出; 解码列中的共享 / 数组公式抛 UnsupportedSheet。
+        """
+        try:
+            _, sheet_part = find_sheet_part(self._zf, sheet_name)
+        except PassthroughUnsupported as e:
+            raise UnsupportedSheet(str(e)) from e
+        gated_letters = frozenset(get_column_letter(c).encode() for c in gated)
+        if gate is not None:
+            gate = (gate[0], gate[1].lower())
+        with self._zf.open(sheet_part) as f:
+            parser = _RawRowParser(self, [*columns, *gated], f.read(4096))
+            f.seek(0)
+            try:
+                for block in iter_sheet_data_blocks(f):
+                    yield from parser.block_values(block, min_row, gated_letters, gate)
+            except PassthroughUnsupported as e:
+                raise UnsupportedSheet(str(e)) from e
+
+    def _cell_value(self, c, date_styles, timedelta_styles, epoch):
+        data_type = c.get("t", "n")
+        f = c.find(_F_TAG)
+        if f is not None:
+            f_type = f.get("t")
+            if f_type in ("array", "dataTable") or (f_type == "shared" and not f.text):
+                raise UnsupportedSheet(f"单元格 {c.get('r')} 使用 {f_type} 公式")
+            return "=" + (f.text or "")
+        if data_type == "inlineStr":
+            node = c.find(_IS_TAG)
+            return self.pool.intern(_rich_text(node)) if node is not None else None
+        text = c.findtext(_V_TAG)
+        if not text:
+            return None
+        if data_type == "n":
+            value = _cast_number(text)
+            style_id = int(c.get("s", 0))
+            if style_id in date_styles:
+                try:
+                    return from_excel(value, epoch, timedelta=style_id in timedelta_styles)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == "s":
+            return self._strings()[int(text)]
+        if data_type == "b":
+            return bool(int(text))
+        if data_type == "d":
+            return from_ISO8601(text)
+        return self.pool.intern(text)  # str / e
@@ -0,0 +1,152 @@
+"""单文件处理流程 (normalize + fill + SKU 命名), CLI (__main__) 与 GUI (gui_entry) 入口共用
+
+优先流式处理 (逐组读入、规范化后立即写出, 见 template_stream);
+平面文件或流式不适用时整表加载、原地修改后保存。
+进度与汇总通过调用方传入的 log 回调输出。
+"""
+
+import logging
+from pathlib import Path
+from typing import Callable, Optional
+
+from .excel_io import HeaderIndex, group_rows, load_workbook, locate_columns, save_workbook, scan_data_extent
+from .field_filler import detect_ratio_type, fill_group
+from .merger import build_sku_prefix, prevalidate_input, rewrite_sku, write_parent_sku_formulas
+from .name_normalizer import normalize_group
+from .template_stream import StreamUnsupported, TemplateStream
+from .xlsx_package import DEFAULT_COMPRESSION
+
+logger = logging.getLogger(__name__)
+
+ROWS_PER_GROUP = 11
+
+
+def run_single_file(
+    input_path: str | Path,
+    log: Callable[[str], None] = print,
+    sku_prefix: Optional[str] = None,
+    output_path: Optional[str | Path] = None,
+    compression: str = DEFAULT_COMPRESSION,
+) -> Optional[tuple[Path, int]]:
+    """处理单个普文件并输出汇总。
+
+    Args:
+        log: 进度输出回调 (每次一行)
+        sku_prefix: SKU 命名前缀; 为空则不重写 SKU
+        output_path: 输出路径 (默认: {input}_processed.{ext})
+
+    Returns:
+        (输出路径, 产品组数); 没有数据时为 None
+
+    Raises:
+        ValueError: 文件类型不符 / 必需列缺失等业务错误
+    """
+    input_path = Path(input_path)
+    prevalidate_input(input_path, "main")
+    log(f">> 读取文件: {input_path.name} ...")
+    try:
+        result = _run_streaming(input_path, output_path, sku_prefix, log, compression)
+    except StreamUnsupported as e:
+        logger.info("流式输出不可用 (%s), 改用整表加载", e)
+        result = _run_in_place(input_path, output_path, sku_prefix, log, compression)
+    if result is None:
+        return None
+    out, group_count = result
+
+    log("")
+    log("=" * 50)
+    log("  [OK] 处理完成")
+    log("=" * 50)
+    log(f"  产品组数: {group_count}")
+    log(f"  总行数:   {group_count * ROWS_PER_GROUP}")
+    log(f"  输出文件: {out}")
+    log("=" * 50)
+    return result
+
+
+def _log_columns(log, col_map: dict[str, int]) -> None:
+    found_cols = sorted(col_map.items(), key=lambda x: x[1])
+    log(f">> 列定位完成: {', '.join(f'{name}(列{idx})' for name, idx in found_cols)}")
+
+
+def _run_streaming(input_path, output_path, sku_prefix, log, compression):
+    """逐组读入、规范化后立即写出, 内存只与组大小相关。"""
+    prefix = build_sku_prefix(sku_prefix) if sku_prefix else None
+    sku_counters = {}
+    with TemplateStream(input_path, output_path, compression=compression) as stream:
+        ws = stream.sheet
+        col_map = locate_columns(ws, headers=stream.headers)
+        product_name_col = col_map["Item Name"]
+        sku_col = col_map.get("SKU", 1)
+        parent_sku_col = col_map.get("Parent SKU", 5)
+        stream.decode_only({*col_map.values(), sku_col, parent_sku_col})
+        _log_columns(log, col_map)
+        log(">> 逐组处理并写出...")
+        log("")
+
+        group_count = 0
+        for group_count, rows in enumerate(stream.groups(), 1):
+            ratio_type = detect_ratio_type(ws, rows, col_map)
+            log(f"  [{group_count}] 行{rows[0]}-{rows[-1]} 比例: {ratio_type}")
+            normalize_group(ws, rows, product_name_col, ratio_type)
+            fill_group(ws, rows, col_map, ratio_type)
+            # SKU 命名 (单文件 = new 模式), 编号跨组连续
+            if prefix:
+                rewrite_sku(ws, [rows], prefix, sku_col=sku_col, mode="new", counters=sku_counters)
+                write_parent_sku_formulas(ws, [rows], parent_sku_col=parent_sku_col,
+                                          seller_sku_col=sku_col, mode="new")
+
+    if not group_count:
+        log("[!] 没有可处理的数据")
+        log(f"输出文件: {stream.out_path}")
+        return None
+    if prefix:
+        log(f">> SKU 命名完成: 前缀={prefix} (父体={prefix}-N, 普通子体={prefix}P-N)")
+    return stream.out_path, group_count
+
+
+def _run_in_place(input_path, output_path, sku_prefix, log, compression):
+    """整表加载 + 原地修改后保存 (平面文件 / 流式不适用时)。"""
+    wb, ws, template_name = load_workbook(input_path)
+    logger.info("sheet='%s', max_row=%d, max_column=%d", template_name, ws.max_row, ws.max_column)
+    log(">> 文件加载完成")
+
+    headers = HeaderIndex.from_sheet(ws)
+    col_map = locate_columns(ws, headers=headers)
+    product_name_col = col_map["Item Name"]
+    _log_columns(log, col_map)
+
+    extent = scan_data_extent(ws, headers=headers)
+    groups = group_rows(ws, extent=extent)
+    if not groups:
+        log("[!] 没有可处理的数据")
+        out = save_workbook(ws, input_path, template_name, output_path,
+                            extent=extent, headers=headers, compression=compression)
+        log(f"输出文件: {out}")
+        return None
+
+    log(f">> 共 {len(groups)} 个产品组, {len(groups) * ROWS_PER_GROUP} 行数据")
+    log("")
+
+    for idx, rows in enumerate(groups, 1):
+        ratio_type = detect_ratio_type(ws, rows, col_map)
+        log(f"  [{idx}/{len(groups)}] 行{rows[0]}-{rows[-1]} 比例: {ratio_type}")
+        normalize_group(ws, rows, product_name_col, ratio_type)
+        fill_group(ws, rows, col_map, ratio_type)
+
+    # SKU 命名 (单文件 = new 模式, 只有 parent + 普通子体, 无木金 J 后缀)
+    if sku_prefix:
+        prefix = build_sku_prefix(sku_prefix)
+        sku_col = col_map.get("SKU", 1)
+        parent_sku_col = col_map.get("Parent SKU", 5)
+        rewrite_sku(ws, groups, prefix, sku_col=sku_col, mode="new")
+        write_parent_sku_formulas(ws, groups, parent_sku_col=parent_sku_col,
+                                  seller_sku_col=sku_col, mode="new")
+        log(f">> SKU 命名完成: 前缀={prefix} (父体={prefix}-N, 普通子体={prefix}P-N)")
+
+    log("")
+    log(">> 保存文件...")
+    # 单文件流程不改 Parentage Level, 数据区索引可直接复用
+    out = save_workbook(ws, input_path, template_name, output_path,
+                        extent=extent, headers=headers, compression=compression)
+    return out, len(groups)
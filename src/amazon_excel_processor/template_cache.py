@@ -0,0 +1,113 @@
+"""Template sheet 解析结果的本地磁盘缓存
+
+配对失败后操作员通常只改一个名字就重跑, 未改动的输入文件没必要重新解析。
+缓存键 = 文件内容哈希 + 解析器版本 (CACHE_FORMAT_VERSION), 值 = TemplateSheet 的
+sheet 名与全部行数据 (表头行 / 数据区都在其中), pickle 后 zlib 压缩存盘。
+
+目录默认 ~/.cache/amazon-excel-processor (Windows: %LOCALAPPDATA%), 可用环境变量
+AEP_CACHE_DIR 覆盖; 总大小超过上限时按最近使用时间 (文件 mtime) 淘汰最旧条目。
+缓存读写失败只记日志, 不影响主流程。
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from .template_sheet import TemplateSheet
+
+logger = logging.getLogger(__name__)
+
+# 解析逻辑或存储格式变化时递增, 旧条目自然失效 (键不同)
+CACHE_FORMAT_VERSION = 2
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+_ENTRY_SUFFIX = ".tpl"
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("AEP_CACHE_DIR")
+    if env:
+        return Path(env)
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "amazon-excel-processor" / "cache"
+    return Path.home() / ".cache" / "amazon-excel-processor"
+
+
+def file_digest(path: str | Path) -> str:
+    """文件内容 SHA-256 (十六进制)。"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class TemplateCache:
+    """按内容哈希缓存 TemplateSheet, 大小受限, LRU 淘汰。"""
+
+    def __init__(self, cache_dir: Optional[str | Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}-v{CACHE_FORMAT_VERSION}{_ENTRY_SUFFIX}"
+
+    def get(self, digest: str) -> Optional[TemplateSheet]:
+        path = self._entry_path(digest)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.debug("缓存读取失败 %s: %s", path.name, e)
+            return None
+        try:
+            title, rows = pickle.loads(zlib.decompress(data))
+        except Exception as e:  # 损坏/截断的条目直接丢弃
+            logger.warning("缓存条目损坏, 已删除: %s (%s)", path.name, e)
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)  # 标记最近使用
+        except OSError:
+            pass
+        sheet = TemplateSheet(title=title)
+        for row, values in rows.items():
+            sheet.load_row(row, values)
+        logger.debug("缓存命中: %s", path.name)
+        return sheet
+
+    def put(self, digest: str, sheet: TemplateSheet) -> None:
+        rows = {row: tuple(values) for row, values in sheet._rows.items()}
+        payload = zlib.compress(pickle.dumps((sheet.title, rows), protocol=pickle.HIGHEST_PROTOCOL), 1)
+        path = self._entry_path(digest)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(payload)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.debug("缓存写入失败 %s: %s", path.name, e)
+            tmp.unlink(missing_ok=True)
+            return
+        logger.debug("缓存写入: %s (%d 字节)", path.name, len(payload))
+        self.evict()
+
+    def evict(self) -> None:
+        """总大小超过 max_bytes 时, 从最久未使用的条目开始删除。"""
+        try:
+            entries = [(p.stat(), p) for p in self.cache_dir.glob(f"*{_ENTRY_SUFFIX}")]
+        except OSError:
+            return
+        total = sum(st.st_size for st, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for st, path in sorted(entries, key=lambda e: e[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= st.st_size
+                logger.debug("缓存淘汰: %s", path.name)
+            except OSError:
+                pass
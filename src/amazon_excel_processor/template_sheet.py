@@ -0,0 +1,298 @@
+"""Template sheet 轻量内存模型
+
+只读加载路径共用: 行数据存为 {row: list[value]}, 提供与 openpyxl Worksheet
+兼容的最小接口 (cell / max_row / max_column / title), 使 locate_columns /
+group_rows / detect_ratio_type / index_groups_by_name 等函数无需修改即可运行。
+
+与 openpyxl 不同, cell() 返回的是按需创建的代理对象, 读取不存在的单元格
+不会在表中留下空 Cell, 也不会撑大 max_row / max_column。
+
+cell_value / row_values / set_cell_value / set_row_values / detach_rows 对 openpyxl
+Worksheet 和 TemplateSheet 都适用, 只读/清空时不为空坐标创建 Cell。
+
+InternPool: 读取阶段的字符串驻留池。单位、Parentage Level、品牌、款式名这类
+取值在成千上万个单元格里重复, 驻留后同一文本只占一个 str 对象。
+
+SharedStyleArray / own_style: 多个单元格共用的样式数组与写时复制。set_cell_value /
+set_row_values 写入日期值前 (openpyxl 会就地改 number_format) 先把共享样式换成副本。
+"""
+
+import datetime
+import sys
+from typing import Optional
+
+from openpyxl.styles.cell_style import StyleArray
+
+# 驻留池上限: 条目数 / 单个字符串长度 (长文本多为唯一的标题描述, 驻留无益)
+MAX_INTERN_ENTRIES = 1 << 16
+MAX_INTERN_LENGTH = 128
+
+
+def cell_value(ws, row: int, column: int):
+    """读取单元格值, 不创建 Cell。
+
+    openpyxl 的 ws.cell() 会为每个访问过的坐标建一个空 Cell, 撑大 max_row /
+    max_column 并在保存时写出空单元格; 这里直接查 ws._cells。
+    """
+    cells = getattr(ws, "_cells", None)
+    if cells is None:
+        return ws.cell(row=row, column=column).value
+    cell = cells.get((row, column))
+    return None if cell is None else cell.value
+
+
+def row_values(ws, row: int, max_col: int) -> tuple:
+    """整行读取前 max_col 列的值为元组 (下标 0 = 第 1 列), 末尾空值去掉; 不创建 Cell。"""
+    if isinstance(ws, TemplateSheet):
+        values = ws._rows.get(row, ())[:max_col]
+    else:
+        cells = getattr(ws, "_cells", None)
+        if cells is None:
+            values = [ws.cell(row=row, column=c).value for c in range(1, max_col + 1)]
+        else:
+            get = cells.get
+            values = [None if (cell := get((row, c))) is None else cell.value
+                      for c in range(1, max_col + 1)]
+    end = len(values)
+    while end and values[end - 1] is None:
+        end -= 1
+    return tuple(values[:end])
+
+
+def detach_rows(ws, start_row: int, pool: Optional["InternPool"] = None) -> "TemplateSheet":
+    """把 start_row 及以下全部行的值从 ws 中移出, 装入新的 TemplateSheet 返回。
+
+    TemplateSheet 只剩第 1..start_row-1 行; openpyxl Worksheet 的这些行只留带样式的空单元格
+    (填充 / 字体 / 数字格式 / 边框按坐标保留, 与逐格清空值的结果相同), 无样式的 Cell 直接丢弃。
+    之后可直接当作空白区写入, 不必逐格清空。一次遍历完成; 传入 pool 时字符串值经池驻留。
+    """
+    intern = pool.intern if pool is not None else None
+    detached = TemplateSheet(title=ws.title)
+    if isinstance(ws, TemplateSheet):
+        rows = ws.truncate(start_row)
+    else:
+        kept, by_row = {}, {}
+        for key, cell in ws._cells.items():
+            if key[0] < start_row:
+                kept[key] = cell
+                continue
+            if cell._value is not None:
+                by_row.setdefault(key[0], {})[key[1]] = cell.value
+            if cell.has_style:
+                cell.value = None
+                kept[key] = cell
+        ws._cells = kept
+        rows = {}
+        for r, bucket in by_row.items():
+            values = rows[r] = [None] * max(bucket)
+            for c, v in bucket.items():
+                values[c - 1] = v
+    for r in sorted(rows):
+        values = rows[r]
+        detached.load_row(r, [intern(v) for v in values] if intern else values)
+    return detached
+
+
+# openpyxl 写入这些类型的值时会顺带改单元格的 number_format
+_DATE_TYPES = (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+
+class SharedStyleArray(StyleArray):
+    """多个单元格共用的样式数组 (StyleInterner 发出)。只读: 改样式前先 own_style。"""
+
+    __slots__ = ()
+
+
+def own_style(cell) -> None:
+    """写时复制: 单元格的样式若是共享数组, 换成它自己的副本 (已独占时什么也不做)。
+
+    openpyxl 设 font / fill / number_format (包括写入日期值) 都是原地改 _style,
+    改共享数组会波及所有共用它的单元格, 所以改之前先调这里。
+    """
+    if type(getattr(cell, "_style", None)) is SharedStyleArray:
+        cell._style = StyleArray(cell._style)
+
+
+def set_cell_value(ws, row: int, column: int, value) -> None:
+    """写入单元格值; 写 None 且单元格不存在时什么也不做 (不创建空 Cell)。"""
+    if value is None:
+        cells = getattr(ws, "_cells", None)
+        if cells is not None:
+            cell = cells.get((row, column))
+            if cell is not None:
+                cell.value = None
+            return
+    cell = ws.cell(row=row, column=column)
+    if isinstance(value, _DATE_TYPES):
+        own_style(cell)
+    cell.value = value
+
+
+def set_row_values(ws, row: int, values, max_col: int) -> None:
+    """整行写入第 1..max_col 列 (values 下标 0 = 第 1 列, 不足 max_col 的列写 None)。
+
+    TemplateSheet 直接替换行列表; openpyxl Worksheet 按已有 Cell 就地赋值,
+    空值只清已有单元格, 不为空坐标创建 Cell (与逐格 set_cell_value 结果相同)。
+    """
+    if isinstance(ws, TemplateSheet):
+        ws.set_row(row, values, max_col)
+        return
+    cells = getattr(ws, "_cells", None)
+    if cells is None:
+        for c in range(1, max_col + 1):
+            set_cell_value(ws, row, c, values[c - 1] if c <= len(values) else None)
+        return
+    get = cells.get
+    new_cell = ws._get_cell
+    for c, value in enumerate(values[:max_col], start=1):
+        cell = get((row, c))
+        if cell is not None:
+            if type(cell._style) is SharedStyleArray and isinstance(value, _DATE_TYPES):
+                own_style(cell)
+            cell.value = value
+        elif value is not None:
+            new_cell(row, c).value = value
+    for c in range(len(values) + 1, max_col + 1):
+        cell = get((row, c))
+        if cell is not None:
+            cell.value = None
+
+
+class InternPool:
+    """有界字符串驻留池: intern() 对相同文本返回同一个 str 对象。
+
+    只驻留不超过 max_length 的 str; 条目满 max_entries 后不再新增, 已有条目照常命中。
+    saved_bytes 累计命中时被替换掉的重复对象大小 (即快照里省下的内存)。
+    """
+
+    def __init__(self, max_entries: int = MAX_INTERN_ENTRIES, max_length: int = MAX_INTERN_LENGTH):
+        self.max_entries = max_entries
+        self.max_length = max_length
+        self._pool: dict[str, str] = {}
+        self.hits = 0
+        self.saved_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def intern(self, value):
+        if type(value) is not str or len(value) > self.max_length:
+            return value
+        pooled = self._pool.get(value)
+        if pooled is None:
+            if len(self._pool) < self.max_entries:
+                self._pool[value] = value
+            return value
+        if pooled is not value:
+            self.hits += 1
+            self.saved_bytes += sys.getsizeof(value)
+        return pooled
+
+
+class SheetCell:
+    """TemplateSheet 的单元格代理 (只保存坐标, 值读写直接落到所属 sheet)。"""
+
+    __slots__ = ("_sheet", "row", "column")
+
+    def __init__(self, sheet: "TemplateSheet", row: int, column: int):
+        self._sheet = sheet
+        self.row = row
+        self.column = column
+
+    @property
+    def value(self):
+        return self._sheet.value(self.row, self.column)
+
+    @value.setter
+    def value(self, value):
+        self._sheet.set_value(self.row, self.column, value)
+
+
+class TemplateSheet:
+    """只含单元格值的 Template sheet。
+
+    _rows: {行号: [第 1 列值, 第 2 列值, ...]}, 每行末尾的空值不存。
+    """
+
+    def __init__(self, title: str = "Template"):
+        self.title = title
+        self.parent = None  # 无所属 workbook (与 openpyxl Worksheet.parent 对应)
+        self._rows: dict[int, list] = {}
+        self._max_row = 0
+        self._max_column = 0
+
+    @property
+    def max_row(self) -> int:
+        # 与 openpyxl 一致: 空表的 max_row / max_column 为 1
+        return self._max_row or 1
+
+    @property
+    def max_column(self) -> int:
+        return self._max_column or 1
+
+    def load_row(self, row: int, values) -> None:
+        """整行装入 (读取阶段使用), 去掉末尾空值。"""
+        values = list(values)
+        while values and values[-1] is None:
+            values.pop()
+        if not values:
+            return
+        self._rows[row] = values
+        if row > self._max_row:
+            self._max_row = row
+        if len(values) > self._max_column:
+            self._max_column = len(values)
+
+    def value(self, row: int, column: int):
+        values = self._rows.get(row)
+        if values is None or column > len(values):
+            return None
+        return values[column - 1]
+
+    def set_value(self, row: int, column: int, value) -> None:
+        values = self._rows.get(row)
+        if values is None:
+            if value is None:
+                return  # 不为写入 None 创建新行
+            values = self._rows[row] = []
+            if row > self._max_row:
+                self._max_row = row
+        if column > len(values):
+            if value is None:
+                return
+            values.extend([None] * (column - len(values)))
+            if column > self._max_column:
+                self._max_column = column
+        values[column - 1] = value
+
+    def set_row(self, row: int, values, width: int) -> None:
+        """整行覆盖前 width 列 (见 set_row_values); width 之后的已有值保留。"""
+        values = list(values[:width])
+        old = self._rows.get(row)
+        if old is not None and len(old) > width:
+            values.extend([None] * (width - len(values)))
+            values.extend(old[width:])
+        while values and values[-1] is None:
+            values.pop()
+        if not values:
+            self._rows.pop(row, None)
+            return
+        self._rows[row] = values
+        if row > self._max_row:
+            self._max_row = row
+        if len(values) > self._max_column:
+            self._max_column = len(values)
+
+    def cell(self, row: int, column: int) -> SheetCell:
+        return SheetCell(self, row, column)
+
+    def truncate(self, start_row: int) -> dict[int, list]:
+        """移除 start_row 及以下的行并返回 {行号: 值列表}; max_row / max_column 按剩余行重算。"""
+        removed = {r: self._rows.pop(r) for r in [r for r in self._rows if r >= start_row]}
+        self._max_row = max(self._rows, default=0)
+        self._max_column = max(map(len, self._rows.values()), default=0)
+        return removed
+
+    def pop_row(self, row: int) -> list:
+        """取出并移除一行的值 (流式输出写出后释放缓冲); 行不存在时返回空列表。"""
+        return self._rows.pop(row, [])
@@ -0,0 +1,413 @@
+"""Template sheet 流式输出 (逐组写出, 内存只与组大小相关)
+
+整表加载再原地修改时, 输入 sheet、快照和输出同时驻留内存。流式路径改为:
+  - sheet_reader 逐行读源 Template sheet (值 + 样式下标 + 行属性);
+  - 第 1-7 行 (表头区) 立即原样写出, 同时留在缓冲 sheet 中供列定位;
+  - 数据行按 Parentage Level 逐组读入缓冲 (TemplateSheet), 调用方处理完一组后
+    清理上传字段并经 TemplatePackageWriter 写出, 随即从缓冲中丢弃。
+输出包其余 part 原样复制 (见 xlsx_package); 缓冲中同时只有表头区 + 一组行。
+
+单文件模式 (groups): 行号不变, 组以外的行 (备注 / 不规则组) 原样写出。
+合并模式 (source_groups + write_rows): 源组读入独立缓冲, 输出行写到新的行号;
+输出行的样式和行属性取源文件第一组的 Parent 行 / 第一个 Child 行 (模板同列格式一致,
+对应整表路径中把 E8 样式复制到每组 Parent 行的做法)。数据区之后的行不保留。
+GroupReader: 只读的逐组读取 (合并模式按文件顺序读木/金文件, 见 merger._VariantJoin)。
+
+不适用的情况 (平面文件、输出格式与输入不同、读取器或直通写出不支持的内容、
+第一个 Parent 之前有数据行) 抛 StreamUnsupported, 已写出的部分删除,
+由调用方回退整表加载路径。
+调用方定位列之后可调 decode_only(列号): 数据行只解码流水线会读写的列, 其余单元格
+保持源 XML 片段 (RawCell) 原样写出, 宽模板下省去绝大部分单元格的解码和重新序列化。
+输出先写到目标目录下的临时文件, close 时原子替换到位 (见 excel_io._commit_output)。
+"""
+
+import logging
+import zipfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .excel_io import (
+    DATA_START_ROW,
+    GROUP_SIZE,
+    DataExtent,
+    HeaderIndex,
+    _check_suffix,
+    _commit_output,
+    _find_template_sheet_name,
+    _resolve_output_path,
+    _temp_output_path,
+    clear_upload_fields,
+    upload_cleanup_columns,
+)
+from .sheet_reader import SheetReader, UnsupportedSheet
+from .template_sheet import TemplateSheet
+from .tsv_io import is_tsv_path
+from .xlsx_package import (
+    DEFAULT_COMPRESSION,
+    PassthroughUnsupported,
+    RawCell,
+    TemplatePackageWriter,
+    format_row_attrs,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StreamUnsupported(Exception):
+    """无法流式输出 (调用方应回退整表加载 + 原地修改)。"""
+
+
+class _GroupedRows:
+    """数据区按 Parentage Level 切段 (TemplateStream / GroupReader 共用)。
+
+    子类提供 parentage_col 和 _data_rows() (逐个产出第 1 项为行号、第 2 项为值元组的源行)。
+    """
+
+    parentage_col = 4
+
+    def _data_rows(self):
+        raise NotImplementedError
+
+    def _level(self, values) -> str:
+        col = self.parentage_col
+        v = values[col - 1] if col <= len(values) else None
+        return str(v).strip().lower() if v is not None else ""
+
+    def _segments(self) -> Iterator[tuple[bool, list]]:
+        """数据区切段: (是否组, [源行, ...])。
+
+        组 = Parent 行到下一个 Parent 之前的最后一个数据行 (夹在中间的非数据行也算在内,
+        由 _is_regular 判定); 组之后的非数据行单独成段。
+        """
+        group, tail = None, []
+        for src in self._data_rows():
+            level = self._level(src[1])
+            if level == "parent":
+                if group:
+                    yield True, group
+                if tail:
+                    yield False, tail
+                group, tail = [src], []
+            elif level:
+                if group is None:
+                    raise StreamUnsupported(f"第 {src[0]} 行的数据行不属于任何 Parent 组")
+                group.extend(tail)
+                group.append(src)
+                tail = []
+            elif group is None:
+                yield False, [src]
+            else:
+                tail.append(src)
+                if len(tail) > 2 * GROUP_SIZE:
+                    # 组后跟了一长串非数据行 (备注 / 带格式的空行): 结束当前组, 缓冲不随之增长
+                    yield True, group
+                    yield False, tail
+                    group, tail = None, []
+        if group:
+            yield True, group
+        if tail:
+            yield False, tail
+
+    def _is_regular(self, rows: list, group_size: Optional[int]) -> bool:
+        count = sum(1 for src in rows if self._level(src[1]))
+        span = rows[-1][0] - rows[0][0] + 1
+        regular = count == span and (group_size is None or span == group_size)
+        if not regular:
+            logger.warning("行 %d-%d 的组不规则: %d 个数据行, 跨 %d 行 (期望 %s 行), 已跳过",
+                           rows[0][0], rows[-1][0], count, span, group_size)
+        return regular
+
+
+class TemplateStream(_GroupedRows):
+    """源 Template sheet 逐行读入, 处理后的行按行号升序写出到输出包。
+
+    用法 (单文件):
+        with TemplateStream(input_path) as stream:
+            for rows in stream.groups():
+                normalize_group(stream.sheet, rows, ...)
+        stream.out_path
+    """
+
+    def __init__(self, input_path: str | Path, output_path: Optional[str | Path] = None,
+                 suffix: str = "_processed", compression: str = DEFAULT_COMPRESSION):
+        self.input_path = Path(input_path)
+        _check_suffix(self.input_path)
+        target_suffix = Path(output_path).suffix if output_path else self.input_path.suffix
+        if is_tsv_path(self.input_path) or target_suffix.lower() != self.input_path.suffix.lower():
+            raise StreamUnsupported("平面文件或输出格式与输入不同")
+        self._output_path = Path(output_path) if output_path else None
+        self._suffix = suffix
+        self._compression = compression
+        self.out_path: Optional[Path] = None
+        self._tmp_path: Optional[Path] = None
+        self.sheet: Optional[TemplateSheet] = None      # 表头区 + 待写出的行
+        self.source: Optional[TemplateSheet] = None     # 合并模式: 当前源组
+        self.headers: Optional[HeaderIndex] = None
+        self.parentage_col = 4
+        self._reader = None
+        self._writer = None
+        self._sheet_name = None
+        self._decode_columns: Optional[frozenset] = None
+        self._formats: dict[int, tuple[tuple, bytes]] = {}  # {行号: (样式下标元组, 行属性)}
+        self._parent_format: Optional[tuple[tuple, bytes]] = None
+        self._child_format: Optional[tuple[tuple, bytes]] = None
+        self._cleanup_cols = ([], [])
+        self._cleaned = [0, 0]
+        self.rows_written = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(abort=exc_type is not None)
+
+    def open(self) -> None:
+        """打开读写两端, 写出表头区并建 HeaderIndex。"""
+        self.out_path = _resolve_output_path(self.input_path, self._output_path, suffix=self._suffix)
+        self._tmp_path = _temp_output_path(self.out_path)
+        try:
+            self._reader = SheetReader(self.input_path)
+            sheet_name = _find_template_sheet_name(self._reader.sheet_names)
+            self._writer = TemplatePackageWriter(self.input_path, self._tmp_path, sheet_name,
+                                                 collect_row_attrs=False,
+                                                 compression=self._compression)
+            self._writer.open()
+            self._read_header_area(sheet_name)
+        except (UnsupportedSheet, PassthroughUnsupported, zipfile.BadZipFile) as e:
+            self.close(abort=True)
+            raise StreamUnsupported(str(e)) from e
+        except BaseException:
+            self.close(abort=True)
+            raise
+
+        self.headers = HeaderIndex.from_sheet(self.sheet)
+        self.parentage_col = self.headers.find("Parentage Level") or 4
+        self._cleanup_cols = upload_cleanup_columns(self.headers)
+        logger.debug("TemplateStream: %s → %s, 表头 %d 列",
+                     self.input_path.name, self.out_path.name, len(self.headers.headers))
+
+    def _read_header_area(self, sheet_name: str) -> None:
+        """第 1-7 行读入 self.sheet 并原样写出。"""
+        self._sheet_name = sheet_name
+        self.sheet = TemplateSheet(title=sheet_name)
+        for src in self._source_rows(sheet_name, max_row=DATA_START_ROW - 1):
+            self.sheet.load_row(src[0], src[1])
+            self._write(*src)
+
+    def decode_only(self, columns) -> None:
+        """之后读入的数据行只解码这些列 (另加 Parentage Level 和上传清理列)。
+
+        须在 groups() / source_groups() 之前调用; 其余列的单元格以 RawCell 原样写出,
+        调用方不应读写这些列。
+        """
+        self._decode_columns = frozenset(columns).union(
+            [self.parentage_col], *self._cleanup_cols)
+
+    def close(self, abort: bool = False) -> None:
+        """结束输出并把临时文件替换到 out_path; abort=True 时删除写了一半的临时文件。"""
+        try:
+            if self._writer is not None:
+                self._writer.close(abort=abort)
+                self._writer = None
+        except BaseException:
+            abort = True
+            raise
+        finally:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            if self._tmp_path is not None:
+                if abort:
+                    self._tmp_path.unlink(missing_ok=True)
+                else:
+                    self.out_path = _commit_output(self._tmp_path, self.out_path)
+                self._tmp_path = None
+        if not abort and any(self._cleaned):
+            logger.info("cleanup_for_upload: 清空 Package Contains %d 格, Parent 包装尺寸 %d 格",
+                        *self._cleaned)
+
+    def _source_rows(self, sheet_name: str, max_row: Optional[int] = None):
+        try:
+            for row, values, styles, attrib in self._reader.iter_rows(sheet_name, max_row, styles=True):
+                yield row, values, styles, format_row_attrs(attrib, self._writer.ns_prefixes)
+        except (UnsupportedSheet, PassthroughUnsupported) as e:
+            raise StreamUnsupported(str(e)) from e
+
+    def _data_rows(self):
+        if self._decode_columns is not None:
+            rows = self._reader.iter_raw_rows(self._sheet_name, self._decode_columns,
+                                              min_row=DATA_START_ROW)
+            try:
+                yield from rows
+            except UnsupportedSheet as e:
+                raise StreamUnsupported(str(e)) from e
+            return
+        for src in self._source_rows(self._sheet_name):
+            if src[0] >= DATA_START_ROW:
+                yield src
+
+    def groups(self, group_size: Optional[int] = GROUP_SIZE) -> Iterator[range]:
+        """单文件模式: 逐组把源行按原行号读入 self.sheet, 产出规则组供调用方原地处理。
+
+        调用方处理完 (下一次迭代) 时该组写出; 不规则组和组以外的行原样写出。
+        """
+        for is_group, rows in self._segments():
+            for row, values, styles, attrs in rows:
+                self.sheet.load_row(row, values)
+                self._formats[row] = (styles, attrs)
+            if is_group and self._is_regular(rows, group_size):
+                yield range(rows[0][0], rows[-1][0] + 1)
+            self.write_rows([src[0] for src in rows])
+
+    def source_groups(self, group_size: Optional[int] = GROUP_SIZE) -> Iterator[tuple[range, bool]]:
+        """合并模式: 逐组把源行读入 self.source (每组一个新缓冲), 产出 (组, 是否规则)。
+
+        源行本身不写出; 组以外的行丢弃。
+        """
+        for is_group, rows in self._segments():
+            if not is_group:
+                continue
+            if self._parent_format is None:
+                self._parent_format = _full_format(rows[0])
+                self._child_format = _full_format(rows[1] if len(rows) > 1 else rows[0])
+            self.source = TemplateSheet(title=self.sheet.title)
+            for row, values, _, _ in rows:
+                self.source.load_row(row, values)
+            yield range(rows[0][0], rows[-1][0] + 1), self._is_regular(rows, group_size)
+        self.source = None
+
+    def write_rows(self, rows) -> None:
+        """清理上传字段后按行号升序写出 self.sheet 中的这些行, 写完从缓冲移除。"""
+        parentage: dict[int, str] = {}
+        for row in rows:
+            v = self.sheet.value(row, self.parentage_col)
+            if v is not None and str(v).strip():
+                parentage[row] = str(v).strip()
+        if parentage and any(self._cleanup_cols):
+            extent = DataExtent(
+                first_row=rows[0], last_row=rows[-1], scan_end=rows[-1], parentage=parentage,
+                parent_rows=[r for r, v in parentage.items() if v.lower() == "parent"],
+            )
+            both, parent = clear_upload_fields(self.sheet, extent, *self._cleanup_cols)
+            self._cleaned[0] += both
+            self._cleaned[1] += parent
+
+        for row in rows:
+            values = self.sheet.pop_row(row)
+            fmt = self._formats.pop(row, None)
+            if fmt is None:
+                is_parent = parentage.get(row, "").lower() == "parent"
+                fmt = (self._parent_format if is_parent else self._child_format) or ((), b"")
+            self._write(row, values, *fmt)
+
+    def _write(self, row: int, values, styles, attrs: bytes) -> None:
+        cells = []
+        raw_end = 0  # 上一个直通片段覆盖到的列: 其中的单元格已在片段里, 不再按格式行补样式
+        for col in range(1, max(len(values), len(styles)) + 1):
+            value = values[col - 1] if col <= len(values) else None
+            style_id = styles[col - 1] if col <= len(styles) else 0
+            if type(value) is RawCell:
+                raw_end = value.last_column()
+            elif (value is None or value == "") and (not style_id or col <= raw_end):
+                continue
+            cells.append((col, value, style_id, None))
+        try:
+            self._writer.write_row(row, cells, attrs)
+        except PassthroughUnsupported as e:
+            raise StreamUnsupported(str(e)) from e
+        self.rows_written += 1
+
+
+def _full_format(src) -> tuple[tuple, bytes]:
+    """源行 → (逐列样式下标, 行属性): 解码列取读取时记下的下标, 直通片段 (RawCell) 中的列取其 s 属性。
+
+    合并输出行 (尤其是木/金行, 值全部解码) 按此给每一列套模板格式, 日期等数字格式不丢。
+    """
+    _, values, styles, attrs = src
+    ids = dict(enumerate(styles, 1))
+    for value in values:
+        if type(value) is RawCell:
+            ids.update(value.style_ids())
+    width = max((col for col, style_id in ids.items() if style_id), default=0)
+    return tuple(ids.get(col, 0) for col in range(1, width + 1)), attrs
+
+
+class GroupReader(_GroupedRows):
+    """只读逐组读取 (合并模式的木/金文件): 按文件顺序产出数据组, 内存中只有当前组。
+
+    用法:
+        with GroupReader(path) as reader:
+            for rows, regular, sheet in reader.groups(VARIANT_GROUP_SIZE):
+                ...
+    平面文件或读取器不支持的内容抛 StreamUnsupported (调用方改为整表加载)。
+    keep_rows=True 时读过的每一行 (含表头区和组以外的行) 另存入 self.kept, 读到文件末尾后
+    complete 为 True, 调用方可把 kept 写入解析缓存 (内容与 load_template_sheet 一致)。
+    """
+
+    def __init__(self, input_path: str | Path, keep_rows: bool = False):
+        self.input_path = Path(input_path)
+        _check_suffix(self.input_path)
+        if is_tsv_path(self.input_path):
+            raise StreamUnsupported("平面文件")
+        self.headers: Optional[HeaderIndex] = None
+        self.kept: Optional[TemplateSheet] = None
+        self.complete = False
+        self._keep_rows = keep_rows
+        self._reader = None
+        self._sheet_name = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self) -> None:
+        """读第 1-7 行建 HeaderIndex。"""
+        try:
+            self._reader = SheetReader(self.input_path)
+            self._sheet_name = _find_template_sheet_name(self._reader.sheet_names)
+            header = TemplateSheet(title=self._sheet_name)
+            if self._keep_rows:
+                self.kept = TemplateSheet(title=self._sheet_name)
+            for row, values in self._reader.iter_rows(self._sheet_name, max_row=DATA_START_ROW - 1):
+                header.load_row(row, values)
+                if self.kept is not None:
+                    self.kept.load_row(row, values)
+        except (UnsupportedSheet, zipfile.BadZipFile) as e:
+            self.close()
+            raise StreamUnsupported(str(e)) from e
+        except BaseException:
+            self.close()
+            raise
+        self.headers = HeaderIndex.from_sheet(header)
+        self.parentage_col = self.headers.find("Parentage Level") or 4
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _data_rows(self):
+        try:
+            for src in self._reader.iter_rows(self._sheet_name):
+                if src[0] >= DATA_START_ROW:
+                    yield src
+        except UnsupportedSheet as e:
+            raise StreamUnsupported(str(e)) from e
+
+    def groups(self, group_size: Optional[int] = GROUP_SIZE) -> Iterator[tuple[range, bool, TemplateSheet]]:
+        """逐组产出 (组, 是否规则, 只含该组行的 TemplateSheet); 组以外的行跳过。"""
+        for is_group, rows in self._segments():
+            if self.kept is not None:
+                for row, values in rows:
+                    self.kept.load_row(row, values)
+            if not is_group:
+                continue
+            sheet = TemplateSheet(title=self._sheet_name)
+            for row, values in rows:
+                sheet.load_row(row, values)
+            yield range(rows[0][0], rows[-1][0] + 1), self._is_regular(rows, group_size), sheet
+        self.complete = True
@@ -0,0 +1,100 @@
+"""制表符分隔平面文件 (.txt) 读写
+
+亚马逊也接受 Tab 分隔的库存平面文件, 布局与 xlsx 模板相同: 文件第 N 行 = 模板第 N 行
+(第 4 行表头, 第 8 行起数据)。读入为 TemplateSheet, 后续 normalize / fill / merge
+流程不变; 没有 zip / XML 的解析与序列化开销。
+
+平面文件没有公式: 保存时把流水线写入的单元格引用公式 (如 Parent SKU 列的 =A8)
+解析成被引用单元格的值; 其他公式原样写出并记警告。
+"""
+
+import csv
+import datetime
+import logging
+import re
+from pathlib import Path
+from typing import Optional
+
+from .template_sheet import InternPool, TemplateSheet, cell_value
+from .xlsx_package import _number_text
+
+logger = logging.getLogger(__name__)
+
+TSV_SUFFIXES = (".txt", ".tsv")
+TSV_ENCODING = "utf-8"
+
+_CELL_REF_RE = re.compile(r"^=\$?([A-Za-z]{1,3})\$?(\d+)$")
+_MAX_REF_DEPTH = 64  # 引用链上限 (Parent SKU 公式逐行链式引用, 一组最多 21 行)
+
+
+def is_tsv_path(path: str | Path) -> bool:
+    return Path(path).suffix.lower() in TSV_SUFFIXES
+
+
+def load_tsv(filepath: str | Path, max_row: Optional[int] = None, title: str = "Template",
+             pool: Optional[InternPool] = None) -> TemplateSheet:
+    """读取 Tab 分隔平面文件为 TemplateSheet (单元格值均为字符串, 空串记为 None)。
+
+    重复的字段文本经 pool 驻留 (未传时用本次读取专用的池)。
+    """
+    filepath = Path(filepath)
+    sheet = TemplateSheet(title=title)
+    intern = (pool if pool is not None else InternPool()).intern
+    # utf-8-sig: 兼容 Excel 另存为 "Unicode 文本" 以外带 BOM 的 UTF-8 文件
+    with open(filepath, encoding=TSV_ENCODING + "-sig", newline="") as f:
+        for row_idx, fields in enumerate(csv.reader(f, delimiter="\t"), start=1):
+            if max_row is not None and row_idx > max_row:
+                break
+            sheet.load_row(row_idx, [intern(v) if v != "" else None for v in fields])
+    logger.debug("load_tsv: %s, max_row=%d, max_column=%d",
+                 filepath.name, sheet.max_row, sheet.max_column)
+    return sheet
+
+
+def _column_index(letters: str) -> int:
+    col = 0
+    for ch in letters.upper():
+        col = col * 26 + ord(ch) - 64
+    return col
+
+
+def _resolve_value(ws, value, depth=0):
+    """单元格引用公式 → 被引用单元格的值 (递归解析链式引用)。"""
+    if not (isinstance(value, str) and value.startswith("=")):
+        return value
+    match = _CELL_REF_RE.match(value)
+    if match is None or depth >= _MAX_REF_DEPTH:
+        logger.warning("平面文件不支持公式, 原样写出: %s", value)
+        return value
+    target = cell_value(ws, int(match.group(2)), _column_index(match.group(1)))
+    return _resolve_value(ws, target, depth + 1)
+
+
+def _field_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return _number_text(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def save_tsv(ws, out: str | Path) -> Path:
+    """把 sheet (TemplateSheet 或 openpyxl Worksheet) 写成 Tab 分隔平面文件。
+
+    每行补齐到 max_column 列, 公式按 _resolve_value 解析为值。
+    """
+    out = Path(out)
+    max_col = ws.max_column
+    with open(out, "w", encoding=TSV_ENCODING, newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\r\n")
+        for row in range(1, ws.max_row + 1):
+            writer.writerow([
+                _field_text(_resolve_value(ws, cell_value(ws, row, c)))
+                for c in range(1, max_col + 1)
+            ])
+    logger.debug("save_tsv: %s, %d 行 × %d 列", out.name, ws.max_row, max_col)
+    return out
@@ -0,0 +1,750 @@
+"""xlsx/xlsm 包级直通保存
+
+流水线只修改 Template sheet 的单元格, 因此保存时:
+  - 源文件 zip 中其余所有 part (styles / VBA / 其他 sheet / defined names / 数据验证扩展等)
+    内容逐字节原样复制, openpyxl 不认识的特性也不会丢;
+  - 只重新生成 Template worksheet XML 的 <sheetData>, 其前后的 sheetViews / cols /
+    mergeCells / dataValidations / extLst 等片段原样保留;
+  - 公式已被改写, 因此丢弃 calcChain (Excel 打开时自动重建);
+  - Template sheet XML 是包中最大的 part, deflate 时切块在线程池中并行压缩 (ParallelDeflater);
+  - 重复出现的字符串写为共享字符串引用: 源 sharedStrings.xml 的条目原样保留 (下标不变),
+    新字符串去重后追加在后 (SharedStringTable); 源包没有共享字符串表时新建。
+
+单元格样式沿用源文件 cellXfs 中的下标, 不改 styles.xml; 遇到无法直通的情况
+(样式表中没有的新样式、数组公式等) 抛 PassthroughUnsupported, 由调用方回退 openpyxl 保存。
+"""
+
+import datetime
+import io
+import logging
+import os
+import posixpath
+import re
+import tempfile
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.compat.numbers import NUMERIC_TYPES
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+logger = logging.getLogger(__name__)
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+REL_OFFICE_DOCUMENT = NS_DOC_REL + "/officeDocument"
+REL_SHARED_STRINGS = NS_DOC_REL + "/sharedStrings"
+CT_SHARED_STRINGS = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+
+_SHEET_DATA_OPEN_RE = re.compile(rb"<sheetData\s*/>|<sheetData\b[^>]*>")
+_DIMENSION_RE = re.compile(rb"<dimension\b[^>]*/>")
+_ROW_TAG_RE = re.compile(rb"<row\b([^>]*?)/?>")
+_ROW_NUM_RE = re.compile(rb'\sr="(\d+)"')
+_ROW_SPANS_RE = re.compile(rb'\sspans="[^"]*"')
+_ROW_XML_RE = re.compile(rb"<row\b([^>]*?)(?:/>|>(.*?)</row>)", re.DOTALL)
+_CELL_ROW_REF_RE = re.compile(rb'(<c\b[^>]*?\sr="[A-Z]+)\d+"')
+_CELL_TAG_RE = re.compile(rb'<c\b[^>]*?\sr="([A-Z]+)\d+"([^>]*?)/?>')
+_STYLE_ATTR_RE = re.compile(rb'\ss="(\d+)"')
+_CELL_XFS_RE = re.compile(rb"<cellXfs\b[^>]*>(.*?)</cellXfs>", re.DOTALL)
+_XF_RE = re.compile(rb"<xf\b")
+_CALC_CHAIN_REL_RE = re.compile(rb"<Relationship\b[^>]*calcChain[^>]*/>")
+_CALC_CHAIN_CT_RE = re.compile(rb"<Override\b[^>]*calcChain[^>]*/>")
+_XMLNS_RE = re.compile(rb'\sxmlns:(\w+)="([^"]*)"')
+_SST_OPEN_RE = re.compile(rb"<sst\b[^>]*?(/?)>")
+_SST_ITEM_RE = re.compile(rb"<si[\s/>]")
+_SST_COUNT_ATTR_RE = re.compile(rb'\s(?:count|uniqueCount)="[^"]*"')
+_ATTR_ENTITIES = {'"': "&quot;"}
+
+_SCAN_CHUNK = 1 << 20
+
+# 输出压缩档位: 名称 → (zip 压缩方式, zlib 级别)。最终上传文件默认 max;
+# 批量 / 监控目录场景输出体积无所谓、保存延迟要紧, 用 fast 或 stored。
+COMPRESSION_LEVELS = {
+    "stored": (zipfile.ZIP_STORED, None),
+    "fast": (zipfile.ZIP_DEFLATED, 1),
+    "max": (zipfile.ZIP_DEFLATED, 9),
+}
+DEFAULT_COMPRESSION = "max"
+
+# 新增共享字符串条目先写内存, 超过此大小转存临时文件
+_SST_SPOOL_MEMORY = 4 << 20
+# 只出现过一次的字符串候选数上限 (超过后清空重新累计)
+_SST_MAX_CANDIDATES = 1 << 16
+
+# sheet XML 并行压缩: 按块切分, 每块在线程池中独立 deflate (zlib 压缩时释放 GIL)
+_DEFLATE_BLOCK = 1 << 19
+_DEFLATE_WINDOW = 1 << 15
+
+_DATE_TYPES = (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)
+
+# zipfile 没有逐条目压缩级别 / 替换压缩对象的公开接口, 只在下列属性存在时使用:
+# ZipInfo 的级别 (3.13 起为公开的 compress_level, 之前为 _compresslevel)、写句柄的 zlib 压缩对象。
+# 都不存在时 (其他 Python 版本 / 打包的解释器) 退回 zipfile 自身的压缩: ZipFile 级别的
+# compresslevel, 单线程, 条目时间为写出时间。
+_ZIPINFO_LEVEL_ATTRS = ("compress_level", "_compresslevel")
+_WRITER_COMPRESSOR_ATTR = "_compressor"
+_ZLIB_COMPRESSOR_TYPE = type(zlib.compressobj())
+
+
+class PassthroughUnsupported(Exception):
+    """源文件或单元格内容无法直通保存 (调用方应回退 openpyxl 全量保存)。"""
+
+
+def zip_compression(name: str) -> tuple[int, int | None]:
+    """压缩档位名 → (zip 压缩方式, zlib 级别); 未知档位抛 ValueError。"""
+    try:
+        return COMPRESSION_LEVELS[name]
+    except KeyError:
+        raise ValueError(f"未知压缩档位: {name} (可选: {', '.join(COMPRESSION_LEVELS)})") from None
+
+
+class ParallelDeflater:
+    """按 zlib 压缩对象接口 (compress / flush) 并行产出一条 raw deflate 流。
+
+    输入按 _DEFLATE_BLOCK 切块, 每块在线程池中独立压缩, 以上一块末尾 32 KB 作预置字典
+    (跨块的回溯引用仍落在解压窗口内, 压缩率与单线程基本一致); 非末块以 Z_SYNC_FLUSH
+    结束 (字节对齐、无结束标记), 末块以 Z_FINISH 结束, 按序拼接即是合法的单条流。
+    同时在途的块数有上限, 内存不随 sheet 大小增长。
+    """
+
+    def __init__(self, level: int | None, workers: int, block_size: int | None = None):
+        self._level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+        self._workers = workers
+        self._block_size = block_size or _DEFLATE_BLOCK
+        self._buffer = bytearray()
+        self._window = b""
+        self._pending: deque[Future] = deque()
+        self._executor = None
+
+    def _deflate(self, block: bytes, zdict: bytes, final: bool) -> bytes:
+        if zdict:
+            c = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+        else:
+            c = zlib.compressobj(self._level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        return c.compress(block) + c.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    def _submit(self, block: bytes, final: bool) -> None:
+        zdict, self._window = self._window, block[-_DEFLATE_WINDOW:]
+        if final and not self._pending:
+            # 整条流只有一块 (小 sheet): 直接压缩, 不起线程池
+            future = Future()
+            future.set_result(self._deflate(block, zdict, final))
+        else:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                                    thread_name_prefix="deflate")
+            future = self._executor.submit(self._deflate, block, zdict, final)
+        self._pending.append(future)
+
+    def compress(self, data) -> bytes:
+        self._buffer += data
+        size = self._block_size
+        if len(self._buffer) >= size:
+            whole = len(self._buffer) // size * size
+            view = memoryview(self._buffer)
+            for start in range(0, whole, size):
+                self._submit(bytes(view[start:start + size]), final=False)
+            view.release()
+            del self._buffer[:whole]
+        out = []
+        while self._pending and (self._pending[0].done() or len(self._pending) > 2 * self._workers):
+            out.append(self._pending.popleft().result())
+        return b"".join(out)
+
+    def flush(self) -> bytes:
+        try:
+            self._submit(bytes(self._buffer), final=True)
+            self._buffer.clear()
+            return b"".join(f.result() for f in self._pending)
+        finally:
+            self._pending.clear()
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+class SharedStringTable:
+    """输出包的共享字符串表。
+
+    源 sharedStrings.xml 的条目原样保留在前 (下标不变, 直通的 RawCell 仍然有效),
+    写出过程中重复出现的字符串 (Child / COLOR/SIZE / 尺寸名 / 单位 ...) 依次追加:
+    第一次出现照旧写 inlineStr, 第二次出现起登记为共享字符串并写下标引用。
+    SKU 这类每行不同的值不进表 (进表反而更大)。内存中只有 {文本: 下标} 和
+    有上限的候选集合; 新条目的 <si> 随写随落到 SpooledTemporaryFile,
+    close 时与源条目拼成新的 part。
+    """
+
+    def __init__(self, base_count: int = 0, max_candidates: int = _SST_MAX_CANDIDATES):
+        self.base_count = base_count
+        self.references = 0
+        self._index: dict[str, int] = {}
+        self._candidates: set[str] = set()
+        self._max_candidates = max_candidates
+        self._spool = tempfile.SpooledTemporaryFile(max_size=_SST_SPOOL_MEMORY)
+
+    def __len__(self) -> int:
+        return self.base_count + len(self._index)
+
+    def index(self, text: str) -> int | None:
+        """字符串 → 共享字符串下标; 首次出现返回 None (调用方写 inlineStr)。"""
+        idx = self._index.get(text)
+        if idx is None:
+            if text not in self._candidates:
+                if len(self._candidates) >= self._max_candidates:
+                    self._candidates.clear()  # 候选只看最近一段, 内存有上限
+                self._candidates.add(text)
+                return None
+            self._candidates.discard(text)
+            idx = self._index[text] = self.base_count + len(self._index)
+            space = ' xml:space="preserve"' if text != text.strip() or "\n" in text else ""
+            self._spool.write(f"<si><t{space}>{escape(text)}</t></si>".encode("utf-8"))
+        self.references += 1
+        return idx
+
+    def write_part(self, out, source=None) -> None:
+        """源 sharedStrings.xml (可读流; None 表示新建) 的条目 + 新条目 → 写到 out。"""
+        if source is None:
+            source = io.BytesIO(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                                b'<sst xmlns="' + NS_MAIN.encode() + b'"/>')
+        head = source.read(_SCAN_CHUNK)
+        match = _SST_OPEN_RE.search(head)
+        tag = _SST_COUNT_ATTR_RE.sub(b"", match.group(0)).rstrip(b"/>")
+        out.write(head[:match.start()])
+        out.write(tag + b' uniqueCount="%d">' % len(self))
+        if not match.group(1):
+            # 源条目原样复制, 去掉末尾的 </sst>
+            pending = head[match.end():]
+            while True:
+                chunk = source.read(_SCAN_CHUNK)
+                if not chunk:
+                    break
+                pending += chunk
+                out.write(pending[:-16])
+                pending = pending[-16:]
+            out.write(pending[:pending.rfind(b"</sst>")])
+        self._spool.seek(0)
+        while True:
+            chunk = self._spool.read(_SCAN_CHUNK)
+            if not chunk:
+                break
+            out.write(chunk)
+        out.write(b"</sst>")
+
+    def close(self) -> None:
+        self._spool.close()
+
+
+def _count_sst_items(stream) -> int | None:
+    """分块数源 sharedStrings.xml 中的 <si> 条目数; 找不到 <sst> (如命名空间前缀) 返回 None。"""
+    head = stream.read(_SCAN_CHUNK)
+    match = _SST_OPEN_RE.search(head)
+    if match is None:
+        return None
+    count, buf = 0, head[match.end():]
+    while True:
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            return count + len(_SST_ITEM_RE.findall(buf))
+        buf += chunk
+        # 最后 3 字节可能是跨块的 "<si" 开头, 留到下一块
+        cut = len(buf) - 3
+        count += sum(1 for m in _SST_ITEM_RE.finditer(buf) if m.start() < cut)
+        buf = buf[cut:]
+
+
+def _read_rels(zf: zipfile.ZipFile, rels_path: str) -> dict[str, tuple[str, str]]:
+    """读取 .rels, 返回 {Id: (Type, Target)}。"""
+    root = ElementTree.fromstring(zf.read(rels_path))
+    return {
+        rel.get("Id"): (rel.get("Type"), rel.get("Target"))
+        for rel in root.iter(f"{{{NS_PKG_REL}}}Relationship")
+    }
+
+
+def _resolve_target(base_part: str, target: str) -> str:
+    """把 .rels 中的 Target 解析为 zip 内路径 (支持绝对/相对两种写法)。"""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def _rels_path_for(part: str) -> str:
+    return posixpath.join(posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels")
+
+
+def find_sheet_part(zf: zipfile.ZipFile, sheet_name: str) -> tuple[str, str]:
+    """按 sheet 名定位 worksheet part, 返回 (workbook part 路径, sheet part 路径)。"""
+    workbook_part = None
+    for rel_type, target in _read_rels(zf, "_rels/.rels").values():
+        if rel_type == REL_OFFICE_DOCUMENT:
+            workbook_part = _resolve_target("", target)
+            break
+    if workbook_part is None:
+        raise PassthroughUnsupported("包中找不到 workbook part")
+
+    root = ElementTree.fromstring(zf.read(workbook_part))
+    rel_id = None
+    for sheet in root.iter(f"{{{NS_MAIN}}}sheet"):
+        if sheet.get("name") == sheet_name:
+            rel_id = sheet.get(f"{{{NS_DOC_REL}}}id")
+            break
+    if rel_id is None:
+        raise PassthroughUnsupported(f"workbook 中找不到 sheet '{sheet_name}'")
+
+    rels = _read_rels(zf, _rels_path_for(workbook_part))
+    if rel_id not in rels:
+        raise PassthroughUnsupported(f"sheet '{sheet_name}' 的关系 {rel_id} 不存在")
+    return workbook_part, _resolve_target(workbook_part, rels[rel_id][1])
+
+
+def count_cell_xfs(zf: zipfile.ZipFile, workbook_part: str) -> int:
+    """源文件 styles.xml 中 cellXfs 的条目数 (合法的单元格样式下标上限)。"""
+    for rel_type, target in _read_rels(zf, _rels_path_for(workbook_part)).values():
+        if rel_type.endswith("/styles"):
+            match = _CELL_XFS_RE.search(zf.read(_resolve_target(workbook_part, target)))
+            return len(_XF_RE.findall(match.group(1))) if match else 0
+    return 0
+
+
+class RawCell:
+    """原样直通的单元格: 源 worksheet XML 中一段相邻的 <c> 片段 (含样式下标 / 共享字符串下标)。
+
+    流水线不读写的列不解码, 片段随行缓冲到写出; 写到别的行号时只改各单元格 r 属性中的行号。
+    """
+
+    __slots__ = ("xml", "row")
+
+    def __init__(self, xml: bytes, row: int):
+        self.xml = xml
+        self.row = row
+
+    def __repr__(self):
+        return f"RawCell({self.xml!r})"
+
+    def style_ids(self) -> dict[int, int]:
+        """片段中各单元格的 {列号: 样式下标} (没有 s 属性的单元格不列出)。"""
+        ids = {}
+        for letters, attrs in _CELL_TAG_RE.findall(self.xml):
+            s = _STYLE_ATTR_RE.search(attrs)
+            if s and s.group(1) != b"0":
+                ids[column_index_from_string(letters.decode())] = int(s.group(1))
+        return ids
+
+    def last_column(self) -> int:
+        """片段中最后一个单元格的列号。"""
+        return column_index_from_string(_CELL_TAG_RE.search(self.xml, self.xml.rfind(b"<c ")).group(1).decode())
+
+
+def _row_number_and_attrs(attrs: bytes) -> tuple[int, bytes]:
+    """<row> 标签属性文本 → (行号, 去掉 r / spans 后的属性文本)。"""
+    num = _ROW_NUM_RE.search(attrs)
+    if num is None:
+        raise PassthroughUnsupported("<row> 缺少 r 属性")
+    attrs = _ROW_SPANS_RE.sub(b"", _ROW_NUM_RE.sub(b"", attrs, count=1)).strip()
+    return int(num.group(1)), b" " + attrs if attrs else b""
+
+
+def _collect_row_attrs(body: bytes, row_attrs: dict[int, bytes]) -> None:
+    for row_match in _ROW_TAG_RE.finditer(body):
+        row, attrs = _row_number_and_attrs(row_match.group(1))
+        if attrs:
+            row_attrs[row] = attrs
+
+
+def scan_sheet_xml(stream, collect_row_attrs: bool = True) -> tuple[bytes, bytes, dict[int, bytes]]:
+    """分块扫描 worksheet XML, 拆成 (<sheetData> 之前, 之后, {行号: 行属性})。
+
+    <sheetData> 内容不整体读入内存, 只按块扫 <row> 标签; collect_row_attrs=False 时
+    连行属性也不收集 (调用方自己提供每行属性)。
+    行属性去掉 r / spans (由写入方重新生成), 其余 (ht / customHeight / hidden / s ...) 原样保留。
+    """
+    buf = b""
+    while True:
+        match = _SHEET_DATA_OPEN_RE.search(buf)
+        if match is not None:
+            break
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            raise PassthroughUnsupported("worksheet 中找不到 <sheetData> (可能使用了命名空间前缀)")
+        buf += chunk
+    head = _DIMENSION_RE.sub(b"", buf[:match.start()], count=1)
+    rest = buf[match.end():]
+    row_attrs: dict[int, bytes] = {}
+    if match.group(0).endswith(b"/>"):
+        return head, rest + stream.read(), row_attrs
+
+    while True:
+        end = rest.find(b"</sheetData>")
+        if end >= 0:
+            if collect_row_attrs:
+                _collect_row_attrs(rest[:end], row_attrs)
+            return head, rest[end + len(b"</sheetData>"):] + stream.read(), row_attrs
+        # 在最后一个 "<" 处切开: 之前的 <row> 标签都是完整的, 跨块的结束标签留到下一块
+        cut = rest.rfind(b"<")
+        if cut > 0:
+            if collect_row_attrs:
+                _collect_row_attrs(rest[:cut], row_attrs)
+            rest = rest[cut:]
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            raise PassthroughUnsupported("worksheet 的 <sheetData> 没有结束标签")
+        rest += chunk
+
+
+def iter_row_xml(stream) -> Iterator[tuple[int, bytes, bytes]]:
+    """分块扫描 worksheet XML, 逐行产出 (行号, 行属性, <row> 内的原始 XML)。
+
+    行属性同 scan_sheet_xml (去掉 r / spans); 同一时刻只有一块 (_SCAN_CHUNK) 在内存中。
+    """
+    buf = b""
+    while True:
+        match = _SHEET_DATA_OPEN_RE.search(buf)
+        if match is not None:
+            break
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            raise PassthroughUnsupported("worksheet 中找不到 <sheetData> (可能使用了命名空间前缀)")
+        buf += chunk
+    if match.group(0).endswith(b"/>"):
+        return
+    rest = buf[match.end():]
+    while True:
+        end = rest.find(b"</sheetData>")
+        body = rest if end < 0 else rest[:end]
+        consumed = 0
+        for row_match in _ROW_XML_RE.finditer(body):
+            row, attrs = _row_number_and_attrs(row_match.group(1))
+            yield row, attrs, row_match.group(2) or b""
+            consumed = row_match.end()
+        if end >= 0:
+            return
+        rest = rest[consumed:]
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            raise PassthroughUnsupported("worksheet 的 <sheetData> 没有结束标签")
+        rest += chunk
+
+
+def iter_sheet_data_blocks(stream) -> Iterator[bytes]:
+    """分块扫描 worksheet XML, 产出 <sheetData> 内容的连续片段, 每段都在 </row> 之后切开。
+
+    同一行的单元格总在同一段内; 调用方可对整段做正则扫描, 不必逐行切分 (见 iter_row_xml)。
+    """
+    buf = b""
+    while True:
+        match = _SHEET_DATA_OPEN_RE.search(buf)
+        if match is not None:
+            break
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            raise PassthroughUnsupported("worksheet 中找不到 <sheetData> (可能使用了命名空间前缀)")
+        buf += chunk
+    if match.group(0).endswith(b"/>"):
+        return
+    rest = buf[match.end():]
+    while True:
+        end = rest.find(b"</sheetData>")
+        if end >= 0:
+            if end:
+                yield rest[:end]
+            return
+        cut = rest.rfind(b"</row>")
+        if cut >= 0:
+            cut += len(b"</row>")
+            yield rest[:cut]
+            rest = rest[cut:]
+        chunk = stream.read(_SCAN_CHUNK)
+        if not chunk:
+            raise PassthroughUnsupported("worksheet 的 <sheetData> 没有结束标签")
+        rest += chunk
+
+
+def namespace_prefixes(head: bytes) -> dict[str, str]:
+    """worksheet 根元素上声明的 {命名空间 URI: 前缀}。"""
+    return {uri.decode(): prefix.decode() for prefix, uri in _XMLNS_RE.findall(head)}
+
+
+def format_row_attrs(attrib: dict[str, str], prefixes: dict[str, str]) -> bytes:
+    """ElementTree 的行属性 dict → <row> 标签上的属性文本 (带命名空间的属性还原前缀)。"""
+    parts = []
+    for name, value in attrib.items():
+        if name.startswith("{"):
+            uri, local = name[1:].split("}", 1)
+            if uri not in prefixes:
+                raise PassthroughUnsupported(f"行属性 {name} 的命名空间未在 sheet 根元素声明")
+            name = f"{prefixes[uri]}:{local}"
+        parts.append(f' {name}="{escape(value, _ATTR_ENTITIES)}"')
+    return "".join(parts).encode("utf-8")
+
+
+def _infer_data_type(value) -> str:
+    """按值推断单元格类型 (与 openpyxl 赋值时的规则一致)。"""
+    if isinstance(value, bool):
+        return "b"
+    if isinstance(value, NUMERIC_TYPES) or isinstance(value, _DATE_TYPES):
+        return "n"
+    if isinstance(value, str):
+        if len(value) > 1 and value.startswith("="):
+            return "f"
+        if value in ERROR_CODES:
+            return "e"
+        return "s"
+    raise PassthroughUnsupported(f"不支持直通写出的单元格类型: {type(value).__name__}")
+
+
+def _number_text(value) -> str:
+    if isinstance(value, _DATE_TYPES):
+        value = to_excel(value)
+    if isinstance(value, int):
+        return str(value)
+    return "%.16g" % value
+
+
+def cell_xml(ref: str, value, style_id: int = 0, data_type: str | None = None) -> str:
+    """序列化单个 <c> 元素 (字符串写为 inlineStr; 共享字符串由 TemplatePackageWriter 处理)。
+
+    data_type 沿用 openpyxl 的取值; 只用于区分字符串 / 公式 / 错误值
+    (如以 "=" 开头的普通文本), 其余情况按值推断。
+    """
+    s_attr = f' s="{style_id}"' if style_id else ""
+    if value is None or value == "":
+        # 空字符串与 openpyxl 一致不写值 (读回为 None), 只留样式
+        return f'<c r="{ref}"{s_attr}/>'
+    if not style_id and isinstance(value, _DATE_TYPES):
+        # 没有数字格式的日期写出后读回是序列号, 不静默写错
+        raise PassthroughUnsupported(f"{ref}: 日期 / 时间值没有单元格样式 (数字格式)")
+    if not (data_type in ("s", "f", "e") and isinstance(value, str)):
+        data_type = _infer_data_type(value)
+    if data_type == "f":
+        return f'<c r="{ref}"{s_attr}><f>{escape(value[1:])}</f></c>'
+    if data_type == "b":
+        return f'<c r="{ref}"{s_attr} t="b"><v>{int(bool(value))}</v></c>'
+    if data_type == "e":
+        return f'<c r="{ref}"{s_attr} t="e"><v>{escape(str(value))}</v></c>'
+    if data_type == "n":
+        return f'<c r="{ref}"{s_attr}><v>{_number_text(value)}</v></c>'
+    text = str(value)
+    space = ' xml:space="preserve"' if text != text.strip() or "\n" in text else ""
+    return f'<c r="{ref}"{s_attr} t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+class TemplatePackageWriter:
+    """以源文件为底写出新包: 其余 part 原样复制, Template sheet 的行由调用方按行号升序写入。
+
+    用法:
+        with TemplatePackageWriter(src, out, "Template") as writer:
+            writer.write_row(4, [(1, "SKU", 0, None), ...])
+            ...
+    """
+
+    def __init__(self, source_path: str | Path, out_path: str | Path, sheet_name: str,
+                 collect_row_attrs: bool = True, compression: str = DEFAULT_COMPRESSION,
+                 workers: int | None = None, shared_strings: bool = True):
+        self._compress_type, self._compress_level = zip_compression(compression)
+        self._workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.source_path = Path(source_path)
+        self.out_path = Path(out_path)
+        self._zin = zipfile.ZipFile(self.source_path)
+        try:
+            self._workbook_part, self._sheet_part = find_sheet_part(self._zin, sheet_name)
+            self.style_count = count_cell_xfs(self._zin, self._workbook_part)
+            with self._zin.open(self._sheet_part) as f:
+                self._head, self._tail, self.row_attrs = scan_sheet_xml(f, collect_row_attrs)
+            self.ns_prefixes = namespace_prefixes(self._head)
+            self._sst_part = None
+            self._sst_rel_id = None  # 新建共享字符串表时的 workbook 关系 Id
+            self.shared_strings: SharedStringTable | None = None
+            if shared_strings:
+                self._init_shared_strings()
+        except (KeyError, ElementTree.ParseError) as e:
+            self._zin.close()
+            raise PassthroughUnsupported(f"无法解析源文件包结构: {e}") from e
+        except PassthroughUnsupported:
+            self._zin.close()
+            raise
+        self._zout = None
+        self._sheet_stream = None
+        self._last_row = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(abort=exc_type is not None)
+
+    def _init_shared_strings(self) -> None:
+        """启用共享字符串表: 沿用源包的 sharedStrings part; 源包没有时新建一个
+        (open 时补 [Content_Types].xml 的 Override 和 workbook 关系)。"""
+        rels = _read_rels(self._zin, _rels_path_for(self._workbook_part))
+        for rel_type, target in rels.values():
+            if rel_type.endswith("/sharedStrings"):
+                part = _resolve_target(self._workbook_part, target)
+                with self._zin.open(part) as f:
+                    count = _count_sst_items(f)
+                if count is not None:  # 解析不了的表 (命名空间前缀等) 不动, 字符串写 inlineStr
+                    self._sst_part = part
+                    self.shared_strings = SharedStringTable(count)
+                return
+        part = posixpath.join(posixpath.dirname(self._workbook_part), "sharedStrings.xml")
+        if part in self._zin.namelist():
+            return
+        self._sst_part = part
+        self._sst_rel_id = next(f"rIdSst{i or ''}" for i in range(len(rels) + 1) if f"rIdSst{i or ''}" not in rels)
+        self.shared_strings = SharedStringTable(0)
+
+    def open(self) -> None:
+        """复制源包中除 Template sheet (和共享字符串表) 外的所有 part, 然后开始写 sheet XML。"""
+        self._zout = zipfile.ZipFile(self.out_path, "w", self._compress_type, allowZip64=True,
+                                     compresslevel=self._compress_level)
+        names = self._zin.namelist()
+        drop_calc_chain = any(posixpath.basename(n) == "calcChain.xml" for n in names)
+        workbook_rels = _rels_path_for(self._workbook_part)
+        for info in self._zin.infolist():
+            if info.filename in (self._sheet_part, self._sst_part):
+                continue
+            if drop_calc_chain and posixpath.basename(info.filename) == "calcChain.xml":
+                continue
+            data = self._zin.read(info)
+            if drop_calc_chain and info.filename == "[Content_Types].xml":
+                data = _CALC_CHAIN_CT_RE.sub(b"", data)
+            elif drop_calc_chain and info.filename == workbook_rels:
+                data = _CALC_CHAIN_REL_RE.sub(b"", data)
+            if self._sst_rel_id and info.filename == "[Content_Types].xml":
+                override = f'<Override PartName="/{self._sst_part}" ContentType="{CT_SHARED_STRINGS}"/>'
+                data = data.replace(b"</Types>", override.encode() + b"</Types>")
+            elif self._sst_rel_id and info.filename == workbook_rels:
+                target = posixpath.relpath(self._sst_part, posixpath.dirname(self._workbook_part))
+                rel = f'<Relationship Id="{self._sst_rel_id}" Type="{REL_SHARED_STRINGS}" Target="{target}"/>'
+                data = data.replace(b"</Relationships>", rel.encode() + b"</Relationships>")
+            self._zout.writestr(self._copy_info(info), data)
+
+        self._sheet_stream = self._open_part(self._sheet_part)
+        self._sheet_stream.write(self._head)
+        self._sheet_stream.write(b"<sheetData>")
+
+    def _open_part(self, part: str):
+        """按源 part 的元数据 (新建的 part 用当前时间) 在输出包中打开一个写句柄 (大 part 并行压缩)。"""
+        if part in self._zin.NameToInfo:
+            info = self._copy_info(self._zin.getinfo(part))
+        else:
+            info = self._copy_info(zipfile.ZipInfo(part, datetime.datetime.now().timetuple()[:6]))
+        stream = self._zout.open(info, "w", force_zip64=True)
+        if (self._compress_type == zipfile.ZIP_DEFLATED and self._workers > 1
+                and isinstance(getattr(stream, _WRITER_COMPRESSOR_ATTR, None), _ZLIB_COMPRESSOR_TYPE)):
+            # 换掉写句柄的压缩对象: CRC / 大小 / 本地文件头仍由 zipfile 维护
+            setattr(stream, _WRITER_COMPRESSOR_ATTR, ParallelDeflater(self._compress_level, self._workers))
+        return stream
+
+    def _copy_info(self, info: zipfile.ZipInfo) -> zipfile.ZipInfo | str:
+        """输出条目: 沿用源 part 的时间和属性; 无法设置条目级压缩级别时只给名称 (用 ZipFile 的级别)。"""
+        new = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+        new.compress_type = self._compress_type
+        new.external_attr = info.external_attr
+        if self._compress_type == zipfile.ZIP_DEFLATED:
+            level_attr = next((a for a in _ZIPINFO_LEVEL_ATTRS if hasattr(new, a)), None)
+            if level_attr is None:
+                return info.filename
+            setattr(new, level_attr, self._compress_level)
+        return new
+
+    def write_row(self, row: int, cells, attrs: bytes | None = None) -> None:
+        """写一行。cells: [(列号, 值, 样式下标, data_type 或 None), ...] 按列号升序。
+
+        值为 RawCell 时原样写出其 XML 片段 (样式下标随片段, 忽略元组中的样式);
+        重复出现的字符串写为共享字符串引用 (见 SharedStringTable), 其余写 inlineStr。
+
+        attrs 为 None 时沿用源文件同行号的行属性 (行高 / 隐藏等)。
+        """
+        if row <= self._last_row:
+            raise ValueError(f"行号必须升序写入: {row} <= {self._last_row}")
+        self._last_row = row
+        if attrs is None:
+            attrs = self.row_attrs.get(row, b"")
+        parts = [f'<row r="{row}"'.encode(), attrs, b">"]
+        for column, value, style_id, data_type in cells:
+            if type(value) is RawCell:
+                if value.row == row:
+                    parts.append(value.xml)
+                else:
+                    parts.append(_CELL_ROW_REF_RE.sub(rb'\g<1>%d"' % row, value.xml))
+                continue
+            if style_id and style_id >= self.style_count:
+                raise PassthroughUnsupported(f"{get_column_letter(column)}{row}: 样式 {style_id} 不在源样式表中")
+            ref = f"{get_column_letter(column)}{row}"
+            if (self.shared_strings is not None and type(value) is str and value
+                    and (data_type == "s" or _infer_data_type(value) == "s")):
+                idx = self.shared_strings.index(value)
+                if idx is not None:
+                    s_attr = f' s="{style_id}"' if style_id else ""
+                    parts.append(f'<c r="{ref}"{s_attr} t="s"><v>{idx}</v></c>'.encode())
+                    continue
+            parts.append(cell_xml(ref, value, style_id, data_type).encode("utf-8"))
+        parts.append(b"</row>")
+        self._sheet_stream.write(b"".join(parts))
+
+    def close(self, abort: bool = False) -> None:
+        try:
+            if self._sheet_stream is not None:
+                if not abort:
+                    self._sheet_stream.write(b"</sheetData>")
+                    self._sheet_stream.write(self._tail)
+                self._sheet_stream.close()
+                self._sheet_stream = None
+                if not abort and self._sst_part is not None:
+                    with self._open_part(self._sst_part) as out:
+                        if self._sst_rel_id:
+                            self.shared_strings.write_part(out)
+                        else:
+                            with self._zin.open(self._sst_part) as src:
+                                self.shared_strings.write_part(out, src)
+            if self._zout is not None:
+                self._zout.close()
+                self._zout = None
+        finally:
+            if self.shared_strings is not None:
+                self.shared_strings.close()
+            self._zin.close()
+
+
+def save_worksheet_passthrough(ws, source_path: str | Path, out_path: str | Path, sheet_name: str,
+                               compression: str = DEFAULT_COMPRESSION, workers: int | None = None) -> None:
+    """把 openpyxl 加载并修改过的 Template worksheet 直通写出到 out_path。
+
+    单元格样式按 StyleArray 映射回源文件 cellXfs 下标; 源样式表中不存在的样式
+    (运行中新建的格式) 抛 PassthroughUnsupported。
+    """
+    # wb._cell_styles 按源文件 cellXfs 顺序构建, 列表位置即源下标
+    style_index: dict = {}
+    for idx, style in enumerate(ws.parent._cell_styles):
+        style_index.setdefault(style, idx)
+
+    rows: dict[int, list] = {}
+    for (row, column), cell in ws._cells.items():
+        rows.setdefault(row, []).append(cell)
+
+    with TemplatePackageWriter(source_path, out_path, sheet_name,
+                               compression=compression, workers=workers) as writer:
+        row_numbers = sorted(set(rows) | set(writer.row_attrs))
+        for row in row_numbers:
+            cells = []
+            for cell in sorted(rows.get(row, ()), key=lambda c: c.column):
+                style = cell._style
+                style_id = 0
+                if style is not None and any(style):
+                    if style not in style_index:
+                        raise PassthroughUnsupported(
+                            f"{cell.coordinate}: 样式不在源样式表中 (运行中新建的格式)")
+                    style_id = style_index[style]
+                if (cell._value is None or cell._value == "") and not style_id:
+                    continue
+                cells.append((cell.column, cell._value, style_id, cell.data_type))
+            writer.write_row(row, cells)
@@ -0,0 +1,447 @@
+"""Excel 读写模块测试 (只读加载 / 保存)"""
+
+import zipfile
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+from amazon_excel_processor.excel_io import (
+    DATA_START_ROW,
+    HEADER_ROW,
+    HeaderIndex,
+    group_rows,
+    load_template_sheet,
+    load_workbook,
+    locate_columns,
+    peek_template,
+    scan_data_extent,
+)
+
+
+def _save_template_file(path, paintings, group_size=11):
+    """构造带多个 sheet 的模板文件: Instructions + Template + Valid Values。"""
+    wb = Workbook()
+    wb.active.title = "Instructions"
+    wb.active["A1"] = "说明"
+    ws = wb.create_sheet("Template")
+    valid = wb.create_sheet("Valid Values")
+    for r in range(1, 200):
+        valid.cell(row=r, column=1).value = f"value-{r}"
+    for c, h in {1: "SKU", 4: "Parentage Level", 5: "Parent SKU", 7: "Item Name", 56: "Size"}.items():
+        ws.cell(row=HEADER_ROW, column=c).value = h
+    row = DATA_START_ROW
+    for title in paintings:
+        for i in range(group_size):
+            ws.cell(row=row, column=1).value = f"SKU-{row}"
+            ws.cell(row=row, column=4).value = "Parent" if i == 0 else "Child"
+            ws.cell(row=row, column=7).value = title if i == 0 else f"{title} Frame-style {i}"
+            row += 1
+    wb.save(str(path))
+
+
+class TestLoadTemplateSheet:
+    def test_same_columns_and_groups_as_full_load(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A", "Art B", "Art C"])
+        _, full_ws, _ = load_workbook(p)
+        sheet = load_template_sheet(p)
+        assert sheet.title == "Template"
+        assert locate_columns(sheet) == locate_columns(full_ws)
+        assert group_rows(sheet) == group_rows(full_ws)
+        assert sheet.cell(row=DATA_START_ROW, column=7).value == "Art A"
+
+    def test_reads_do_not_grow_sheet(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        sheet = load_template_sheet(p)
+        max_row, max_col = sheet.max_row, sheet.max_column
+        assert sheet.cell(row=max_row + 50, column=max_col + 50).value is None
+        assert (sheet.max_row, sheet.max_column) == (max_row, max_col)
+
+    def test_missing_template_sheet_raises(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Other"
+        wb.save(str(p))
+        with pytest.raises(ValueError, match="template"):
+            load_template_sheet(p)
+
+
+class TestPassthroughSave:
+    def test_untouched_parts_copied_and_template_updated(self, tmp_path):
+        from openpyxl import load_workbook as _lw
+        from amazon_excel_processor.excel_io import save_workbook
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        _, ws, name = load_workbook(p)
+        ws.cell(row=DATA_START_ROW, column=7).value = "Art & <B>"
+        ws.cell(row=DATA_START_ROW + 1, column=5).value = f"=A{DATA_START_ROW}"
+        out = save_workbook(ws, p, name)
+
+        with zipfile.ZipFile(p) as src, zipfile.ZipFile(out) as dst:
+            assert dst.read("xl/styles.xml") == src.read("xl/styles.xml")
+            assert dst.read("xl/workbook.xml") == src.read("xl/workbook.xml")
+        wb = _lw(str(out))
+        # 其余 sheet 保留 (不再被删除)
+        assert wb.sheetnames == ["Instructions", "Template", "Valid Values"]
+        assert wb["Valid Values"]["A199"].value == "value-199"
+        out_ws = wb["Template"]
+        assert out_ws.cell(row=DATA_START_ROW, column=7).value == "Art & <B>"
+        assert out_ws.cell(row=DATA_START_ROW + 1, column=5).value == f"=A{DATA_START_ROW}"
+        assert out_ws.cell(row=HEADER_ROW, column=7).value == "Item Name"
+
+    def test_new_style_falls_back_to_openpyxl(self, tmp_path):
+        from openpyxl import load_workbook as _lw
+        from openpyxl.styles import PatternFill
+        from amazon_excel_processor.excel_io import save_workbook
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        _, ws, name = load_workbook(p)
+        ws.cell(row=DATA_START_ROW, column=5).fill = PatternFill("solid", fgColor="FF632523")
+        out = save_workbook(ws, p, name)
+        out_ws = _lw(str(out))["Template"]
+        assert out_ws.cell(row=DATA_START_ROW, column=5).fill.fgColor.rgb == "FF632523"
+
+
+    def test_empty_string_reads_back_as_none(self, tmp_path):
+        from openpyxl import load_workbook as _lw
+        from openpyxl.styles import Font
+        from amazon_excel_processor.excel_io import save_workbook
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        wb = _lw(str(p))
+        wb["Template"].cell(row=DATA_START_ROW, column=55).font = Font(bold=True)
+        wb.save(str(p))
+        _, ws, name = load_workbook(p)
+        for col in (55, 56, 124):  # 重复的 "" 也不进共享字符串表
+            ws.cell(row=DATA_START_ROW, column=col).value = ""
+            ws.cell(row=DATA_START_ROW + 1, column=col).value = ""
+        out = save_workbook(ws, p, name)
+
+        out_ws = _lw(str(out))["Template"]
+        for col in (55, 56, 124):
+            assert out_ws.cell(row=DATA_START_ROW, column=col).value is None
+            assert out_ws.cell(row=DATA_START_ROW + 1, column=col).value is None
+        assert out_ws.cell(row=DATA_START_ROW, column=55).font.bold
+
+    def test_unstyled_date_is_unsupported(self):
+        import datetime
+        from amazon_excel_processor.xlsx_package import PassthroughUnsupported, cell_xml
+        with pytest.raises(PassthroughUnsupported):
+            cell_xml("AN19", datetime.datetime(2024, 1, 2))
+        assert cell_xml("AN19", datetime.datetime(2024, 1, 2), 3) == '<c r="AN19" s="3"><v>45293</v></c>'
+
+
+class TestSharedStrings:
+    def test_repeated_strings_become_shared_references(self):
+        from amazon_excel_processor.xlsx_package import SharedStringTable
+        table = SharedStringTable(base_count=3)
+        assert table.index("Child") is None          # 第一次: inlineStr
+        assert table.index("Child") == 3             # 第二次起: 追加在源条目之后
+        assert table.index("Child") == 3
+        assert table.index("SKU-1") is None
+        assert len(table) == 4
+
+    def test_table_created_then_extended_on_resave(self, tmp_path):
+        from openpyxl import load_workbook as _lw
+        from amazon_excel_processor.excel_io import save_workbook
+        from amazon_excel_processor.sheet_reader import SheetReader
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A", "Art B"])
+        _, ws, name = load_workbook(p)
+        first = save_workbook(ws, p, name, output_path=tmp_path / "first.xlsx")
+        with zipfile.ZipFile(first) as zf:
+            # 源文件没有共享字符串表: 新建 part 并登记关系 / 内容类型
+            assert "xl/sharedStrings.xml" in zf.namelist()
+            assert b"sharedStrings" in zf.read("xl/_rels/workbook.xml.rels")
+            assert b"/xl/sharedStrings.xml" in zf.read("[Content_Types].xml")
+            sheet = zf.read("xl/worksheets/sheet2.xml")
+            # Parentage Level 列 22 行只有 Parent/Child 两种值: 首次内联, 重复的 20 处转为引用
+            assert sheet.count(b't="s"') == 20
+            base = zf.read("xl/sharedStrings.xml")
+
+        # 以输出为源再保存: 原条目原样保留在前, 新字符串追加
+        _, ws2, _ = load_workbook(first)
+        for r in range(DATA_START_ROW, DATA_START_ROW + 22):
+            ws2.cell(row=r, column=10).value = "Centimeters"
+        second = save_workbook(ws2, first, name, output_path=tmp_path / "second.xlsx")
+        with zipfile.ZipFile(second) as zf:
+            sst = zf.read("xl/sharedStrings.xml")
+        assert base[base.index(b"<si>"):base.rindex(b"</sst>")] in sst
+        assert b"<t>Centimeters</t>" in sst
+
+        expected = list(_lw(str(p))["Template"].iter_rows(values_only=True))
+        assert list(_lw(str(first))["Template"].iter_rows(values_only=True)) == expected
+        with SheetReader(second) as reader:
+            rows = dict(reader.iter_rows("Template"))
+        assert rows[DATA_START_ROW + 1][6] == "Art A Frame-style 1"
+        assert rows[DATA_START_ROW + 21][9] == "Centimeters"
+
+
+class TestSaveCompression:
+    @pytest.mark.parametrize("compression, compress_type", [
+        ("stored", zipfile.ZIP_STORED),
+        ("fast", zipfile.ZIP_DEFLATED),
+        ("max", zipfile.ZIP_DEFLATED),
+    ])
+    def test_passthrough_and_openpyxl_use_level(self, tmp_path, compression, compress_type):
+        from openpyxl import load_workbook as _lw
+        from openpyxl.styles import PatternFill
+        from amazon_excel_processor.excel_io import save_workbook
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        _, ws, name = load_workbook(p)
+        out = save_workbook(ws, p, name, output_path=tmp_path / "pass.xlsx", compression=compression)
+        # 新样式 → openpyxl 全量保存路径
+        ws.cell(row=DATA_START_ROW, column=5).fill = PatternFill("solid", fgColor="FF632523")
+        full = save_workbook(ws, p, name, output_path=tmp_path / "full.xlsx", compression=compression)
+        for path in (out, full):
+            with zipfile.ZipFile(path) as zf:
+                assert {i.compress_type for i in zf.infolist()} == {compress_type}
+            assert _lw(str(path))["Template"].cell(row=DATA_START_ROW, column=7).value == "Art A"
+
+    def test_unknown_level_rejected_before_writing(self, tmp_path):
+        from amazon_excel_processor.excel_io import save_workbook
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        _, ws, name = load_workbook(p)
+        with pytest.raises(ValueError, match="压缩档位"):
+            save_workbook(ws, p, name, output_path=tmp_path / "out.xlsx", compression="zip")
+        assert not (tmp_path / "out.xlsx").exists()
+
+
+class TestParallelDeflate:
+    def test_blocks_stitch_into_one_stream(self):
+        import zlib
+        from amazon_excel_processor.xlsx_package import ParallelDeflater
+        data = b"".join(b'<row r="%d"><c r="A%d"><v>%d</v></c></row>' % (i, i, i * 7) for i in range(5000))
+        d = ParallelDeflater(9, workers=3, block_size=4096)
+        out = b"".join(d.compress(data[i:i + 1000]) for i in range(0, len(data), 1000)) + d.flush()
+        assert zlib.decompress(out, -zlib.MAX_WBITS) == data
+        assert len(out) < len(zlib.compress(data, 9)) * 1.05
+
+    def test_sheet_part_written_in_parallel_is_valid(self, tmp_path, monkeypatch):
+        from openpyxl import load_workbook as _lw
+        from amazon_excel_processor import xlsx_package
+        from amazon_excel_processor.excel_io import save_workbook
+        monkeypatch.setattr(xlsx_package, "_DEFLATE_BLOCK", 256)
+        monkeypatch.setattr(xlsx_package.os, "cpu_count", lambda: 4)
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A", "Art B"])
+        _, ws, name = load_workbook(p)
+        out = save_workbook(ws, p, name, output_path=tmp_path / "out.xlsx")
+        with zipfile.ZipFile(out) as zf:
+            assert zf.testzip() is None
+        assert _lw(str(out))["Template"].cell(row=DATA_START_ROW + 11, column=7).value == "Art B"
+
+
+    def test_falls_back_to_zipfile_compression_without_private_hooks(self, tmp_path, monkeypatch):
+        import zlib
+        from amazon_excel_processor import xlsx_package
+        from amazon_excel_processor.excel_io import save_workbook
+        # 模拟没有这些私有属性的 zipfile: 不并行, 级别改由 ZipFile 的 compresslevel 生效
+        monkeypatch.setattr(xlsx_package, "_ZIPINFO_LEVEL_ATTRS", ("_no_such_level",))
+        monkeypatch.setattr(xlsx_package, "_WRITER_COMPRESSOR_ATTR", "_no_such_compressor")
+        monkeypatch.setattr(xlsx_package, "ParallelDeflater", None)
+        monkeypatch.setattr(xlsx_package.os, "cpu_count", lambda: 4)
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A", "Art B"])
+        _, ws, name = load_workbook(p)
+        out = save_workbook(ws, p, name, output_path=tmp_path / "out.xlsx", compression="max")
+        with zipfile.ZipFile(out) as zf:
+            assert zf.testzip() is None
+            info = zf.getinfo("xl/worksheets/sheet2.xml")
+            c = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+            assert info.compress_size == len(c.compress(zf.read(info)) + c.flush())
+
+
+class TestAtomicSave:
+    def test_failed_save_keeps_previous_output(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import excel_io
+        from amazon_excel_processor.excel_io import save_workbook
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        out = tmp_path / "out.xlsx"
+        out.write_bytes(b"previous")
+        _, ws, name = load_workbook(p)
+
+        def boom(*args, **kwargs):
+            raise RuntimeError("disk full")
+        monkeypatch.setattr(excel_io, "save_worksheet_passthrough", boom)
+        with pytest.raises(RuntimeError):
+            save_workbook(ws, p, name, output_path=out)
+        assert out.read_bytes() == b"previous"
+        assert sorted(f.name for f in tmp_path.iterdir()) == ["out.xlsx", "t.xlsx"]
+
+    def test_locked_target_gets_fresh_numbered_name(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import excel_io
+        from amazon_excel_processor.excel_io import _commit_output, _temp_output_path
+        target = tmp_path / "out.xlsx"
+        (tmp_path / "out_2.xlsx").write_bytes(b"other worker")
+        real_replace = excel_io.os.replace
+
+        def replace(src, dst):
+            if Path(dst) == target:
+                raise PermissionError("locked")
+            real_replace(src, dst)
+        monkeypatch.setattr(excel_io.os, "replace", replace)
+        tmp = _temp_output_path(target)
+        tmp.write_bytes(b"new")
+        assert _commit_output(tmp, target) == tmp_path / "out_3.xlsx"
+        assert (tmp_path / "out_2.xlsx").read_bytes() == b"other worker"
+        assert (tmp_path / "out_3.xlsx").read_bytes() == b"new"
+        assert not tmp.exists()
+
+
+    def test_locked_target_reuses_oldest_fallback_when_all_taken(self, tmp_path, monkeypatch, caplog):
+        import os
+        from amazon_excel_processor import excel_io
+        from amazon_excel_processor.excel_io import MAX_OUTPUT_FALLBACKS, _commit_output, _temp_output_path
+        target = tmp_path / "out.xlsx"
+        for i in range(2, MAX_OUTPUT_FALLBACKS + 2):
+            old = tmp_path / f"out_{i}.xlsx"
+            old.write_bytes(b"earlier run")
+            os.utime(old, (1000 + i, 1000 + i))
+        os.utime(tmp_path / "out_4.xlsx", (10, 10))
+        real_replace = excel_io.os.replace
+
+        def replace(src, dst):
+            if Path(dst) == target:
+                raise PermissionError("locked")
+            real_replace(src, dst)
+        monkeypatch.setattr(excel_io.os, "replace", replace)
+        tmp = _temp_output_path(target)
+        tmp.write_bytes(b"new")
+        with caplog.at_level("WARNING"):
+            assert _commit_output(tmp, target) == tmp_path / "out_4.xlsx"
+        assert (tmp_path / "out_4.xlsx").read_bytes() == b"new"
+        assert len(list(tmp_path.iterdir())) == MAX_OUTPUT_FALLBACKS
+        assert str(target) in caplog.text and "out_4.xlsx" in caplog.text
+
+class TestPeekTemplate:
+    def test_infers_main_and_variant_group_size(self, tmp_path):
+        p = tmp_path / "main.xlsx"
+        _save_template_file(p, ["Art A", "Art B", "Art C"])
+        headers, size = peek_template(p)
+        assert headers.find("Item Name") == 7
+        assert size == 11
+        p = tmp_path / "wood.xlsx"
+        _save_template_file(p, ["Art A"], group_size=6)
+        assert peek_template(p)[1] == 6
+
+    def test_missing_item_name_raises(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Template"
+        wb.active.cell(row=HEADER_ROW, column=1).value = "SKU"
+        wb.save(str(p))
+        with pytest.raises(ValueError, match="Item Name"):
+            peek_template(p)
+
+    def test_empty_sheet_has_zero_group_size(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, [])
+        assert peek_template(p)[1] == 0
+
+
+class TestNonMaterialisingReads:
+    def test_read_pass_does_not_grow_cells(self, tmp_path):
+        from amazon_excel_processor.field_filler import detect_ratio_type
+        from amazon_excel_processor.merger import _snapshot_row, index_groups_by_name
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A", "Art B"])
+        _, ws, _ = load_workbook(p)
+        before = (len(ws._cells), ws.max_row, ws.max_column)
+
+        col_map = locate_columns(ws)
+        groups = group_rows(ws)
+        for g in groups:
+            detect_ratio_type(ws, g, col_map)
+            for r in g:
+                _snapshot_row(ws, r, ws.max_column + 10)
+        index_groups_by_name(ws, groups, col_map["Item Name"])
+
+        assert (len(ws._cells), ws.max_row, ws.max_column) == before
+
+
+class TestDataExtent:
+    def test_single_scan_index(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A", "Art B"], group_size=6)
+        _, ws, _ = load_workbook(p)
+        ws.cell(row=DATA_START_ROW + 14, column=1).value = "SKU命名（一样）"  # 底部备注行
+        extent = scan_data_extent(ws)
+        assert extent.first_row == DATA_START_ROW
+        assert extent.last_row == DATA_START_ROW + 11
+        assert extent.parent_rows == [DATA_START_ROW, DATA_START_ROW + 6]
+        assert extent.parentage[DATA_START_ROW + 1] == "Child"
+        assert extent.data_row_count == 12
+        assert extent.scan_end >= ws.max_row
+        assert group_rows(ws, 6, extent=extent) == group_rows(ws, 6)
+
+    def test_empty_sheet(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, [])
+        extent = scan_data_extent(load_template_sheet(p))
+        assert (extent.first_row, extent.last_row, extent.parent_rows) == (0, DATA_START_ROW - 1, [])
+
+
+class TestParentageGrouping:
+    def _sheet(self, sizes):
+        from amazon_excel_processor.template_sheet import TemplateSheet
+        sheet = TemplateSheet()
+        sheet.load_row(HEADER_ROW, [None, None, None, "Parentage Level", None, None, "Item Name"])
+        row = DATA_START_ROW
+        for size in sizes:
+            for i in range(size):
+                sheet.load_row(row, [None, None, None, "Parent" if i == 0 else "Child"])
+                row += 1
+        return sheet
+
+    def test_missing_child_does_not_shift_later_groups(self):
+        sheet = self._sheet([6, 5, 6])
+        groups = group_rows(sheet, 6)
+        assert groups == [range(8, 14), range(19, 25)]
+        assert all(sheet.cell(row=g[0], column=4).value == "Parent" for g in groups)
+
+    def test_variable_size_groups(self):
+        groups = group_rows(self._sheet([11, 16, 21]), None)
+        assert [len(g) for g in groups] == [11, 16, 21]
+
+    def test_without_parent_marker_falls_back_to_fixed_chunks(self):
+        from amazon_excel_processor.template_sheet import TemplateSheet
+        sheet = TemplateSheet()
+        for r in range(DATA_START_ROW, DATA_START_ROW + 13):
+            sheet.load_row(r, [None, None, None, "Child"])
+        assert group_rows(sheet, 6) == [range(8, 14), range(14, 20)]
+
+
+class TestHeaderIndex:
+    def test_case_insensitive_lookup(self):
+        index = HeaderIndex({1: "SKU", 4: " parentage level ", 7: "ITEM NAME"})
+        assert index.find("Item Name") == 7
+        assert index.find("Parentage Level") == 4
+        assert index.find("Color") == 0
+        assert "item name" in index
+
+    def test_no_aliases_by_default(self):
+        assert HeaderIndex({1: "Seller SKU", 7: "Product Name"}).find("Item Name") == 0
+
+    def test_canonical_name_wins_over_alias(self):
+        aliases = {"SKU": ["Seller SKU"]}
+        assert HeaderIndex({1: "Seller SKU"}, aliases).find("SKU") == 1
+        assert HeaderIndex({1: "Seller SKU", 3: "SKU"}, aliases).find("SKU") == 3
+
+    def test_duplicate_headers(self):
+        index = HeaderIndex({7: "Item Name", 9: "Color", 12: "item name"})
+        assert index.find("Item Name") == 7
+        assert index.find_last("Item Name") == 12
+        assert index.duplicates == {"item name": [7, 12]}
+
+    def test_locate_columns_reuses_index(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_template_file(p, ["Art A"])
+        sheet = load_template_sheet(p)
+        index = HeaderIndex.from_sheet(sheet)
+        assert locate_columns(sheet, headers=index) == locate_columns(sheet)
@@ -11,6 +11,7 @@ from amazon_excel_processor.merger import (
     identify_main_file,  # 向后兼容
     index_groups_by_name,
     merge_one_painting,
+    _snapshot_row,
     rewrite_sku,
     write_parent_sku_formulas,
     build_sku_prefix,
@@ -140,10 +141,7 @@ def _setup_merge_one_painting(painting="Art A"):
     gold_groups = group_rows(gold_ws, group_size=VARIANT_GROUP_SIZE)
 
     max_col = max(main_ws.max_column, wood_ws.max_column, gold_ws.max_column)
-    main_snapshots = [
-        {c: main_ws.cell(row=r, column=c).value for c in range(1, max_col + 1)}
-        for r in main_groups[0]
-    ]
+    main_snapshots = [_snapshot_row(main_ws, r, max_col) for r in main_groups[0]]
     return {
         "main_ws": main_ws,
         "main_col_map": main_col_map,
@@ -156,6 +154,60 @@ def _setup_merge_one_painting(painting="Art A"):
     }
 
 
+class TestSnapshots:
+    def test_tuple_snapshots_trim_trailing_empty_columns(self):
+        wb, _ = _create_main_workbook(["Art A"])
+        ws = wb.active
+        ws.cell(row=9, column=40).value = "far"
+        before = len(ws._cells)
+        snap = _snapshot_row(ws, 9, 60)
+        assert len(ws._cells) == before
+        assert len(snap) == 40 and snap[-1] == "far"
+        assert len(_snapshot_row(ws, 8, 60)) < 40
+        # 超出 max_col 的列不读
+        assert len(_snapshot_row(ws, 9, 10)) <= 10
+
+    def test_detached_data_area_leaves_header_rows_only(self):
+        from openpyxl.styles import Font, PatternFill
+        from amazon_excel_processor.template_sheet import TemplateSheet, detach_rows
+        wb, _ = _create_main_workbook(["Art A"])
+        ws = wb.active
+        ws["A40"] = "备注"
+        plain = TemplateSheet()
+        for r in range(1, ws.max_row + 1):
+            plain.load_row(r, _snapshot_row(ws, r, ws.max_column))
+        # 数据区带样式的单元格: 值移出, 样式留在原坐标
+        ws["B9"].fill = PatternFill("solid", fgColor="FFFFFF00")
+        ws["B9"].font = Font(bold=True)
+        width = ws.max_column
+        expected = {r: _snapshot_row(ws, r, width) for r in range(DATA_START_ROW, 41)}
+        header = _snapshot_row(ws, HEADER_ROW, width)
+        for sheet in (ws, plain):
+            source = detach_rows(sheet, DATA_START_ROW)
+            assert {r: _snapshot_row(source, r, width) for r in expected} == expected
+            assert _snapshot_row(sheet, HEADER_ROW, width) == header
+            assert all(_snapshot_row(sheet, r, width) == () for r in range(DATA_START_ROW, 41))
+        assert plain.max_row == HEADER_ROW
+        assert set(ws._cells) == {k for k in ws._cells if k[0] < DATA_START_ROW} | {(9, 2)}
+        assert ws["B9"].fill.fgColor.rgb == "FFFFFF00"
+        assert ws["B9"].font.bold
+
+    def test_row_block_write_matches_cell_writes(self):
+        from amazon_excel_processor.template_sheet import TemplateSheet, set_cell_value, set_row_values
+        values = ("SKU-1", None, 3, None)
+        for make in (lambda: Workbook().active, TemplateSheet):
+            by_cell, by_row = make(), make()
+            for ws in (by_cell, by_row):
+                for c in (2, 6, 9):
+                    ws.cell(row=8, column=c).value = "old"
+            for c in range(1, 7):
+                set_cell_value(by_cell, 8, c, values[c - 1] if c <= len(values) else None)
+            set_row_values(by_row, 8, values, 6)
+            assert ([by_row.cell(row=8, column=c).value for c in range(1, 11)]
+                    == [by_cell.cell(row=8, column=c).value for c in range(1, 11)]
+                    == ["SKU-1", None, 3, None, None, None, None, None, "old", None])
+
+
 class TestMergeOnePainting:
     def test_output_21_rows(self):
         s = _setup_merge_one_painting()
@@ -282,7 +334,7 @@ class TestMergeOnePainting:
         # 先记录普文件原 11 行的所有列值 (从快照)
         original_values = {}
         for i in range(11):
-            for c, v in main_snapshots[i].items():
+            for c, v in enumerate(main_snapshots[i], start=1):
                 original_values[(i, c)] = v
 
         # 用老品补充模式合并
@@ -303,7 +355,7 @@ class TestMergeOnePainting:
         for i in range(11):
             r = 4 + i
             for c in range(1, s["max_col"] + 1):
-                orig = original_values[(i, c)]
+                orig = original_values.get((i, c))  # 快照末尾空列不存
                 now = main_ws.cell(row=r, column=c).value
                 # 空字符串和 None 视为相同
                 orig_e = orig if orig not in (None, "") else ""
@@ -361,6 +413,52 @@ class TestMergeOnePainting:
         parent_e = main_ws.cell(row=DATA_START_ROW, column=5)
         assert parent_e.fill.fgColor.rgb == 'FF632523'
 
+    def test_template_style_resolved_once_and_shared(self):
+        """同一 StyleInterner 下模板样式只解析一次, 各组共用同一个数组; 改之前复制, 不影响其余."""
+        import datetime
+        from openpyxl.styles import Font, PatternFill
+        from amazon_excel_processor.excel_io import DATA_START_ROW, StyleInterner
+        from amazon_excel_processor.template_sheet import set_cell_value, set_row_values
+        s = _setup_merge_one_painting()
+        main_ws = s["main_ws"]
+        main_ws.cell(row=DATA_START_ROW, column=5).fill = PatternFill(patternType='solid', fgColor='FF632523')
+        styles = StyleInterner()
+        parents = []
+        for start in (DATA_START_ROW, DATA_START_ROW + 21, DATA_START_ROW + 42):
+            merged = merge_one_painting(
+                main_snapshots=s["main_snapshots"],
+                wood_group=s["wood_group"],
+                gold_group=s["gold_group"],
+                output_start_row=start,
+                output_ws=main_ws,
+                col_map=s["main_col_map"],
+                wood_ws=s["wood_ws"],
+                gold_ws=s["gold_ws"],
+                max_col=s["max_col"],
+                styles=styles,
+            )
+            parents.append(main_ws.cell(row=merged[0], column=5))
+        assert parents[0]._style is parents[1]._style is parents[2]._style
+        assert parents[2].fill.fgColor.rgb == 'FF632523'
+        assert len(styles) == 1
+
+        styles.own(parents[1])
+        assert parents[1]._style is not parents[2]._style
+        parents[1].number_format = "yyyy-mm-dd"
+        parents[1].font = Font(bold=True)
+        assert parents[2].number_format == "General"
+        assert not parents[2].font.bold
+        assert parents[2].fill.fgColor.rgb == 'FF632523'
+
+        # 写日期值时 openpyxl 会改 number_format: 写入函数自动先复制
+        set_cell_value(main_ws, parents[0].row, 5, datetime.date(2024, 1, 2))
+        row = [None] * 4 + [datetime.datetime(2024, 1, 3)]
+        set_row_values(main_ws, parents[2].row, row, 5)
+        assert parents[0].is_date and parents[2].is_date
+        assert parents[0]._style is not parents[2]._style
+        assert styles.template_style(main_ws, DATA_START_ROW, 5).numFmtId == 0
+        assert parents[0].fill.fgColor.rgb == 'FF632523'
+
 
 # ===== rewrite_sku =====
 
@@ -627,7 +725,7 @@ class TestOptionalVariants:
         main_snapshots = s["main_snapshots"]
         original = {}
         for i in range(11):
-            for c, v in main_snapshots[i].items():
+            for c, v in enumerate(main_snapshots[i], start=1):
                 original[(i, c)] = v
         merge_one_painting(
             main_snapshots=main_snapshots,
@@ -645,7 +743,7 @@ class TestOptionalVariants:
         for i in range(11):
             r = 4 + i
             for c in range(1, s["max_col"] + 1):
-                orig = original[(i, c)]
+                orig = original.get((i, c))
                 now = main_ws.cell(row=r, column=c).value
                 orig_e = orig if orig not in (None, "") else ""
                 now_e = now if now not in (None, "") else ""
@@ -719,6 +817,64 @@ class TestMergeFilesOptional:
         assert "Sunset Beach" in msg  # 原始 Product Name 应出现, 不是空
 
 
+class TestPreflightPairing:
+    def test_reports_every_unmatched_painting_without_full_load(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import merger
+        main_wb, _ = _create_main_workbook(["Art A", "Sunset Beach", "Moon Lake", "Art A"])
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        wood_p = tmp_path / "wood.xlsx"
+        _create_variant_workbook(["Art A", "Sunset Beach", "Moon Lake", "Art A"], role="wood").save(str(wood_p))
+        gold_p = tmp_path / "gold.xlsx"
+        _create_variant_workbook(["Art A", "Sunset Beech"], role="gold").save(str(gold_p))
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("预检不应完整加载")
+
+        monkeypatch.setattr(merger, "load_workbook", _fail)
+        monkeypatch.setattr(merger, "load_template_sheet", _fail)
+        assert merger.preflight_pairing(main_p, wood_path=wood_p) == 4
+        with pytest.raises(ValueError, match="配对失败, 3 个") as excinfo:
+            merger.preflight_pairing(main_p, wood_path=wood_p, gold_path=gold_p)
+        msg = str(excinfo.value)
+        assert "Moon Lake" in msg
+        assert "第 2 次出现" in msg            # 第二个 Art A 在金框中只有一个
+        assert "[92%] Sunset Beech" in msg     # 模糊候选取自金框原始名称
+
+    def test_irregular_variant_group_fails_like_merge(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import merger
+        paintings = ["Art A", "Art B", "Art C"]
+        main_wb, _ = _create_main_workbook(paintings)
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        wood_wb = _create_variant_workbook(paintings, role="wood")
+        wood_wb.active.delete_rows(DATA_START_ROW + VARIANT_GROUP_SIZE + 2)  # Art B 少一行子体
+        wood_p = tmp_path / "wood.xlsx"
+        wood_wb.save(str(wood_p))
+
+        peeks = []
+        real_peek = merger.peek_template
+        monkeypatch.setattr(merger, "peek_template", lambda p, *a: peeks.append(p) or real_peek(p, *a))
+        with pytest.raises(ValueError, match="配对失败") as excinfo:
+            merger.preflight_pairing(main_p, wood_path=wood_p)
+        assert "Art B" in str(excinfo.value)
+        assert "木框文件 wood.xlsx 有不规则的组 (Parent 行: 14 Art B)" in str(excinfo.value)
+        assert sorted(peeks) == sorted([main_p, wood_p])  # 每个文件只 peek 一次
+        for stream in (True, False):
+            with pytest.raises(ValueError, match="配对失败"):
+                merger.merge_files(main_p, wood_path=wood_p, sku_prefix="T", output_path=tmp_path / "o.xlsx",
+                                   parallel=False, stream=stream)
+
+    def test_irregular_main_group_is_reported(self, tmp_path):
+        from amazon_excel_processor import merger
+        main_wb, _ = _create_main_workbook(["Art A", "Art B"])
+        main_wb.active.delete_rows(DATA_START_ROW + MAIN_GROUP_SIZE + 3)
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        with pytest.raises(ValueError, match="有不规则的组 \\(Parent 行: 19\\)"):
+            merger.preflight_pairing(main_p)
+
+
 # ===== Search Terms 清理 (new 模式) =====
 
 class TestSearchTermsCleaning:
@@ -1118,3 +1274,68 @@ class TestCleanupForUpload:
         ws.cell(row=8, column=4).value = "Parent"
         # 不应抛异常
         cleanup_for_upload(ws)
+
+
+# ===== 并行加载 =====
+
+class TestParallelLoad:
+    """木/金文件在进程池中加载, 结果与顺序加载一致。"""
+
+    def test_parallel_matches_sequential(self, tmp_path):
+        from amazon_excel_processor.merger import merge_files
+        main_wb, _ = _create_main_workbook(["Art A", "Art B"])
+        wood_wb = _create_variant_workbook(["Art A", "Art B"], role="wood", shuffled=True)
+        gold_wb = _create_variant_workbook(["Art A", "Art B"], role="gold")
+        main_p = tmp_path / "main.xlsx"
+        wood_p = tmp_path / "wood.xlsx"
+        gold_p = tmp_path / "gold.xlsx"
+        main_wb.save(str(main_p))
+        wood_wb.save(str(wood_p))
+        gold_wb.save(str(gold_p))
+        out_seq = merge_files(main_path=main_p, wood_path=wood_p, gold_path=gold_p,
+                              sku_prefix="T", mode="new", parallel=False,
+                              output_path=tmp_path / "seq.xlsx")
+        out_par = merge_files(main_path=main_p, wood_path=wood_p, gold_path=gold_p,
+                              sku_prefix="T", mode="new", parallel=True,
+                              output_path=tmp_path / "par.xlsx")
+        seq = list(load_workbook(str(out_seq))["Template"].iter_rows(values_only=True))
+        par = list(load_workbook(str(out_par))["Template"].iter_rows(values_only=True))
+        assert seq == par
+        assert len(seq) == DATA_START_ROW - 1 + 2 * 21
+
+
+# ===== 预检 =====
+
+class TestPrevalidate:
+    """错误文件在完整加载前被拒绝。"""
+
+    def test_swapped_files_rejected_before_full_load(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import merger
+        main_wb, _ = _create_main_workbook(["Art A", "Art B"])
+        wood_wb = _create_variant_workbook(["Art A", "Art B"], role="wood")
+        main_p = tmp_path / "main.xlsx"
+        wood_p = tmp_path / "wood.xlsx"
+        main_wb.save(str(main_p))
+        wood_wb.save(str(wood_p))
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("预检失败时不应完整加载")
+
+        monkeypatch.setattr(merger, "load_workbook", _fail)
+        with pytest.raises(ValueError, match="主文件类型错误"):
+            merger.merge_files(main_path=wood_p, wood_path=main_p, sku_prefix="T")
+        with pytest.raises(ValueError, match="木框文件类型错误"):
+            merger.prevalidate_inputs(main_p, wood_path=main_p)
+        merger.prevalidate_inputs(main_p, wood_path=wood_p)
+
+
+class TestIrregularMainGroups:
+    def test_missing_row_in_main_is_reported(self, tmp_path):
+        from amazon_excel_processor.merger import merge_files
+        main_wb, _ = _create_main_workbook(["Art A", "Art B"])
+        ws = main_wb.active
+        ws.delete_rows(DATA_START_ROW + MAIN_GROUP_SIZE + 3)  # Art B 少一个子体
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        with pytest.raises(ValueError, match="不规则"):
+            merge_files(main_path=main_p, sku_prefix="T")
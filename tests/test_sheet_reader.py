@@ -0,0 +1,184 @@
+"""流式读取器测试: 取值与 openpyxl 一致, 不支持的内容回退"""
+
+import datetime
+import sys
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from amazon_excel_processor import excel_io
+from amazon_excel_processor.excel_io import load_template_sheet
+from amazon_excel_processor.sheet_reader import SheetReader, UnsupportedSheet
+from amazon_excel_processor.template_sheet import InternPool
+from amazon_excel_processor.xlsx_package import RawCell
+
+
+def _save_mixed(path):
+    wb = Workbook()
+    wb.active.title = "Instructions"
+    ws = wb.create_sheet("Template")
+    ws["A4"] = "SKU"
+    ws["G4"] = "Item Name"
+    ws["A8"] = "SKU-8"
+    ws["B8"] = 12
+    ws["C8"] = 12.5
+    ws["D8"] = True
+    ws["E8"] = datetime.datetime(2024, 7, 25, 10, 30)
+    ws["F8"] = "=A8"
+    ws["G8"] = "Art & <B>"
+    ws["AB9"] = "far column"
+    ws["A12"] = 0
+    wb.save(str(path))
+
+
+class TestSheetReader:
+    def test_values_match_openpyxl(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_mixed(p)
+        with SheetReader(p) as reader:
+            assert reader.sheet_names == ["Instructions", "Template"]
+            rows = dict(reader.iter_rows("Template"))
+        ro = load_workbook(str(p), read_only=True)["Template"]
+        expected = {}
+        for idx, values in enumerate(ro.iter_rows(values_only=True), start=1):
+            values = list(values)
+            while values and values[-1] is None:
+                values.pop()
+            if values:
+                expected[idx] = tuple(values)
+        assert rows == expected
+        assert rows[8][4] == datetime.datetime(2024, 7, 25, 10, 30)
+        assert rows[9][27] == "far column"
+
+    def test_max_row_stops_early(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_mixed(p)
+        with SheetReader(p) as reader:
+            assert [r for r, _ in reader.iter_rows("Template", max_row=8)] == [4, 8]
+
+    def test_gated_columns_decoded_only_on_matching_rows(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Template"
+        ws = wb.active
+        for row, level, name in ((8, " Parent", "Art A"), (9, "Child", "Art A 12x16"), (10, None, "orphan")):
+            ws.cell(row, 4, level)
+            ws.cell(row, 7, name)
+        wb.save(str(p))
+        with SheetReader(p) as reader:
+            rows = dict(reader.iter_column_values("Template", [4], min_row=8, gated=[7], gate=(4, "Parent")))
+        # 只有 Parent 行解码 Item Name; 两列都没取到值的行不产出
+        assert rows == {8: {4: " Parent", 7: "Art A"}, 9: {4: "Child"}}
+
+    def test_shared_formula_is_unsupported(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Template"
+        wb.save(str(p))
+        _rewrite_sheet(p, '<row r="8"><c r="A8"><f t="shared" ref="A8:A9" si="0">B8</f></c></row>'
+                          '<row r="9"><c r="A9"><f t="shared" si="0"/></c></row>')
+        with SheetReader(p) as reader:
+            with pytest.raises(UnsupportedSheet):
+                list(reader.iter_rows("Template"))
+        # load_template_sheet 回退 openpyxl, 共享公式被展开
+        sheet = load_template_sheet(p)
+        assert sheet.cell(row=9, column=1).value == "=B9"
+
+    def test_load_template_sheet_does_not_use_openpyxl(self, tmp_path, monkeypatch):
+        p = tmp_path / "t.xlsx"
+        _save_mixed(p)
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("流式读取器可用时不应调用 openpyxl")
+
+        monkeypatch.setattr(excel_io, "_load_wb", _fail)
+        sheet = load_template_sheet(p)
+        assert sheet.title == "Template"
+        assert sheet.cell(row=8, column=7).value == "Art & <B>"
+
+
+class TestRawRows:
+    def test_decoded_columns_match_iter_rows(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        _save_mixed(p)
+        decode = set(range(1, 8))
+        with SheetReader(p) as reader:
+            full = {r: v for r, v, _, _ in reader.iter_rows("Template", styles=True)}
+            raw = {r: v for r, v, _, _ in reader.iter_raw_rows("Template", decode, min_row=8)}
+        assert set(raw) == {r for r in full if r >= 8}
+        for row, values in raw.items():
+            assert values[:7] == full[row][:7]
+        # AB9 不在解码列中: 原始 <c> 片段原样保留
+        far = raw[9][27]
+        assert isinstance(far, RawCell)
+        assert far.xml == b'<c r="AB9" t="inlineStr"><is><t>far column</t></is></c>'
+
+    def test_runs_split_at_decoded_columns(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Template"
+        wb.save(str(p))
+        _rewrite_sheet(p, '<row r="8"><c r="B8" s="1"/><c r="C8"><v>3</v></c>'
+                          '<c r="E8"><v>5</v></c><c r="G8"><v>7</v></c></row>')
+        with SheetReader(p) as reader:
+            [(_, values, _, _)] = reader.iter_raw_rows("Template", {4, 7})
+        # D8 (解码列) 缺失: B-C 与 E 分成两段, 写 D8 时顺序不乱
+        assert values[1].xml == b'<c r="B8" s="1"/><c r="C8"><v>3</v></c>'
+        assert values[4].xml == b'<c r="E8"><v>5</v></c>'
+        assert values[6] == 7
+        assert values[2] is values[3] is values[5] is None
+
+    def test_shared_formula_is_unsupported(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Template"
+        wb.save(str(p))
+        _rewrite_sheet(p, '<row r="8"><c r="A8"><f t="shared" ref="A8:A9" si="0">B8</f></c></row>')
+        with SheetReader(p) as reader:
+            with pytest.raises(UnsupportedSheet):
+                list(reader.iter_raw_rows("Template", {2}))
+
+class TestInternPool:
+    def test_repeated_inline_strings_share_one_object(self, tmp_path):
+        p = tmp_path / "t.xlsx"
+        wb = Workbook()
+        wb.active.title = "Template"
+        wb.save(str(p))
+        _rewrite_sheet(p, "".join(
+            f'<row r="{r}"><c r="A{r}" t="inlineStr"><is><t>Centimeters</t></is></c>'
+            f'<c r="B{r}" t="inlineStr"><is><t>{"x" * 200}</t></is></c></row>'
+            for r in range(8, 12)))
+        with SheetReader(p) as reader:
+            rows = [values for _, values in reader.iter_rows("Template")]
+            pool = reader.pool
+        assert all(values[0] is rows[0][0] for values in rows)
+        # 超长文本不驻留
+        assert rows[1][1] is not rows[0][1]
+        assert len(pool) == 1
+        assert pool.hits == 3
+        assert pool.saved_bytes == 3 * sys.getsizeof("Centimeters")
+
+    def test_pool_is_bounded(self):
+        pool = InternPool(max_entries=2)
+        for text in ("Parent", "Child", "Gold"):
+            pool.intern(text)
+        assert len(pool) == 2
+        gold = "".join(["Go", "ld"])
+        assert pool.intern(gold) is gold  # 池满后新文本原样返回
+        child = "".join(["Chi", "ld"])
+        assert pool.intern(child) is not child and pool.intern(child) == "Child"
+
+
+def _rewrite_sheet(path, sheet_data):
+    """把 xl/worksheets/sheet1.xml 的 <sheetData> 替换为给定内容。"""
+    import re
+    import zipfile
+    with zipfile.ZipFile(path) as zf:
+        parts = {name: zf.read(name) for name in zf.namelist()}
+    xml = parts["xl/worksheets/sheet1.xml"].decode()
+    xml = re.sub(r"<sheetData\s*/>|<sheetData>.*</sheetData>",
+                 f"<sheetData>{sheet_data}</sheetData>", xml, flags=re.DOTALL)
+    parts["xl/worksheets/sheet1.xml"] = xml.encode()
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, data in parts.items():
+            zf.writestr(name, data)
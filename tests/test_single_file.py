@@ -0,0 +1,34 @@
+"""单文件处理流程测试: 流式与整表路径结果一致"""
+
+from openpyxl import load_workbook
+
+from amazon_excel_processor.excel_io import load_workbook as load_template
+from amazon_excel_processor.single_file import run_single_file
+
+from test_merger import _create_main_workbook
+from test_tsv_io import _write_tsv
+
+
+class TestRunSingleFile:
+    def test_streaming_and_flat_file_paths_agree(self, tmp_path):
+        wb, _ = _create_main_workbook(["Art A", "Art B"])
+        xlsx = tmp_path / "main.xlsx"
+        wb.save(str(xlsx))
+        flat = tmp_path / "flat.txt"
+        _write_tsv(flat, ["Art A", "Art B"])
+
+        lines = []
+        out, groups = run_single_file(xlsx, lines.append, sku_prefix="T",
+                                      output_path=tmp_path / "out.xlsx")
+        assert groups == 2
+        assert f"  输出文件: {out}" in lines
+        flat_out, flat_groups = run_single_file(flat, lambda msg: None, sku_prefix="T",
+                                                output_path=tmp_path / "out.txt")
+        assert flat_groups == 2
+
+        streamed = load_workbook(str(out))["Template"]
+        _, in_place, _ = load_template(flat_out)
+        for row in (8, 9, 19):
+            for col in (1, 7):
+                assert streamed.cell(row=row, column=col).value == in_place.cell(row=row, column=col).value
+
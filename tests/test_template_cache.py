@@ -0,0 +1,81 @@
+"""解析缓存测试"""
+
+import os
+
+from openpyxl import Workbook
+
+from amazon_excel_processor import excel_io
+from amazon_excel_processor.excel_io import load_template_sheet, locate_columns
+from amazon_excel_processor.template_cache import TemplateCache, file_digest
+from amazon_excel_processor.template_sheet import TemplateSheet
+
+
+def _save_template(path, title="Art A"):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Template"
+    ws.cell(row=4, column=7).value = "Item Name"
+    ws.cell(row=8, column=4).value = "Parent"
+    ws.cell(row=8, column=7).value = title
+    wb.save(str(path))
+
+
+class TestTemplateCache:
+    def test_round_trip(self, tmp_path):
+        cache = TemplateCache(tmp_path / "cache")
+        sheet = TemplateSheet(title="Template")
+        sheet.load_row(4, [None, "SKU", 1.5])
+        cache.put("abc", sheet)
+        hit = cache.get("abc")
+        assert hit.title == "Template"
+        assert hit.cell(row=4, column=2).value == "SKU"
+        assert hit.cell(row=4, column=3).value == 1.5
+        assert cache.get("other") is None
+
+    def test_corrupted_entry_is_dropped(self, tmp_path):
+        cache = TemplateCache(tmp_path / "cache")
+        cache.put("abc", TemplateSheet())
+        entry = next((tmp_path / "cache").iterdir())
+        entry.write_bytes(b"garbage")
+        assert cache.get("abc") is None
+        assert not entry.exists()
+
+    def test_lru_eviction(self, tmp_path):
+        cache = TemplateCache(tmp_path / "cache", max_bytes=10 ** 9)
+        for i, key in enumerate(["old", "mid", "new"]):
+            sheet = TemplateSheet()
+            sheet.load_row(1, [os.urandom(2000).hex()])
+            cache.put(key, sheet)
+            os.utime(cache._entry_path(key), (1000 + i, 1000 + i))
+        cache.get("old")  # 命中后变为最近使用
+        cache.max_bytes = sum(cache._entry_path(k).stat().st_size for k in ("old", "new"))
+        cache.evict()
+        assert cache.get("mid") is None
+        assert cache.get("old") is not None
+        assert cache.get("new") is not None
+
+
+class TestLoadWithCache:
+    def test_hit_skips_parse(self, tmp_path, monkeypatch):
+        p = tmp_path / "wood.xlsx"
+        _save_template(p)
+        cache = TemplateCache(tmp_path / "cache")
+        first = load_template_sheet(p, cache=cache)
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("缓存命中时不应解析 workbook")
+
+        monkeypatch.setattr(excel_io, "_load_wb", _fail)
+        second = load_template_sheet(p, cache=cache)
+        assert locate_columns(second) == locate_columns(first)
+        assert second.cell(row=8, column=7).value == "Art A"
+
+    def test_changed_content_misses(self, tmp_path):
+        p = tmp_path / "wood.xlsx"
+        _save_template(p, "Art A")
+        cache = TemplateCache(tmp_path / "cache")
+        d1 = file_digest(p)
+        load_template_sheet(p, cache=cache)
+        _save_template(p, "Art B")
+        assert file_digest(p) != d1
+        assert load_template_sheet(p, cache=cache).cell(row=8, column=7).value == "Art B"
@@ -0,0 +1,259 @@
+"""流式输出测试: 与整表路径结果一致, 不适用时回退"""
+
+import io
+import re
+
+import pytest
+from openpyxl import load_workbook
+from openpyxl.styles import Font, PatternFill
+
+from amazon_excel_processor import xlsx_package
+from amazon_excel_processor.excel_io import DATA_START_ROW
+from amazon_excel_processor.merger import MAIN_GROUP_SIZE, merge_files
+from amazon_excel_processor.template_stream import StreamUnsupported, TemplateStream
+from amazon_excel_processor.xlsx_package import scan_sheet_xml
+
+from test_merger import _create_main_workbook, _create_variant_workbook
+from test_sheet_reader import _rewrite_sheet
+
+
+def _values(path):
+    return list(load_workbook(str(path))["Template"].iter_rows(values_only=True))
+
+
+class TestSingleFileStream:
+    def test_rows_pass_through_and_groups_are_editable(self, tmp_path):
+        wb, _ = _create_main_workbook(["Art A", "Art B"])
+        ws = wb.active
+        ws["A2"] = "说明行"
+        ws["G8"].fill = PatternFill("solid", fgColor="FF632523")
+        ws["A40"] = "备注"
+        p = tmp_path / "main.xlsx"
+        wb.save(str(p))
+
+        with TemplateStream(p, tmp_path / "out.xlsx") as stream:
+            seen = []
+            for rows in stream.groups():
+                seen.append(rows)
+                stream.sheet.cell(row=rows[0], column=7).value = f"edited {rows[0]}"
+        assert seen == [range(8, 19), range(19, 30)]
+
+        out = load_workbook(str(stream.out_path))["Template"]
+        assert out["A2"].value == "说明行"
+        assert out["G8"].value == "edited 8"
+        assert out["G8"].fill.fgColor.rgb == "FF632523"
+        assert out["G19"].value == "edited 19"
+        assert out["A40"].value == "备注"
+
+    def test_irregular_group_written_unchanged(self, tmp_path):
+        wb, _ = _create_main_workbook(["Art A", "Art B"])
+        wb.active.delete_rows(DATA_START_ROW + MAIN_GROUP_SIZE + 3)
+        p = tmp_path / "main.xlsx"
+        wb.save(str(p))
+        with TemplateStream(p, tmp_path / "out.xlsx") as stream:
+            assert list(stream.groups()) == [range(8, 19)]
+        assert _values(stream.out_path) == _values(p)
+
+    def test_orphan_rows_are_unsupported_and_output_untouched(self, tmp_path):
+        wb, _ = _create_main_workbook(["Art A"])
+        wb.active["D8"] = "Child"
+        p = tmp_path / "main.xlsx"
+        wb.save(str(p))
+        out = tmp_path / "out.xlsx"
+        out.write_bytes(b"previous")
+        with pytest.raises(StreamUnsupported):
+            with TemplateStream(p, out) as stream:
+                list(stream.groups())
+        assert out.read_bytes() == b"previous"
+        assert sorted(f.name for f in tmp_path.iterdir()) == ["main.xlsx", "out.xlsx"]
+
+    def test_untouched_columns_pass_through_as_raw_xml(self, tmp_path):
+        import zipfile
+        wb, _ = _create_main_workbook(["Art A", "Art B"])
+        ws = wb.active
+        for r in range(DATA_START_ROW, DATA_START_ROW + 2 * MAIN_GROUP_SIZE):
+            ws.cell(row=r, column=30, value=f"keep {r}").fill = PatternFill("solid", fgColor="FF00FF00")
+        p = tmp_path / "main.xlsx"
+        wb.save(str(p))
+
+        def run(out, raw):
+            with TemplateStream(p, out) as stream:
+                if raw:
+                    stream.decode_only({1, 4, 5, 7})
+                for rows in stream.groups():
+                    stream.sheet.cell(row=rows[0], column=7).value = f"edited {rows[0]}"
+            return stream.out_path
+
+        raw_out = run(tmp_path / "raw.xlsx", raw=True)
+        assert _values(raw_out) == _values(run(tmp_path / "full.xlsx", raw=False))
+        out = load_workbook(str(raw_out))["Template"]
+        assert out["AD9"].value == "keep 9"
+        assert out["AD9"].fill.fgColor.rgb == "FF00FF00"
+        with zipfile.ZipFile(p) as src, zipfile.ZipFile(raw_out) as dst:
+            cell = re.search(rb'<c r="AD9"[^>]*>.*?</c>', src.read("xl/worksheets/sheet1.xml")).group(0)
+            assert cell in dst.read("xl/worksheets/sheet1.xml")
+
+    def test_tsv_output_is_unsupported(self, tmp_path):
+        wb, _ = _create_main_workbook(["Art A"])
+        p = tmp_path / "main.xlsx"
+        wb.save(str(p))
+        with pytest.raises(StreamUnsupported):
+            TemplateStream(p, tmp_path / "out.txt")
+
+
+class TestMergeStream:
+    def test_matches_in_place_merge(self, tmp_path):
+        main_wb, _ = _create_main_workbook(["Art A", "Art B", "Art C"])
+        main_wb.active["E8"].fill = PatternFill("solid", fgColor="FF632523")
+        # 数据单元格的格式 (填充 / 粗体) 两条路径都要保留 (整表路径按坐标保留原数据区样式)
+        for r in range(DATA_START_ROW, DATA_START_ROW + 3 * MAIN_GROUP_SIZE):
+            for c in (2, 7):
+                main_wb.active.cell(row=r, column=c).fill = PatternFill("solid", fgColor="FFFFFF00")
+                main_wb.active.cell(row=r, column=c).font = Font(bold=True)
+        # 流水线不碰的列: 以原始片段直通, 行号改写到输出行
+        for r in range(DATA_START_ROW, DATA_START_ROW + 3 * MAIN_GROUP_SIZE):
+            main_wb.active.cell(row=r, column=30, value=f"keep {r}")
+            main_wb.active.cell(row=r, column=31, value=r)
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        for role in ("wood", "gold"):
+            _create_variant_workbook(["Art A", "Art B", "Art C"], role=role, shuffled=True).save(
+                str(tmp_path / f"{role}.xlsx"))
+        kwargs = dict(wood_path=tmp_path / "wood.xlsx", gold_path=tmp_path / "gold.xlsx",
+                      sku_prefix="T", mode="new", parallel=False)
+        streamed = merge_files(main_p, output_path=tmp_path / "s.xlsx", **kwargs)
+        in_place = merge_files(main_p, output_path=tmp_path / "i.xlsx", stream=False, **kwargs)
+        assert _values(streamed) == _values(in_place)
+        # 每组 Parent 行的 Parent SKU 列沿用 E8 样式 (整表路径在移出数据区前解析)
+        for path in (streamed, in_place):
+            out = load_workbook(str(path))["Template"]
+            for parent_row in (8, 29, 50):
+                assert out.cell(row=parent_row, column=5).fill.fgColor.rgb == "FF632523"
+            for row in (9, 29):
+                for col in (2, 7):
+                    assert out.cell(row=row, column=col).fill.fgColor.rgb == "FFFFFF00"
+                    assert out.cell(row=row, column=col).font.bold
+
+    def test_variant_rows_keep_date_format_of_undecoded_columns(self, tmp_path):
+        import datetime
+        launch = datetime.datetime(2024, 1, 2)
+        main_wb, _ = _create_main_workbook(["Art A", "Art B"])
+        for r in range(DATA_START_ROW, DATA_START_ROW + 2 * MAIN_GROUP_SIZE):
+            main_wb.active.cell(row=r, column=40, value=launch).number_format = "yyyy-mm-dd"
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        for role in ("wood", "gold"):
+            wb = _create_variant_workbook(["Art A", "Art B"], role=role)
+            for r in range(DATA_START_ROW, DATA_START_ROW + 12):
+                wb.active.cell(row=r, column=40, value=launch).number_format = "yyyy-mm-dd"
+            wb.save(str(tmp_path / f"{role}.xlsx"))
+        kwargs = dict(wood_path=tmp_path / "wood.xlsx", gold_path=tmp_path / "gold.xlsx",
+                      sku_prefix="T", mode="new", parallel=False)
+        streamed = merge_files(main_p, output_path=tmp_path / "s.xlsx", **kwargs)
+        in_place = merge_files(main_p, output_path=tmp_path / "i.xlsx", stream=False, **kwargs)
+        # 第 19 行起是木框行: AN 列不在流式解码列中, 样式须取自模板格式行而不是留空
+        for path in (streamed, in_place):
+            out = load_workbook(str(path))["Template"]
+            for row in (8, 9, 19, 24):
+                assert out.cell(row=row, column=40).value == launch
+                assert out.cell(row=row, column=40).number_format == "yyyy-mm-dd"
+
+    def test_variants_in_same_order_are_joined_without_full_load(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import merger
+        paintings = ["Art A", "Art B", "Art A", "Art C"]
+        main_wb, _ = _create_main_workbook(paintings)
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        for role in ("wood", "gold"):
+            _create_variant_workbook(paintings, role=role).save(str(tmp_path / f"{role}.xlsx"))
+        kwargs = dict(wood_path=tmp_path / "wood.xlsx", gold_path=tmp_path / "gold.xlsx",
+                      sku_prefix="T", mode="new", parallel=False)
+        in_place = merge_files(main_p, output_path=tmp_path / "i.xlsx", stream=False, **kwargs)
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("同序文件不应整表加载")
+
+        monkeypatch.setattr(merger, "_load_variant_input", _fail)
+        streamed = merge_files(main_p, output_path=tmp_path / "s.xlsx", **kwargs)
+        assert _values(streamed) == _values(in_place)
+
+    def test_groups_share_one_style_interner(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import merger
+        main_wb, _ = _create_main_workbook(["Art A", "Art B", "Art C"])
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        for role in ("wood", "gold"):
+            _create_variant_workbook(["Art A", "Art B", "Art C"], role=role).save(
+                str(tmp_path / f"{role}.xlsx"))
+        seen = []
+        merge_one = merger.merge_one_painting
+
+        def _spy(*args, **kwargs):
+            seen.append(kwargs.get("styles"))
+            return merge_one(*args, **kwargs)
+
+        monkeypatch.setattr(merger, "merge_one_painting", _spy)
+        merge_files(main_p, wood_path=tmp_path / "wood.xlsx", gold_path=tmp_path / "gold.xlsx",
+                    output_path=tmp_path / "s.xlsx", sku_prefix="T", mode="new", parallel=False)
+        assert len(seen) == 3
+        assert seen[0] is not None and all(s is seen[0] for s in seen)
+
+    def test_rerun_reads_same_order_variants_from_cache(self, tmp_path, monkeypatch):
+        from amazon_excel_processor import merger
+        monkeypatch.setenv("AEP_CACHE_DIR", str(tmp_path / "cache"))
+        paintings = ["Art A", "Art B", "Art C"]
+        main_wb, _ = _create_main_workbook(paintings)
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        for role in ("wood", "gold"):
+            _create_variant_workbook(paintings, role=role).save(str(tmp_path / f"{role}.xlsx"))
+        kwargs = dict(wood_path=tmp_path / "wood.xlsx", gold_path=tmp_path / "gold.xlsx",
+                      sku_prefix="T", mode="new", parallel=False, use_cache=True)
+        first = merge_files(main_p, output_path=tmp_path / "1.xlsx", **kwargs)
+        assert len(list((tmp_path / "cache").glob("*.tpl"))) == 2
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("缓存命中时不应重新解析木/金文件")
+
+        monkeypatch.setattr(merger, "GroupReader", _fail)
+        monkeypatch.setattr(merger, "_load_variant_input", _fail)
+        second = merge_files(main_p, output_path=tmp_path / "2.xlsx", **kwargs)
+        assert _values(second) == _values(first)
+
+    def test_shared_formula_falls_back_to_in_place(self, tmp_path):
+        main_wb, _ = _create_main_workbook(["Art A"])
+        main_p = tmp_path / "main.xlsx"
+        main_wb.save(str(main_p))
+        header = ('<row r="4"><c r="A4" t="inlineStr"><is><t>SKU</t></is></c>'
+                  '<c r="D4" t="inlineStr"><is><t>Parentage Level</t></is></c>'
+                  '<c r="G4" t="inlineStr"><is><t>Item Name</t></is></c></row>')
+        data = []
+        for i in range(MAIN_GROUP_SIZE):
+            r = DATA_START_ROW + i
+            level = "Parent" if i == 0 else "Child"
+            formula = ('<f t="shared" ref="B8:B18" si="0">A8</f>' if i == 0
+                       else '<f t="shared" si="0"/>')
+            data.append(f'<row r="{r}"><c r="A{r}" t="inlineStr"><is><t>S{r}</t></is></c>'
+                        f'<c r="B{r}">{formula}</c>'
+                        f'<c r="D{r}" t="inlineStr"><is><t>{level}</t></is></c>'
+                        f'<c r="G{r}" t="inlineStr"><is><t>Art A</t></is></c></row>')
+        _rewrite_sheet(main_p, header + "".join(data))
+        out = merge_files(main_p, sku_prefix="T", output_path=tmp_path / "out.xlsx")
+        ws = load_workbook(str(out))["Template"]
+        assert ws.cell(row=DATA_START_ROW, column=1).value == "T-1"
+        assert ws.cell(row=DATA_START_ROW + 1, column=2).value == "=A9"
+
+
+class TestScanSheetXml:
+    def test_small_chunks_match_whole_read(self, monkeypatch):
+        xml = (b'<worksheet xmlns="x"><dimension ref="A1:B3"/><sheetData>'
+               + b"".join(b'<row r="%d" ht="20" customHeight="1"><c r="A%d"><v>1</v></c></row>' % (r, r)
+                          for r in range(1, 40))
+               + b"</sheetData><mergeCells/></worksheet>")
+        whole = scan_sheet_xml(io.BytesIO(xml))
+        monkeypatch.setattr(xlsx_package, "_SCAN_CHUNK", 7)
+        assert scan_sheet_xml(io.BytesIO(xml)) == whole
+        head, tail, attrs = whole
+        assert head == b'<worksheet xmlns="x">'
+        assert tail == b"<mergeCells/></worksheet>"
+        assert attrs[39] == b' ht="20" customHeight="1"'
@@ -0,0 +1,61 @@
+"""Tab 分隔平面文件读写测试"""
+
+from amazon_excel_processor.excel_io import (
+    DATA_START_ROW,
+    HEADER_ROW,
+    group_rows,
+    load_workbook,
+    locate_columns,
+    save_workbook,
+)
+from amazon_excel_processor.merger import MAIN_GROUP_SIZE, rewrite_sku, write_parent_sku_formulas
+from amazon_excel_processor.tsv_io import load_tsv
+
+
+def _write_tsv(path, paintings):
+    """构造平面文件: 第 4 行表头, 第 8 行起每画 11 行。"""
+    lines = [[""] for _ in range(HEADER_ROW - 1)]
+    header = [""] * 7
+    header[0], header[3], header[4], header[6] = "SKU", "Parentage Level", "Parent SKU", "Item Name"
+    lines.append(header)
+    lines += [[""] for _ in range(DATA_START_ROW - HEADER_ROW - 1)]
+    for title in paintings:
+        for i in range(MAIN_GROUP_SIZE):
+            lines.append([f"S{i}", "", "", "Parent" if i == 0 else "Child", "", "",
+                          title if i == 0 else f"{title} Frame-style {i}"])
+    path.write_text("\r\n".join("\t".join(line) for line in lines) + "\r\n", encoding="utf-8")
+
+
+class TestTsvIo:
+    def test_load_matches_template_layout(self, tmp_path):
+        p = tmp_path / "flat.txt"
+        _write_tsv(p, ["Art A", "Art B"])
+        wb, ws, name = load_workbook(p)
+        assert wb is None
+        assert name == "Template"
+        assert locate_columns(ws)["Item Name"] == 7
+        assert len(group_rows(ws)) == 2
+        assert ws.cell(row=DATA_START_ROW, column=7).value == "Art A"
+        assert ws.cell(row=DATA_START_ROW, column=2).value is None
+
+    def test_save_resolves_parent_sku_formulas(self, tmp_path):
+        p = tmp_path / "flat.txt"
+        _write_tsv(p, ["Art A", "Art B"])
+        _, ws, name = load_workbook(p)
+        ws.cell(row=DATA_START_ROW + MAIN_GROUP_SIZE, column=7).value = "Art\tB"
+        groups = group_rows(ws)
+        rewrite_sku(ws, groups, "HM725", sku_col=1, mode="new")
+        write_parent_sku_formulas(ws, groups, parent_sku_col=5, seller_sku_col=1, mode="new")
+        out = save_workbook(ws, p, name)
+        assert out.suffix == ".txt"
+
+        back = load_tsv(out)
+        parent_sku = back.cell(row=DATA_START_ROW, column=1).value
+        for r in range(DATA_START_ROW + 1, DATA_START_ROW + MAIN_GROUP_SIZE):
+            assert back.cell(row=r, column=5).value == parent_sku
+        # 含 Tab 的值被正确引用, 读回不串列
+        assert back.cell(row=DATA_START_ROW + MAIN_GROUP_SIZE, column=7).value == "Art\tB"
+        text = out.read_text(encoding="utf-8")
+        assert "=" not in text
+        # 每行补齐到相同列数
+        assert len({line.count("\t") for line in text.splitlines() if '"' not in line}) == 1